@@ -0,0 +1,92 @@
+"""Benchmark for decoding model output and encoding API responses.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_codec [--plans 2000] [--days 7] [--items 25] [--seed 0]
+
+Builds realistic week plans and reports time per plan for:
+  decode: json.loads vs. schemas.decode("plan") (decode + validation),
+          and the repair path for fenced and truncated output;
+  encode: FastAPI's default path (jsonable_encoder + json.dumps, what a
+          returned dict goes through) vs. FastJSONResponse (msgspec).
+"""
+import argparse
+import json
+import random
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from backend.services import schemas
+
+_DISHES = ["肉じゃが", "カレーライス", "親子丼", "焼き魚定食", "麻婆豆腐", "豚の生姜焼き", "オムライス", "味噌汁とご飯",
+           "トースト", "ハンバーグ", "野菜炒め", "うどん", "チャーハン", "鮭のムニエル", "筑前煮", "サラダ"]
+_ITEMS = ["玉ねぎ", "人参", "じゃがいも", "豚肉", "鶏もも肉", "豆腐", "卵", "牛乳", "鮭", "キャベツ", "ねぎ", "生姜",
+          "にんにく", "醤油", "味噌", "パン", "米", "トマト", "きゅうり", "ほうれん草", "しめじ", "大根", "ひき肉"]
+_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def make_plan(rng: random.Random, days: int, items: int) -> dict:
+    return {
+        "meal_plan": [
+            {"day": _DAYS[i % 7], "meals": {meal: rng.choice(_DISHES) for meal in ("breakfast", "lunch", "dinner")}}
+            for i in range(days)
+        ],
+        "shopping_list": [
+            {"item": rng.choice(_ITEMS), "reason": rng.choice(["missing for " + rng.choice(_DISHES), "bargain"])}
+            for _ in range(items)
+        ],
+    }
+
+
+def per_plan_us(func, inputs: list) -> float:
+    start = time.perf_counter()
+    for value in inputs:
+        func(value)
+    return (time.perf_counter() - start) / len(inputs) * 1e6
+
+
+def fastapi_default(content) -> bytes:
+    # What JSONResponse does with a dict returned from a handler
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plans", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--items", type=int, default=25, help="Shopping list entries per plan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    plans = [make_plan(rng, args.days, args.items) for _ in range(args.plans)]
+    texts = [json.dumps(plan, ensure_ascii=False, indent=2) for plan in plans]  # Model output is pretty-printed
+    fenced = [f"```json\n{text}\n```" for text in texts]
+    truncated = [text[:int(len(text) * 0.8)] for text in texts]
+    responses = [{"status": "done", "ingredients": [], "mealPlan": p["meal_plan"], "shoppingList": p["shopping_list"]}
+                 for p in plans]
+
+    assert schemas.decode("plan", texts[0]) == plans[0]
+    recovered = schemas.decode("plan", truncated[0])
+    assert json.loads(fastapi_default(responses[0])) == json.loads(schemas.encode(responses[0]))
+
+    decode_json = per_plan_us(json.loads, texts)
+    decode_schema = per_plan_us(lambda text: schemas.decode("plan", text), texts)
+    decode_fenced = per_plan_us(lambda text: schemas.decode("plan", text), fenced)
+    decode_truncated = per_plan_us(lambda text: schemas.decode("plan", text), truncated)
+    encode_default = per_plan_us(fastapi_default, responses)
+    encode_fast = per_plan_us(schemas.encode, responses)
+
+    print(f"Plans:               {args.plans} x {args.days} days, {args.items} shopping items "
+          f"(~{sum(map(len, texts)) // len(texts)} chars of model output)")
+    print(f"Decode json.loads:   {decode_json:8.1f} us/plan (no validation)")
+    print(f"Decode schema:       {decode_schema:8.1f} us/plan ({decode_json / decode_schema:.1f}x, validated)")
+    print(f"Decode fenced:       {decode_fenced:8.1f} us/plan (repaired)")
+    print(f"Decode truncated:    {decode_truncated:8.1f} us/plan (repaired, kept {len(recovered['meal_plan'])}/"
+          f"{args.days} days and {len(recovered['shopping_list'])}/{args.items} items of the first plan)")
+    print(f"Encode FastAPI:      {encode_default:8.1f} us/plan (jsonable_encoder + json.dumps)")
+    print(f"Encode msgspec:      {encode_fast:8.1f} us/plan ({encode_default / encode_fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark for ingredient-name normalization.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_normalize [--names 5000] [--batch 20] [--seed 0]
+
+Generates noisy spellings of every known ingredient (katakana/hiragana
+swaps, half-width kana, spacing, size notes, prefixes, dropped
+characters) and reports accuracy and throughput of one-by-one lookups
+vs. batched canonicalize() calls of --batch names (about one session).
+"""
+import argparse
+import random
+import time
+import unicodedata
+
+from backend.services.ingredient_normalizer import INGREDIENT_FUZZY_THRESHOLD, get_normalizer
+
+# Full-width katakana -> half-width (voiced forms as base + dakuten)
+_HALF_WIDTH = {}
+for cp in range(0xFF66, 0xFF9E):
+    half = chr(cp)
+    _HALF_WIDTH[unicodedata.normalize("NFKC", half)] = half
+    for mark in ("ﾞ", "ﾟ"):
+        composed = unicodedata.normalize("NFKC", half + mark)
+        if len(composed) == 1:
+            _HALF_WIDTH[composed] = half + mark
+
+
+def _to_katakana(text: str) -> str:
+    return "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in text)
+
+
+def _to_hiragana(text: str) -> str:
+    return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)
+
+
+def _noisy(name: str, rng: random.Random) -> tuple[str, bool]:
+    """A variant of `name`; the flag marks edits only fuzzy matching can undo."""
+    kind = rng.choice(["katakana", "hiragana", "half_width", "spaced", "note", "prefix", "typo", "as_is"])
+    if kind == "katakana":
+        return _to_katakana(name), False
+    if kind == "hiragana":
+        return _to_hiragana(name), False
+    if kind == "half_width":
+        return "".join(_HALF_WIDTH.get(c, c) for c in _to_katakana(name)), False
+    if kind == "spaced":
+        return f" {name}　", False
+    if kind == "note":
+        return f"{name}（{rng.choice(['大', '小', '2個', '半分'])}）", False
+    if kind == "prefix":
+        return rng.choice(["国産", "冷凍", "特売"]) + name, True
+    if kind == "typo" and len(name) >= 4:
+        i = rng.randrange(1, len(name) - 1)
+        return name[:i] + name[i + 1:], True
+    return name, False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=20, help="Names per canonicalize() call (≈ one session)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    normalizer = get_normalizer()
+    build = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    spellings = sorted(normalizer.exact)
+    cases = []
+    for _ in range(args.names):
+        key = rng.choice(spellings)
+        name, needs_fuzzy = _noisy(key, rng)
+        cases.append((name, normalizer.exact[key], needs_fuzzy))
+    names = [name for name, _, _ in cases]
+
+    start = time.perf_counter()
+    one_by_one = [normalizer.canonical(name) for name in names]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(names), args.batch):
+        batched.extend(normalizer.canonicalize(names[i:i + args.batch]))
+    batch_time = time.perf_counter() - start
+
+    assert batched == one_by_one
+    folded = [(got == want) for (_, want, fuzzy), got in zip(cases, batched) if not fuzzy]
+    fuzzy = [(got == want) for (_, want, fuzzy), got in zip(cases, batched) if fuzzy]
+
+    print(f"Vocabulary:        {len(spellings)} spellings -> {len(set(normalizer.exact.values()))} canonical, "
+          f"{normalizer.matrix.shape[1]} bigram features (built in {build * 1000:.1f} ms)")
+    print(f"Names:             {len(names)} ({len(fuzzy)} need fuzzy matching, threshold {INGREDIENT_FUZZY_THRESHOLD})")
+    print(f"Accuracy (fold):   {sum(folded) / max(len(folded), 1):.1%}")
+    print(f"Accuracy (fuzzy):  {sum(fuzzy) / max(len(fuzzy), 1):.1%}")
+    print(f"One by one:        {single_time * 1000:.1f} ms ({len(names) / single_time:,.0f} names/s)")
+    print(f"Batched ({args.batch}/call): {batch_time * 1000:.1f} ms ({len(names) / batch_time:,.0f} names/s, "
+          f"{single_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark for the image preprocessing stage.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_preprocess [--dir uploads] [--bandwidth-mbps 10]
+
+Preprocesses every image in --dir into a temporary directory and reports
+bytes saved plus the estimated end-to-end latency change per analysis:
+upload time of the raw files vs. preprocessing time + upload time of the
+processed files at the given uplink bandwidth.
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+from backend.services import image_service
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default="uploads")
+    parser.add_argument("--bandwidth-mbps", type=float, default=10.0, help="Uplink to the model API")
+    parser.add_argument("--images-per-session", type=int, default=3)
+    args = parser.parse_args()
+
+    sources = sorted(glob.glob(os.path.join(args.dir, "*.jpg")))
+    if not sources:
+        print(f"No images found in {args.dir}")
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_preprocess_")
+    try:
+        copies = []
+        for path in sources:
+            dest = os.path.join(workdir, os.path.basename(path))
+            shutil.copyfile(path, dest)
+            copies.append(dest)
+        # Preprocessing may overwrite or replace the copies, so size them first
+        original_bytes = sum(os.path.getsize(p) for p in copies)
+
+        start = time.perf_counter()
+        processed = image_service.preprocess_images(copies)
+        elapsed = time.perf_counter() - start
+
+        processed_bytes = sum(os.path.getsize(p) for p in processed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    bytes_per_sec = args.bandwidth_mbps * 1_000_000 / 8
+    n = len(sources)
+    per_image_preprocess = elapsed / n
+    raw_upload = original_bytes / n / bytes_per_sec
+    new_upload = processed_bytes / n / bytes_per_sec
+    k = args.images_per_session
+
+    print(f"Images:            {n}")
+    print(f"Settings:          max_edge={image_service.IMAGE_MAX_EDGE} quality={image_service.IMAGE_QUALITY} "
+          f"format={image_service.IMAGE_FORMAT} workers={image_service.IMAGE_PREPROCESS_WORKERS}")
+    print(f"Original size:     {original_bytes / 1e6:.1f} MB ({original_bytes / n / 1e6:.2f} MB/image)")
+    print(f"Processed size:    {processed_bytes / 1e6:.1f} MB ({processed_bytes / n / 1e6:.2f} MB/image)")
+    print(f"Bytes saved:       {(1 - processed_bytes / original_bytes) * 100:.1f}%")
+    print(f"Preprocess time:   {elapsed:.2f} s total, {per_image_preprocess * 1000:.0f} ms/image (wall, pooled)")
+    print(f"Per session of {k} images @ {args.bandwidth_mbps:g} Mbps:")
+    print(f"  raw upload:              {raw_upload * k:.2f} s")
+    print(f"  preprocess + upload:     {(per_image_preprocess + new_upload) * k:.2f} s")
+    print(f"  end-to-end change:       {((per_image_preprocess + new_upload) - raw_upload) * k:+.2f} s")
+
+
+if __name__ == "__main__":
+    main()
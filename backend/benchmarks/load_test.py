@@ -0,0 +1,329 @@
+"""End-to-end load benchmark for the session lifecycle.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.load_test [--sessions 50] [--concurrency 10]
+        [--genai-latency 0.5] [--genai-error-rate 0.0] [--database-url sqlite:///...]
+        [--detection-mode single|fanout|auto]
+        [--url http://host:8000] [--out results.json] [--compare previous.json]
+
+Each virtual user runs: create session -> upload images -> analyze ->
+poll status -> fetch result, while an SSE subscription records when the
+pipeline reaches each stage. Without --url the API runs in-process
+(uvicorn on a free port, analysis workers included) against the fake
+genai backend (services/fake_genai.py) and a throwaway SQLite database
+unless --database-url points at e.g. a local Postgres.
+
+Reports throughput and p50/p95/p99 per endpoint and per pipeline stage,
+and writes everything to --out as JSON; --compare prints p95 deltas
+against an earlier run.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+TERMINAL = ("done", "error")
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))  # Nearest rank
+    return ordered[k]
+
+
+def summarize(values: list[float], errors: int = 0) -> dict:
+    return {
+        "count": len(values),
+        "errors": errors,
+        "mean_ms": sum(values) / len(values) * 1000 if values else None,
+        **{f"p{p}_ms": (percentile(values, p) or 0) * 1000 if values else None for p in (50, 95, 99)},
+        "max_ms": max(values) * 1000 if values else None,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.endpoints: dict[str, list[float]] = {}
+        self.endpoint_errors: dict[str, int] = {}
+        self.stages: dict[str, list[float]] = {}
+        self.sessions = {"done": 0, "error": 0, "timeout": 0, "failed": 0}
+
+    def endpoint(self, name: str, seconds: float, ok: bool):
+        self.endpoints.setdefault(name, []).append(seconds)
+        if not ok:
+            self.endpoint_errors[name] = self.endpoint_errors.get(name, 0) + 1
+
+    def stage(self, name: str, seconds: float | None):
+        if seconds is not None and seconds >= 0:
+            self.stages.setdefault(name, []).append(seconds)
+
+
+def make_image(unique: bool, size: int) -> bytes:
+    from PIL import Image
+
+    color = tuple(random.randrange(256) for _ in range(3)) if unique else (200, 120, 40)
+    image = Image.new("RGB", (size, size), color)
+    if unique:
+        # A few random pixels make every upload hash differently (no detection cache hits)
+        for _ in range(32):
+            image.putpixel((random.randrange(size), random.randrange(size)), (random.randrange(256),) * 3)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+async def timed(recorder: Recorder, name: str, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        recorder.endpoint(name, time.perf_counter() - start, False)
+        raise
+    recorder.endpoint(name, time.perf_counter() - start, response.status_code < 400)
+    return response
+
+
+async def collect_events(client: httpx.AsyncClient, session_id: str, events: list):
+    """Appends (monotonic time, event name, payload) for every SSE event of the session."""
+    try:
+        async with client.stream("GET", f"/api/session/{session_id}/events", timeout=None) as response:
+            name = "status"
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    name = line[7:]
+                elif line.startswith("data: "):
+                    payload = json.loads(line[6:])
+                    events.append((time.perf_counter(), name, payload))
+                    if name == "status" and payload.get("status") in TERMINAL:
+                        return
+    except (httpx.HTTPError, asyncio.CancelledError):
+        pass
+
+
+def record_stages(recorder: Recorder, analyze_sent: float, events: list):
+    analyzing = [t for t, name, e in events if name == "status" and e.get("status") == "analyzing"]
+    ready = next((t for t, name, e in events if name == "status" and e.get("status") == "ingredients_ready"), None)
+    done = next((t for t, name, e in events if name == "status" and e.get("status") == "done"), None)
+    first_day = next((t for t, name, _ in events if name == "plan_day"), None)
+    # The API publishes "analyzing" on enqueue and the worker again when it picks the job up
+    started = analyzing[-1] if len(analyzing) > 1 else None
+
+    recorder.stage("queue_wait", started - analyze_sent if started else None)
+    recorder.stage("detection", ready - started if ready and started else None)
+    recorder.stage("planning", done - ready if done and ready else None)
+    recorder.stage("time_to_first_day", first_day - ready if first_day and ready else None)
+    recorder.stage("analysis_total", done - analyze_sent if done else None)
+
+
+async def run_session(client: httpx.AsyncClient, recorder: Recorder, args):
+    lifecycle_start = time.perf_counter()
+    response = await timed(recorder, "POST /api/sessions", client.post("/api/sessions"))
+    session_id = response.json()["session_id"]
+
+    events = []
+    collector = asyncio.create_task(collect_events(client, session_id, events)) if args.events else None
+
+    files = [
+        ("files", (f"bench_{i}.jpg", make_image(not args.warm_caches, args.image_size), "image/jpeg"))
+        for i in range(args.images)
+    ]
+    await timed(recorder, "POST /api/session/{id}/images", client.post(f"/api/session/{session_id}/images", files=files))
+
+    analyze_sent = time.perf_counter()
+    await timed(recorder, "POST /api/session/{id}/analyze", client.post(f"/api/session/{session_id}/analyze"))
+
+    status, etag = None, None
+    deadline = analyze_sent + args.timeout
+    while time.perf_counter() < deadline:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await timed(recorder, "GET /api/session/{id}/status",
+                               client.get(f"/api/session/{session_id}/status", headers=headers))
+        if response.status_code == 200:
+            etag = response.headers.get("etag")
+            status = response.json().get("status")
+            if status in TERMINAL:
+                break
+        await asyncio.sleep(args.poll_interval)
+    else:
+        status = "timeout"
+
+    if status == "done":
+        await timed(recorder, "GET /api/session/{id}/result", client.get(f"/api/session/{session_id}/result"))
+        recorder.stage("lifecycle", time.perf_counter() - lifecycle_start)
+
+    if collector:
+        try:
+            await asyncio.wait_for(collector, timeout=2.0)
+        except asyncio.TimeoutError:
+            collector.cancel()
+        record_stages(recorder, analyze_sent, events)
+    recorder.sessions[status] = recorder.sessions.get(status, 0) + 1
+
+
+async def run_load(base_url: str, args) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency * 2 + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        queue = asyncio.Queue()
+        for i in range(args.sessions):
+            queue.put_nowait(i)
+
+        async def user():
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await run_session(client, recorder, args)
+                except Exception as e:
+                    recorder.sessions["failed"] += 1
+                    print(f"Session failed: {type(e).__name__}: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        return recorder, time.perf_counter() - start
+
+
+def start_in_process_server(args) -> tuple[str, object]:
+    """Configures the backend for benchmarking, then serves it on a free port."""
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ.update({
+        "GENAI_BACKEND": "fake",
+        "GENAI_FAKE_LATENCY": str(args.genai_latency),
+        "GENAI_FAKE_ERROR_RATE": str(args.genai_error_rate),
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/bench.db",
+        "ANALYSIS_WORKER_CONCURRENCY": str(args.workers),
+        "ANALYSIS_POLL_INTERVAL": "0.05",
+        "ANALYSIS_RETRY_BACKOFF": "0.5",
+        "DETECTION_MODE": args.detection_mode,
+    })
+    # Don't let the production rate limits throttle the measurement (explicit env still wins)
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "100000")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "100000000")
+    os.environ.setdefault("LLM_BACKOFF_BASE", "0.1")
+    if not args.warm_caches:
+        os.environ["PLAN_CACHE_SIZE"] = "0"
+    os.chdir(workdir)  # uploads/ is relative to the working directory
+
+    import uvicorn
+    from backend.main import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    print(f"In-process API on port {port} (workdir {workdir})")
+    return f"http://127.0.0.1:{port}", server
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_table(title: str, rows: dict):
+    print(f"\n{title}")
+    print(f"  {'name':<34} {'count':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, s in rows.items():
+        fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+        print(f"  {name:<34} {s['count']:>6} {s['errors']:>4} {fmt(s['p50_ms'])} {fmt(s['p95_ms'])} "
+              f"{fmt(s['p99_ms'])} {fmt(s['max_ms'])}")
+
+
+def compare(report: dict, previous_path: str):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\np95 vs {previous_path} ({previous.get('git_revision')})")
+    for section in ("endpoints", "stages"):
+        for name, now in report[section].items():
+            before = previous.get(section, {}).get(name)
+            if not before or before.get("p95_ms") is None or now["p95_ms"] is None:
+                continue
+            delta = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+            print(f"  {name:<34} {before['p95_ms']:9.1f} -> {now['p95_ms']:9.1f} ms ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10, help="Virtual users")
+    parser.add_argument("--images", type=int, default=2, help="Images per session")
+    parser.add_argument("--image-size", type=int, default=640, help="Edge length of generated JPEGs")
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-session analysis timeout (s)")
+    parser.add_argument("--no-events", dest="events", action="store_false", help="Skip SSE stage timing")
+    parser.add_argument("--warm-caches", action="store_true", help="Reuse images and keep the plan cache")
+    parser.add_argument("--url", help="Benchmark a running API instead of an in-process one")
+    # In-process settings
+    parser.add_argument("--genai-latency", type=float, default=0.5, help="Seconds per fake model call")
+    parser.add_argument("--genai-error-rate", type=float, default=0.0)
+    parser.add_argument("--database-url", help="Default: throwaway SQLite file")
+    parser.add_argument("--workers", type=int, default=4, help="In-process analysis workers")
+    parser.add_argument("--detection-mode", choices=("single", "fanout", "auto"), default="auto")
+    parser.add_argument("--out", default=f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument("--compare", help="Earlier --out file to diff p95s against")
+    args = parser.parse_args()
+    out_path = os.path.abspath(args.out)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        base_url, server = start_in_process_server(args)
+
+    try:
+        recorder, elapsed = asyncio.run(run_load(base_url, args))
+    finally:
+        if server:
+            server.should_exit = True
+
+    requests = sum(len(v) for v in recorder.endpoints.values())
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "wall_seconds": elapsed,
+        "sessions": recorder.sessions,
+        "throughput": {
+            "sessions_per_second": recorder.sessions.get("done", 0) / elapsed,
+            "requests_per_second": requests / elapsed,
+        },
+        "endpoints": {name: summarize(v, recorder.endpoint_errors.get(name, 0)) for name, v in recorder.endpoints.items()},
+        "stages": {name: summarize(v) for name, v in recorder.stages.items()},
+    }
+
+    print(f"\nSessions: {recorder.sessions} in {elapsed:.1f}s "
+          f"({report['throughput']['sessions_per_second']:.2f} sessions/s, "
+          f"{report['throughput']['requests_per_second']:.1f} req/s)")
+    print_table("Endpoints", report["endpoints"])
+    print_table("Pipeline stages", report["stages"])
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nSaved {out_path}")
+    if compare_path:
+        compare(report, compare_path)
+
+
+if __name__ == "__main__":
+    main()
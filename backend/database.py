@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -11,16 +12,78 @@ load_dotenv(dotenv_path=Path(__file__).parent / ".env")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# psycopg-only options must not be passed to other drivers (e.g. SQLite for tests)
+IS_POSTGRES = DATABASE_URL.startswith("postgres")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# --- Pool Settings (Postgres; SQLite manages its own connections) ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds; stay under server/proxy idle timeouts
+# Prepared statements cached per asyncpg connection (0 when behind pgbouncer in transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+pool_args = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+} if IS_POSTGRES else {}
+
+if IS_POSTGRES:
+    connect_args = {"options": "-c client_encoding=utf8"}
+elif IS_SQLITE:
+    # Worker threads share the engine with request handlers
+    connect_args = {"check_same_thread": False}
+else:
+    connect_args = {}
+
+
+def async_url(url: str) -> str:
+    """Same database through its asyncio driver (asyncpg / aiosqlite)."""
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+
+if IS_POSTGRES:
+    async_connect_args = {
+        "server_settings": {"client_encoding": "utf8"},
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+else:
+    async_connect_args = {}
+
+# Sync engine: job workers, caches and scripts (all off the event loop)
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True, 
-    connect_args={"options": "-c client_encoding=utf8"}
+    pool_pre_ping=True,
+    connect_args=connect_args,
+    **pool_args
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: request handlers in main.py
+async_engine = create_async_engine(
+    async_url(DATABASE_URL),
+    pool_pre_ping=True,
+    connect_args=async_connect_args,
+    **pool_args
+)
+# expire_on_commit=False: attributes stay readable after commit without another (awaited) load
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
@@ -0,0 +1,39 @@
+"""Bargain flyer ingestion.
+
+Usage (from the repository root):
+    python -m backend.ingest_flyers          # every FLYER_REFRESH_INTERVAL seconds
+    python -m backend.ingest_flyers --once   # single pass (cron, fixtures)
+
+The API process runs the same schedule itself when FLYER_INGEST_ENABLED=true.
+"""
+import argparse
+import asyncio
+
+from backend import database, models
+from backend.services.flyer_service import FLYER_SOURCES_FILE, run_ingestion, FlyerScheduler
+
+
+async def _run(args):
+    if args.once:
+        await run_ingestion(sources_file=args.sources)
+        return
+    scheduler = FlyerScheduler(sources_file=args.sources)
+    scheduler.start()
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest bargain flyers into bargain_items")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--sources", default=FLYER_SOURCES_FILE, help="JSON list of {store, region, url, selectors}")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
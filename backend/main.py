@@ -1,15 +1,79 @@
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from .services.log_service import configure_logging, get_logger
+
+# Before the other imports so their module-level log lines are formatted too
+configure_logging()
+logger = get_logger("backend.api")
+
 from . import models, database
+from .services import (
+    ai_service, cache_service, event_service, job_service, metrics_service, recipe_service, scraper_service,
+    preplan_service, schemas, session_repository, storage_service, upload_service,
+)
+from .services.analysis_service import run_mock_analysis
+from .services.readiness_service import readiness
+from .services.session_repository import SessionRepository, decode_cursor, encode_cursor, etag_for, get_session_repository
 from pydantic import BaseModel
 
-try:
-    models.Base.metadata.create_all(bind=database.engine)
-except Exception as e:
-    print(f"Startup DB Error (Ignored): {e}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema check, DB pool, genai SDK and indexes load in the background; /health says when they're done
+    readiness.start()
+    # In-process analysis workers (ANALYSIS_WORKER_CONCURRENCY=0 to run them elsewhere)
+    worker = job_service.AnalysisWorker()
+    if worker.concurrency > 0:
+        worker.start()
+    # Background removal of expired/orphaned Gemini files
+    ai_service.file_registry.start_cleanup()
+    # Optional: pre-fill recipe suggestions for the most common ingredients
+    if recipe_service.RECIPE_WARMUP_ENABLED:
+        threading.Thread(target=recipe_service.warm_recipe_cache, daemon=True).start()
+    # Fan-out of session events across API processes
+    listener = None
+    if event_service.EVENTS_BACKEND == "postgres":
+        listener = event_service.PostgresListener()
+        listener.start()
+    # Retention of uploaded images and disk-usage gauges
+    janitor = None
+    if storage_service.STORAGE_GC_ENABLED:
+        janitor = storage_service.StorageJanitor()
+        janitor.start()
+    # Scheduled bargain flyer ingestion (or run backend.ingest_flyers separately)
+    flyers = None
+    if scraper_service.FLYER_INGEST_ENABLED:
+        from .services import flyer_service  # Scraping stack is only imported when enabled
+        flyers = flyer_service.FlyerScheduler()
+        flyers.start()
+    # Off-peak plan pre-generation (or run backend.preplan separately)
+    preplan = None
+    if preplan_service.PREPLAN_ENABLED:
+        preplan = preplan_service.PreplanScheduler()
+        preplan.start()
+    yield
+    await readiness.stop()
+    if preplan:
+        await preplan.stop()
+    if flyers:
+        await flyers.stop()
+    worker.stop()
+    ai_service.file_registry.stop()
+    if janitor:
+        janitor.stop()
+    if listener:
+        listener.stop()
+    await database.async_engine.dispose()
 
-app = FastAPI(title="Smart Meal Manager API")
+app = FastAPI(title="Smart Meal Manager API", lifespan=lifespan)
 
 # CORS middleware to allow requests from frontend
 app.add_middleware(
@@ -19,18 +83,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so request timing includes CORS handling
+app.add_middleware(metrics_service.RequestMetricsMiddleware)
 
 @app.get("/")
 def read_root():
     return {"message": "Smart Meal Manager API is running"}
 
 @app.get("/health")
-def health_check(db: Session = Depends(database.get_db)):
-    return {"status": "ok", "db": "connected"}
+async def health_check():
+    """Readiness: 200 once warm-up is done and the database answers, 503 otherwise."""
+    ready, body = await readiness.check()
+    return JSONResponse(body, status_code=200 if ready else 503)
 
 @app.get("/api/reset")
-def reset_all_sessions():
-    MOCK_SESSIONS.clear()
+async def reset_all_sessions(repo: SessionRepository = Depends(get_session_repository)):
+    # Drops cached (and, without a DB, in-memory) sessions
+    repo.clear()
     return {"status": "cleared"}
 
 class RecipeSuggestionRequest(BaseModel):
@@ -38,16 +107,62 @@ class RecipeSuggestionRequest(BaseModel):
 
 @app.post("/api/recipes/suggest")
 def suggest_recipes_endpoint(req: RecipeSuggestionRequest):
-    try:
-        from backend.services.ai_service import suggest_recipes
-    except ImportError:
-        from services.ai_service import suggest_recipes
-    
-    recipes = suggest_recipes(req.ingredient)
+    if not req.ingredient.strip():
+        raise HTTPException(status_code=400, detail="ingredient must not be empty")
+    recipes = ai_service.suggest_recipes(req.ingredient)
     return {"recipes": recipes}
 
+class RecipeBatchSuggestionRequest(BaseModel):
+    ingredients: list[str]
+
+@app.post("/api/recipes/suggest/batch")
+def suggest_recipes_batch_endpoint(req: RecipeBatchSuggestionRequest):
+    recipes = ai_service.suggest_recipes_batch(req.ingredients)
+    return {"recipes": recipes}
+
+@app.get("/api/llm/status")
+def get_llm_status():
+    first_day = metrics_service.plan_stream_seconds.summary(phase="first_day")
+    total = metrics_service.plan_stream_seconds.summary(phase="total")
+    count = first_day["count"]
+    return {
+        **ai_service.gateway.stats(),
+        "plan_stream": {
+            "count": count,
+            "avg_time_to_first_day_seconds": first_day["sum"] / count if count else None,
+            "max_time_to_first_day_seconds": first_day["max"],
+            "last_time_to_first_day_seconds": first_day["last"],
+            "last_total_seconds": total["last"],
+        },
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint (per-process counters and histograms)."""
+    return PlainTextResponse(metrics_service.registry.render(), media_type="text/plain; version=0.0.4")
+
+class PlanCacheSettings(BaseModel):
+    similarity_threshold: float
+
+@app.get("/api/cache/stats")
+async def get_cache_stats(repo: SessionRepository = Depends(get_session_repository)):
+    return {
+        "detection": cache_service.detection_cache.stats(),
+        "plan": cache_service.plan_cache.stats(),
+        "sessions": repo.stats(),
+    }
+
+@app.put("/api/cache/plan")
+def update_plan_cache_settings(settings: PlanCacheSettings):
+    """Adjusts the near-match threshold at runtime (1.0 = exact matches only)."""
+    try:
+        cache_service.plan_cache.set_threshold(settings.similarity_threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cache_service.plan_cache.stats()
+
 import socket
-import traceback
+import uuid
 
 @app.get("/api/network-info")
 def get_network_info():
@@ -60,270 +175,249 @@ def get_network_info():
         s.connect(("8.8.8.8", 80))
         ip = s.getsockname()[0]
         s.close()
-        print(f"Network Info: Detected IP {ip}")
+        logger.info("Network info: detected IP %s", ip)
     except Exception as e:
-        print(f"Network Info Error: {e}")
-        traceback.print_exc()
+        logger.exception("Network info error: %s", e)
         ip = "127.0.0.1"
     return {"ip": ip, "port": 3000}
 
 @app.post("/api/debug/reset_db")
-def debug_reset_db(db: Session = Depends(database.get_db)):
+async def debug_reset_db(repo: SessionRepository = Depends(get_session_repository)):
     try:
-        models.Base.metadata.drop_all(bind=database.engine)
-        models.Base.metadata.create_all(bind=database.engine)
+        async with database.async_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.drop_all)
+            await conn.run_sync(models.Base.metadata.create_all)
+        repo.clear()
         return {"status": "success", "message": "Database reset complete"}
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Database reset failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- Session & Upload APIs ---
 
-# --- In-Memory Mock Storage (Fallback) ---
-MOCK_SESSIONS = {}
-
 @app.post("/api/sessions")
-def create_session(db: Session = Depends(database.get_db)):
-    import uuid
+async def create_session(repo: SessionRepository = Depends(get_session_repository)):
     session_id = str(uuid.uuid4())
-    
-    try:
-        # Try DB first
-        db_session = models.Session(id=session_id, status="waiting")
-        db.add(db_session)
-        db.commit()
-        db.refresh(db_session)
-        print(f"Created session (DB): {session_id}")
-    except Exception as e:
-        print(f"DB Error (Fallback to Mock): {e}")
-        # Fallback to Mock
-        MOCK_SESSIONS[session_id] = {
-            "id": session_id,
-            "status": "waiting",
-            "image_paths": [],
-            "detected_ingredients": [],
-            "meal_plan": None,
-            "shopping_list": None
-        }
-        print(f"Created session (Mock): {session_id}")
-        
+    await repo.create(session_id)
+    logger.info("Created session", extra={"session_id": session_id, "repository": type(repo).__name__})
     return {"session_id": session_id}
 
 @app.post("/api/session/{session_id}/images")
 async def upload_images(
-    session_id: str, 
-    files: list[UploadFile] = File(...),
-    db: Session = Depends(database.get_db)
+    session_id: str,
+    request: Request,
+    repo: SessionRepository = Depends(get_session_repository)
 ):
+    # 1. Stream the multipart body ("files" parts) straight to disk, enforcing size limits as it arrives
     try:
-        # 1. Ensure upload dir exists
-        UPLOAD_DIR = "uploads"
-        import os
-        import time
-        import traceback
-        
-        if not os.path.exists(UPLOAD_DIR):
-            os.makedirs(UPLOAD_DIR, exist_ok=True)
-        
-        saved_paths = []
-        for file in files:
-            timestamp = int(time.time() * 1000)
-            original_name = file.filename or "unknown.jpg"
-            safe_name = "".join(c for c in original_name if c.isalnum() or c in "._-")
-            if not safe_name: safe_name = "image.jpg"
-            file_path = f"{UPLOAD_DIR}/{session_id}_{timestamp}_{safe_name}"
-            
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            saved_paths.append(file_path)
-            
+        used_bytes = await repo.bytes_used(session_id)
+        with metrics_service.upload_seconds.time():
+            saved_images = await upload_service.save_uploads(request, session_id, used_bytes)  # (path, sha256, size)
+        saved_paths = [path for path, _, _ in saved_images]
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Upload Error: {str(e)}")
+        logger.exception("Upload error: %s", e)
         raise HTTPException(status_code=500, detail=f"Server Upload Error: {str(e)}")
     
-    # 2. Update DB or Mock
-    try:
-        db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
-        if db_session:
-            current_paths = db_session.image_paths or []
-            db_session.image_paths = current_paths + saved_paths
-            db_session.status = "uploaded"
-            db.commit()
-            db.refresh(db_session)
-            return {"status": "uploaded", "count": len(saved_paths), "paths": saved_paths}
-    except:
-        pass
-        
-    # Mock Fallback
-    if session_id in MOCK_SESSIONS:
-        MOCK_SESSIONS[session_id]["image_paths"].extend(saved_paths)
-        MOCK_SESSIONS[session_id]["status"] = "uploaded"
-        return {"status": "uploaded", "count": len(saved_paths), "paths": saved_paths}
-
-    # If neither found
-    if not (session_id in MOCK_SESSIONS):
-         # Create impromptu mock if upload comes in (edge case)
-         MOCK_SESSIONS[session_id] = {
-            "id": session_id,
-            "status": "uploaded",
-            "image_paths": saved_paths,
-            "detected_ingredients": [],
-            "meal_plan": None,
-            "shopping_list": None
-        }
-         return {"status": "uploaded", "count": len(saved_paths), "paths": saved_paths}
-         
-    return {"status": "error", "message": "Session not found"}
+    for _, _, size in saved_images:
+        metrics_service.upload_bytes.observe(size)
+    logger.info("Saved uploads", extra={"count": len(saved_images), "bytes": sum(size for _, _, size in saved_images)})
+
+    # 2. Record them on the session
+    record = await _record_uploads(repo, session_id, saved_images)
+    await event_service.publish_async(session_id, "uploaded", image_count=len(record["image_paths"]))
+    return {"status": "uploaded", "count": len(saved_paths), "paths": saved_paths}
+
+async def _record_uploads(repo: SessionRepository, session_id: str, saved_images: list) -> dict:
+    record = await repo.add_images(session_id, saved_images)
+    if record is None:
+        # Upload for a session we don't know (e.g. created before a restart): adopt it
+        await repo.create(session_id)
+        record = await repo.add_images(session_id, saved_images)
+    return record
+
+class FastJSONResponse(JSONResponse):
+    """Encoded with msgspec. Returned directly, so FastAPI skips jsonable_encoder on large plans."""
+
+    def render(self, content) -> bytes:
+        return schemas.encode(content)
+
+def _etag_headers(record: dict) -> dict:
+    # no-cache = clients may store it but must revalidate (cheap with the ETag)
+    return {"ETag": etag_for(record), "Cache-Control": "no-cache"}
+
+def _not_modified(request: Request, record: dict):
+    """304 response if the client already holds this version, else None."""
+    if etag_for(record) in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=_etag_headers(record))
+    return None
 
 @app.get("/api/session/{session_id}/status")
-def get_session_status(session_id: str, db: Session = Depends(database.get_db)):
-    # Try DB
-    try:
-        db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
-        if db_session:
-            image_count = len(db_session.image_paths) if db_session.image_paths else 0
-            return {
-                "status": db_session.status, 
-                "image_count": image_count,
-                "ingredients": db_session.detected_ingredients,
-                "meal_plan": db_session.meal_plan.content if db_session.meal_plan else None,
-                "shopping_list": db_session.shopping_list.content if db_session.shopping_list else None
-            }
-    except:
-        pass
-        
-    # Try Mock
-    if session_id in MOCK_SESSIONS:
-        s = MOCK_SESSIONS[session_id]
-        return {
-            "status": s["status"],
-            "image_count": len(s["image_paths"]),
-            "ingredients": s["detected_ingredients"],
-            "meal_plan": s["meal_plan"],
-            "shopping_list": s["shopping_list"]
-        }
-
-    return {"status": "waiting", "image_count": 0}
-
-@app.post("/api/session/{session_id}/analyze")
-def start_analysis(session_id: str, db: Session = Depends(database.get_db)):
-    # DB logic...
-    db_session = None
-    try:
-        db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
-        if db_session:
-             if not db_session.image_paths: raise HTTPException(status_code=400, detail="No images")
-             db_session.status = "analyzing"
-             db.commit()
-    except:
-        pass
-        
-    # Mock Logic check
-    mock_session = MOCK_SESSIONS.get(session_id)
-    if not db_session and not mock_session:
-        raise HTTPException(status_code=404, detail="Session not found")
-        
-    if mock_session:
-        if not mock_session["image_paths"]: raise HTTPException(status_code=400, detail="No images")
-        mock_session["status"] = "analyzing"
-    
-    try:
-        # 1. Detect Ingredients (Sync for now, async better for prod)
+async def get_session_status(session_id: str, request: Request, repo: SessionRepository = Depends(get_session_repository)):
+    record = await repo.get(session_id)
+    if record is None:
+        return {"status": "waiting", "image_count": 0}
+    cached = _not_modified(request, record)
+    if cached is not None:
+        return cached
+    return FastJSONResponse(_status_body(record), headers=_etag_headers(record))
+
+async def _load_session_status(session_id: str, repo: SessionRepository):
+    record = await repo.get(session_id)
+    if record is None:
+        return {"status": "waiting", "image_count": 0}
+    return _status_body(record)
+
+def _status_body(record: dict) -> dict:
+    return {
+        "status": record["status"],
+        "image_count": len(record["image_paths"]),
+        "ingredients": record["detected_ingredients"],
+        "meal_plan": record["meal_plan"],
+        "shopping_list": record["shopping_list"]
+    }
+
+async def _status_snapshot(session_id: str) -> dict:
+    status = await _load_session_status(session_id, await get_session_repository())
+    return {
+        "session_id": session_id,
+        "status": status["status"],
+        "image_count": status.get("image_count", 0),
+        "ingredients": status.get("ingredients"),
+    }
+
+@app.get("/api/session/{session_id}/events")
+async def session_events(session_id: str, request: Request):
+    """Server-Sent Events stream of status changes (replaces /status polling)."""
+    # Subscribe before reading the snapshot so no transition falls in between
+    queue = event_service.broker.subscribe(session_id)
+
+    async def stream():
         try:
-            from backend.services.ai_service import detect_ingredients, generate_plan
-            from backend.services.scraper_service import get_bargain_items
-        except ImportError:
-             # Fallback if running from within backend dir
-             from services.ai_service import detect_ingredients, generate_plan
-             from services.scraper_service import get_bargain_items
-        
-        # Run in background ideally, but for MVP blocking is ok if < 30s
-        # Step A: Ingredients
-        # Determine paths to use (DB or Mock)
-        image_paths = []
-        if db_session:
-            image_paths = db_session.image_paths
-        elif mock_session:
-            image_paths = mock_session["image_paths"]
-            
-        print(f"Starting detection for session {session_id} with paths: {image_paths}")
-        detection_result = detect_ingredients(image_paths)
-        ingredients = detection_result.get("ingredients", [])
-        
-        # Save Ingredients
-        if db_session:
-            db_session.detected_ingredients = ingredients
-            db_session.status = "ingredients_ready"
-            db.commit()
-        if mock_session:
-            mock_session["detected_ingredients"] = ingredients
-            mock_session["status"] = "ingredients_ready"
-        
-        # Step B: Bargain Items (Mock)
-        bargains = get_bargain_items()
-        
-        # Step C: Generate Plan
-        print(f"Starting planning for session {session_id}")
-        plan_result = generate_plan(ingredients, bargains)
-        
-        # Save Results
-        generated_plan_data = plan_result.get("meal_plan", [])
-        shopping_list_data = plan_result.get("shopping_list", [])
-        
-        # Save Plan & List (DB)
-        if db_session:
-            new_plan = models.GeneratedPlan(session_id=session_id, content=generated_plan_data)
-            db.add(new_plan)
-            
-            new_list = models.ShoppingList(session_id=session_id, content=shopping_list_data)
-            db.add(new_list)
-            
-            db_session.status = "done"
-            db.commit()
-            
-        # Save Plan & List (Mock)
-        if mock_session:
-            mock_session["meal_plan"] = generated_plan_data
-            mock_session["shopping_list"] = shopping_list_data
-            mock_session["status"] = "done"
-        
-        return {"status": "done", "ingredients": ingredients}
+            snapshot = await _status_snapshot(session_id)
+            yield event_service.format_sse(snapshot)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=event_service.KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield event_service.format_sse(event)
+        finally:
+            event_service.broker.unsubscribe(session_id, queue)
 
-    except Exception as e:
-        print(f"Analysis Error: {e}")
-        traceback.print_exc()
-        if db_session:
-            db_session.status = "error"
-            db.commit()
-        if mock_session:
-            mock_session["status"] = "error"
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/api/session/{session_id}/analyze", status_code=202)
+async def start_analysis(
+    session_id: str,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(database.get_db),
+    repo: SessionRepository = Depends(get_session_repository),
+):
+    # Heavy work (Gemini detection + planning) runs in the job queue; we only enqueue here
+    record = await repo.get(session_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not record["image_paths"]: raise HTTPException(status_code=400, detail="No images")
+
+    if repo.persistent:
+        # The status is set in the enqueue transaction: a worker may start the job before we get here
+        job, created = await db.run_sync(job_service.enqueue_analysis, session_id)
+        if created:
+            await event_service.publish_async(session_id, "analyzing")  # Also drops the cached record
+            logger.info("Queued analysis job", extra={"job_id": job.id})
+        return JSONResponse(status_code=202, content={"status": "queued", "job_id": job.id})
+
+    # No DB: run in-process after the response is sent
+    await repo.set_status(session_id, "analyzing")
+    await event_service.publish_async(session_id, "analyzing")
+    # Sync task: Starlette runs it in the threadpool, off the event loop
+    background_tasks.add_task(run_mock_analysis, await repo.get(session_id))
+    return JSONResponse(status_code=202, content={"status": "queued", "job_id": None})
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str, db: AsyncSession = Depends(database.get_db)):
+    job = await db.run_sync(job_service.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.get("/api/session/{session_id}/result")
-def get_session_result(session_id: str, db: Session = Depends(database.get_db)):
-    # Try DB
+async def get_session_result(session_id: str, request: Request, repo: SessionRepository = Depends(get_session_repository)):
+    record = await repo.get(session_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    cached = _not_modified(request, record)
+    if cached is not None:
+        return cached
+    return FastJSONResponse(_result_body(record), headers=_etag_headers(record))
+
+def _result_body(record: dict) -> dict:
+    return {
+        "status": record["status"],
+        "ingredients": record["detected_ingredients"],
+        "mealPlan": record["meal_plan"] or [],
+        "shoppingList": record["shopping_list"] or []
+    }
+
+# --- History APIs ---
+
+def _history_item(record: dict) -> dict:
+    """Summary for history lists; the plan and shopping list only when the record has them."""
+    item = {
+        "session_id": record["id"],
+        "created_at": record["created_at"].isoformat() if record["created_at"] else None,
+        "status": record["status"],
+        "image_count": len(record["image_paths"]),
+        "ingredients": record["detected_ingredients"],
+    }
+    if "meal_plan" in record:
+        item["mealPlan"] = record["meal_plan"] or []
+        item["shoppingList"] = record["shopping_list"] or []
+    return item
+
+@app.get("/api/sessions")
+async def list_sessions(
+    limit: int = session_repository.HISTORY_PAGE_SIZE,
+    cursor: str | None = None,
+    include_plan: bool = False,
+    repo: SessionRepository = Depends(get_session_repository),
+):
+    """Newest sessions first. Pass next_cursor back as `cursor` for the following page."""
+    if not 1 <= limit <= session_repository.HISTORY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {session_repository.HISTORY_MAX_PAGE_SIZE}")
     try:
-        db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
-        if db_session:
-            return {
-                "status": db_session.status,
-                "ingredients": db_session.detected_ingredients,
-                "mealPlan": db_session.meal_plan.content if db_session.meal_plan else [],
-                "shoppingList": db_session.shopping_list.content if db_session.shopping_list else []
-            }
-    except:
-        pass
-        
-    # Try Mock
-    if session_id in MOCK_SESSIONS:
-        s = MOCK_SESSIONS[session_id]
-        return {
-            "status": s["status"],
-            "ingredients": s["detected_ingredients"],
-            "mealPlan": s["meal_plan"],
-            "shoppingList": s["shopping_list"]
-        }
-        
-    raise HTTPException(status_code=404, detail="Session not found")
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # One extra row tells whether another page exists without a COUNT
+    records = await repo.list_page(limit + 1, before, include_plan)
+    page = records[:limit]
+    return FastJSONResponse({
+        "sessions": [_history_item(record) for record in page],
+        "next_cursor": encode_cursor(page[-1]) if len(records) > limit else None,
+    })
+
+class SessionBatchRequest(BaseModel):
+    session_ids: list[str]
+    include_plan: bool = False
+
+@app.post("/api/sessions/results")
+async def get_session_results(req: SessionBatchRequest, repo: SessionRepository = Depends(get_session_repository)):
+    """Results of many sessions in one round trip (and one query), in request order."""
+    if len(req.session_ids) > session_repository.HISTORY_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {session_repository.HISTORY_MAX_BATCH} session ids per request")
+    found = await repo.get_many(req.session_ids, req.include_plan)
+    return FastJSONResponse({
+        "sessions": [_history_item(found[session_id]) for session_id in dict.fromkeys(req.session_ids) if session_id in found],
+        "missing": [session_id for session_id in dict.fromkeys(req.session_ids) if session_id not in found],
+    })
+
+# Everything above (incl. FastAPI, SQLAlchemy, PIL, numpy) but not the genai SDK, which warm-up loads
+readiness.record("import", time.perf_counter() - _import_started)
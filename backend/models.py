@@ -1,5 +1,35 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
-from sqlalchemy.orm import relationship
+"""ORM models.
+
+The schema is managed by create_all, which creates missing tables but never
+alters existing ones. Databases created before these columns and indexes
+existed need (or a reset_db):
+
+    ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+    ALTER TABLE sessions ADD COLUMN files_purged_at TIMESTAMP;
+    ALTER TABLE sessions ADD COLUMN updated_at TIMESTAMP;
+    UPDATE sessions SET updated_at = created_at;
+    CREATE INDEX ix_sessions_files_purged_at_updated_at ON sessions (files_purged_at, updated_at);
+    CREATE INDEX ix_sessions_created_at_id ON sessions (created_at, id);
+
+    ALTER TABLE generated_plans ADD COLUMN time_to_first_day_ms INTEGER;
+    ALTER TABLE generated_plans ADD COLUMN ingredient_names JSON;
+    ALTER TABLE generated_plans ADD COLUMN is_draft BOOLEAN NOT NULL DEFAULT false;
+    ALTER TABLE generated_plans ADD COLUMN draft_key VARCHAR;
+    ALTER TABLE generated_plans ADD COLUMN bargains_key VARCHAR;
+    ALTER TABLE generated_plans ADD COLUMN draft_shopping_list JSON;
+    CREATE INDEX ix_generated_plans_session_id ON generated_plans (session_id);
+    CREATE UNIQUE INDEX ux_generated_plans_draft_key ON generated_plans (draft_key);
+    CREATE INDEX ix_generated_plans_is_draft_bargains_key_created_at
+        ON generated_plans (is_draft, bargains_key, created_at);
+
+    CREATE INDEX ix_shopping_lists_session_id ON shopping_lists (session_id);
+
+    -- analysis_jobs tables created before the dedupe index
+    CREATE UNIQUE INDEX ux_analysis_jobs_active_session ON analysis_jobs (session_id)
+        WHERE status IN ('queued', 'running');
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, ForeignKey, Text, JSON, Index, event, false, text, update
+from sqlalchemy.orm import relationship, Session as OrmSession
 from .database import Base
 from datetime import datetime
 
@@ -17,32 +47,170 @@ class Session(Base):
 
     id = Column(String, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) # Last activity; retention counts from here
     image_paths = Column(JSON, default=list)  # List of image file paths
     detected_ingredients = Column(JSON, nullable=True) # List of detected ingredients
     status = Column(String, default="created") # created, uploaded, analyzing, ingredients_ready, done
+    version = Column(Integer, default=1, server_default="1", nullable=False) # Bumped on every change to the session, its plan or list (ETag)
+    files_purged_at = Column(DateTime, nullable=True) # Uploads deleted by retention (see storage_service)
 
     # user_id is optional for now (no login required)
     # user_id = Column(Integer, ForeignKey("users.id"), nullable=True) 
     
-    meal_plan = relationship("GeneratedPlan", back_populates="session", uselist=False)
+    # The session's own plan; pre-generated drafts (see preplan_service) hang off their source session too
+    meal_plan = relationship(
+        "GeneratedPlan", back_populates="session", uselist=False,
+        primaryjoin="and_(Session.id == GeneratedPlan.session_id, GeneratedPlan.is_draft == False)",
+    )
     shopping_list = relationship("ShoppingList", back_populates="session", uselist=False)
 
+    __table_args__ = (
+        # Retention: WHERE files_purged_at IS NULL AND updated_at < ... ORDER BY updated_at
+        Index("ix_sessions_files_purged_at_updated_at", "files_purged_at", "updated_at"),
+        # History: keyset pagination ORDER BY created_at DESC, id DESC
+        Index("ix_sessions_created_at_id", "created_at", "id"),
+    )
+
 class GeneratedPlan(Base):
     __tablename__ = "generated_plans"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, ForeignKey("sessions.id"))
+    session_id = Column(String, ForeignKey("sessions.id"), index=True)
     content = Column(JSON)  # The generated meal plan structure
+    time_to_first_day_ms = Column(Integer, nullable=True)  # Streaming latency, for monitoring
+    ingredient_names = Column(JSON, nullable=True)  # Canonical ingredient set the plan was made for (None while generating)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Off-peak drafts (see preplan_service); never shown as the session's plan
+    is_draft = Column(Boolean, default=False, server_default=false(), nullable=False)
+    draft_key = Column(String, nullable=True)  # Hash of ingredient set + bargains: one draft each (unique)
+    bargains_key = Column(String, nullable=True)  # Hash of the bargains the draft was planned with
+    draft_shopping_list = Column(JSON, nullable=True)
 
-    session = relationship("Session", back_populates="meal_plan")
+    session = relationship(
+        "Session", back_populates="meal_plan",
+        primaryjoin="and_(Session.id == GeneratedPlan.session_id, GeneratedPlan.is_draft == False)",
+    )
+
+    __table_args__ = (
+        # Draft lookup: WHERE is_draft AND bargains_key = ... ORDER BY created_at DESC
+        Index("ix_generated_plans_is_draft_bargains_key_created_at", "is_draft", "bargains_key", "created_at"),
+        Index("ux_generated_plans_draft_key", "draft_key", unique=True),
+    )
 
 class ShoppingList(Base):
     __tablename__ = "shopping_lists"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, ForeignKey("sessions.id"))
+    session_id = Column(String, ForeignKey("sessions.id"), index=True)
     content = Column(JSON)  # The generated shopping list structure
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("Session", back_populates="shopping_list")
+
+@event.listens_for(OrmSession, "before_flush")
+def _bump_session_versions(db, flush_context, instances):
+    """Keeps Session.version in step with every write, whoever makes it."""
+    bumped = set()
+    for obj in list(db.dirty):
+        if isinstance(obj, Session) and db.is_modified(obj):
+            obj.version = Session.version + 1  # Atomic in SQL; concurrent writers can't lose a bump
+            bumped.add(obj.id)
+    touched = {
+        obj.session_id
+        for obj in list(db.new) + list(db.dirty)
+        if isinstance(obj, (GeneratedPlan, ShoppingList)) and obj.session_id and not getattr(obj, "is_draft", False)
+        and (obj in db.new or db.is_modified(obj))
+    }
+    for session_id in touched - bumped:
+        db.execute(update(Session).where(Session.id == session_id).values(version=Session.version + 1))
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    session_id = Column(String, ForeignKey("sessions.id"), index=True)
+    status = Column(String, default="queued") # queued, running, done, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime, default=datetime.utcnow) # Earliest time the job may be claimed (retry backoff)
+    locked_until = Column(DateTime, nullable=True) # Visibility timeout of the current claim
+    locked_by = Column(String, nullable=True) # Worker id holding the claim
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Claim query: WHERE status IN (...) ORDER BY run_after
+        Index("ix_analysis_jobs_status_run_after", "status", "run_after"),
+        # At most one unfinished job per session, also when two /analyze calls race
+        Index(
+            "ux_analysis_jobs_active_session", "session_id", unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+class UploadedImage(Base):
+    __tablename__ = "uploaded_images"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, ForeignKey("sessions.id"), index=True)
+    path = Column(String)
+    sha256 = Column(String(64), index=True) # Content hash of the uploaded bytes
+    size_bytes = Column(Integer)
+    analyzed_at = Column(DateTime, nullable=True) # Set once detection has covered this image
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DetectionCacheEntry(Base):
+    __tablename__ = "detection_cache"
+
+    key = Column(String(64), primary_key=True) # sha256(sorted image hashes + model + prompt version)
+    model = Column(String)
+    prompt_version = Column(String)
+    result = Column(JSON) # {"ingredients": [...]}
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class GeminiFile(Base):
+    __tablename__ = "gemini_files"
+
+    content_hash = Column(String(64), primary_key=True) # sha256 of the bytes sent to the model
+    remote_name = Column(String, index=True) # e.g. "files/abc123"
+    uri = Column(String)
+    mime_type = Column(String)
+    expires_at = Column(DateTime, index=True) # Remote expiry (UTC); re-upload after this
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class FlyerSource(Base):
+    __tablename__ = "flyer_sources"
+
+    id = Column(Integer, primary_key=True, index=True)
+    store = Column(String, nullable=False)
+    region = Column(String, nullable=False)
+    url = Column(String, unique=True, nullable=False)
+    selectors = Column(JSON, nullable=True) # CSS selector overrides for this site's markup
+    enabled = Column(Boolean, default=True)
+    etag = Column(String, nullable=True) # Validators from the last 200, sent back as conditional headers
+    last_modified = Column(String, nullable=True)
+    last_fetched_at = Column(DateTime, nullable=True)
+    last_status = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+class BargainItem(Base):
+    __tablename__ = "bargain_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_id = Column(Integer, ForeignKey("flyer_sources.id"), index=True)
+    store = Column(String, nullable=False)
+    region = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    price = Column(Integer, nullable=True) # Yen
+    unit = Column(String, nullable=True)
+    valid_from = Column(Date, nullable=True)
+    valid_until = Column(Date, nullable=True) # Inclusive
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # get_bargain_items: current items for a region (optionally one store)
+        Index("ix_bargain_items_region_store_valid_until", "region", "store", "valid_until"),
+        Index("ix_bargain_items_store_valid_until", "store", "valid_until"),
+    )
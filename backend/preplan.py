@@ -0,0 +1,44 @@
+"""Off-peak weekly plan pre-generation.
+
+Usage (from the repository root):
+    python -m backend.preplan                     # during PREPLAN_HOURS, every PREPLAN_CHECK_INTERVAL seconds
+    python -m backend.preplan --once              # single pass now, ignoring the window (cron)
+    GENAI_BACKEND=fake python -m backend.preplan --once --budget 20000   # offline, with the fake model
+
+The API process runs the same schedule itself when PREPLAN_ENABLED=true.
+"""
+import argparse
+import asyncio
+import json
+
+from backend import database, models
+from backend.services.log_service import configure_logging
+from backend.services.preplan_service import PREPLAN_CONCURRENCY, PREPLAN_TOKEN_BUDGET, PreplanScheduler, run_pass
+
+
+async def _run(args):
+    scheduler = PreplanScheduler(token_budget=args.budget, concurrency=args.concurrency)
+    scheduler.start()
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate draft meal plans for recent households")
+    parser.add_argument("--once", action="store_true", help="run a single pass now and exit")
+    parser.add_argument("--budget", type=int, default=PREPLAN_TOKEN_BUDGET, help="estimated tokens per off-peak window")
+    parser.add_argument("--concurrency", type=int, default=PREPLAN_CONCURRENCY, help="model calls in flight")
+    args = parser.parse_args()
+
+    configure_logging()
+    models.Base.metadata.create_all(bind=database.engine)
+    if args.once:
+        print(json.dumps(run_pass(token_budget=args.budget, concurrency=args.concurrency), indent=2))
+        return
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,90 @@
 import os
-import json
+import contextvars
+import copy
+import threading
 import time
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from backend.services import metrics_service, schemas
+from backend.services.cache_service import (
+    canonical_names, detection_cache, detection_cache_key, hash_file, plan_cache, recipe_cache,
+)
+from backend.services.gemini_file_service import GeminiFileRegistry
+from backend.services.ingredient_normalizer import get_normalizer
+from backend.services.json_stream import IncrementalArrayParser
+from backend.services.llm_gateway import LLMGateway, LLMUnavailableError, estimate_tokens
+from backend.services.log_service import get_logger
+from backend.services.recipe_index import get_recipe_index, plan_dishes
+
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+logger = get_logger(__name__)
+
+# GENAI_BACKEND=fake swaps in an offline stand-in (see services/fake_genai.py)
+GENAI_BACKEND = os.getenv("GENAI_BACKEND", "google")
+
+class _LazyGenai:
+    """Stands in for the genai module until it is first used.
+
+    Importing google.generativeai (grpc, protobuf) takes seconds, so it is
+    paid by the lifespan warm-up or the first model call, not at import.
+    """
+
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    if GENAI_BACKEND == "fake":
+                        from backend.services import fake_genai as module
+                    else:
+                        import google.generativeai as module
+                    module.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                    self._module = module
+                    logger.info("Loaded genai SDK", extra={"backend": GENAI_BACKEND, "seconds": round(time.perf_counter() - started, 3)})
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+genai = _LazyGenai()
 
 # Use a model that supports vision and JSON mode if possible, 
 # or use standard prompting. Gemini 1.5 Flash is good for speed/cost.
 MODEL_NAME = "gemini-flash-latest"
-print(f"[Backend] Using Gemini Model: {MODEL_NAME}") 
+logger.info("Using Gemini model %s", MODEL_NAME)
+
+# All model calls go through one gateway: shared model objects, rate limits,
+# retries and circuit breaking (see services/llm_gateway.py)
+gateway = LLMGateway(genai)
+
+# Reuses uploaded file handles across analyses, keyed by content hash
+file_registry = GeminiFileRegistry(genai, gateway)
+JSON_CONFIG = {"response_mime_type": "application/json"}
 
-def upload_to_gemini(path, mime_type="image/jpeg"):
-    """Uploads the given file to Gemini."""
-    file = genai.upload_file(path, mime_type=mime_type)
-    # Verify usage if needed, but for now just return the file object
-    return file
+def warm_up():
+    """Loads the SDK and builds the shared model object ahead of the first analysis."""
+    genai.load()
+    gateway.model(MODEL_NAME, JSON_CONFIG)
+
+def _has_valid_api_key() -> bool:
+    if GENAI_BACKEND == "fake":
+        return True
+    api_key = os.getenv("GOOGLE_API_KEY")
+    return bool(api_key) and "INSERT_YOUR_KEY" not in api_key and "dummy" not in api_key and len(api_key) >= 10
 
 # --- Prompts ---
+# Bump when INGREDIENT_PROMPT changes so cached detections are not reused
+INGREDIENT_PROMPT_VERSION = "v1"
 
 INGREDIENT_PROMPT = """
 Analyze these images of a refrigerator/pantry. 
@@ -56,9 +120,9 @@ Based on the provided INGREDIENTS and BARGAIN_ITEMS, create a 1-week meal plan.
 Rules:
 1. Prioritize using the INGREDIENTS (minimize waste).
 2. Incorporate BARGAIN_ITEMS where possible to save money.
-3. Suggest a Shopping List for ALL missing items. 
-   **CRITICAL**: For every single dish calculated, list ALL ingredients required. If an ingredient is NOT in the provided `INGREDIENTS` list, you MUST add it to the `shopping_list`.
-   (Example: If "Salmon Meuniere" is in the menu but "Salmon" is not in INGREDIENTS, you MUST add "Salmon" to `shopping_list`. Do not assume the user has basic seasonings, list everything just in case, or at least main proteins and vegetables).
+3. Prefer dishes from CANDIDATE_DISHES (best use of INGREDIENTS first) and copy their names exactly.
+   Other dishes are allowed; only for those, list ingredients missing from INGREDIENTS in `shopping_list`.
+   (Shopping items for CANDIDATE_DISHES are calculated separately - do not list them.)
 4. Output strictly in Japanese.
 
 RETURN JSON ONLY. Format:
@@ -79,65 +143,183 @@ RETURN JSON ONLY. Format:
   ]
 }
 """
+# --- Detection Settings ---
+# single: all photos in one call. fanout: groups of DETECTION_GROUP_SIZE photos
+# in parallel calls, merged afterwards. auto: fanout from DETECTION_FANOUT_MIN_IMAGES photos.
+DETECTION_MODE = os.getenv("DETECTION_MODE", "auto")
+DETECTION_FANOUT_MIN_IMAGES = int(os.getenv("DETECTION_FANOUT_MIN_IMAGES", "3"))
+DETECTION_GROUP_SIZE = max(1, int(os.getenv("DETECTION_GROUP_SIZE", "1")))
+# Calls in flight per process (the gateway's LLM_MAX_CONCURRENCY still applies)
+DETECTION_CONCURRENCY = int(os.getenv("DETECTION_CONCURRENCY", "4"))
+_detection_pool = ThreadPoolExecutor(max_workers=DETECTION_CONCURRENCY, thread_name_prefix="detect")
 
-def detect_ingredients(image_paths: list[str]):
-    api_key = os.getenv("GOOGLE_API_KEY")
+# Dishes from the recipe index offered to the planner, ranked by pantry coverage
+PLAN_CANDIDATE_DISHES = int(os.getenv("PLAN_CANDIDATE_DISHES", "30"))
+
+def detect_ingredients(image_paths: list[str], image_hashes: list[str] | None = None):
     # Fail fast if API key is missing or default
-    if not api_key or "INSERT_YOUR_KEY" in api_key or "dummy" in api_key or len(api_key) < 10:
-        print("WARN: Invalid GOOGLE_API_KEY. Returning mock data.")
+    if not _has_valid_api_key():
+        logger.warning("Invalid GOOGLE_API_KEY, returning mock ingredients")
+        metrics_service.fallback_total.inc(stage="detection", reason="no_api_key")
         return {
             "ingredients": [
                 {"name": "卵", "category": "その他"},
                 {"name": "牛乳", "category": "乳製品"},
                 {"name": "人参", "category": "野菜"},
                 {"name": "豚肉", "category": "肉類"}
-            ]
+            ],
+            "fallback": True,
         }
 
-    try:
-        model = genai.GenerativeModel(MODEL_NAME, generation_config={"response_mime_type": "application/json"})
-        
-        parts = [INGREDIENT_PROMPT]
-        uploaded_files = []
-        
-        for path in image_paths:
-            if os.path.exists(path):
-                # Upload file to Gemini (returns a file handle)
-                uploaded_file = upload_to_gemini(path)
-                uploaded_files.append(uploaded_file)
-                parts.append(uploaded_file)
-        
-        if len(uploaded_files) == 0:
-             return {"ingredients": []}
+    existing_paths = [path for path in image_paths if os.path.exists(path)]
+    if len(existing_paths) == 0:
+        return {"ingredients": []}
 
-        response = model.generate_content(parts)
-        
-        # Cleanup uploaded files (optional but good practice if short lived)
-        # for f in uploaded_files:
-        #    f.delete() 
-            
-        return json.loads(response.text)
-        
+    if image_hashes is None:
+        image_hashes = [hash_file(path) for path in existing_paths]
+
+    mode = detection_mode(len(existing_paths))
+    started = time.perf_counter()
+    try:
+        if mode == "fanout":
+            result = _detect_fanout(existing_paths, image_hashes)
+        else:
+            result = _detect_group(existing_paths, image_hashes)
+    except LLMUnavailableError:
+        # Upstream down/throttled: let the job queue retry instead of returning fake data
+        raise
     except Exception as e:
-        import traceback
-        print(f"Gemini Detection Error: {type(e).__name__}: {e}")
-        traceback.print_exc()
+        logger.exception("Gemini detection failed, returning fallback ingredients: %s", type(e).__name__)
+        metrics_service.fallback_total.inc(stage="detection", reason=type(e).__name__)
+        # Fallback data is never cached
         return {
             "ingredients": [
                 {"name": "卵", "category": "その他"},
                 {"name": "牛乳", "category": "乳製品"},
                 {"name": "ほうれん草", "category": "野菜"}
-            ]
+            ],
+            "fallback": True,
         }
+    finally:
+        metrics_service.detection_seconds.observe(time.perf_counter() - started, mode=mode)
 
-def generate_plan(ingredients: list, bargain_items: list[str]):
+    logger.info(
+        "Detection finished",
+        extra={"mode": mode, "image_count": len(existing_paths), "seconds": round(time.perf_counter() - started, 3)},
+    )
+    return result
+
+def detection_mode(image_count: int, mode: str = DETECTION_MODE) -> str:
+    """"single" or "fanout" for a session with image_count photos."""
+    if mode == "auto":
+        mode = "fanout" if image_count >= DETECTION_FANOUT_MIN_IMAGES else "single"
+    # Fanning out a single group would only add overhead
+    if mode == "fanout" and image_count <= DETECTION_GROUP_SIZE:
+        return "single"
+    return mode
+
+def _cached_detection(image_hashes: list[str]) -> tuple[str, dict | None]:
+    # Same photo set + model + prompt => same answer; skip Gemini entirely
+    cache_key = detection_cache_key(image_hashes, MODEL_NAME, INGREDIENT_PROMPT_VERSION)
+    cached = detection_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Detection cache hit", extra={"cache_key": cache_key[:12]})
+        metrics_service.cache_total.inc(cache="detection", result="hit")
+        return cache_key, _normalize_detection(copy.deepcopy(cached))
+    metrics_service.cache_total.inc(cache="detection", result="miss")
+    return cache_key, None
+
+def _detect_group(paths: list[str], image_hashes: list[str]) -> dict:
+    """One generate_content call for a group of images (all of them in single mode)."""
+    cache_key, cached = _cached_detection(image_hashes)
+    if cached is not None:
+        return cached
+
+    # Live handles are reused; only new/expired images are uploaded (in parallel).
+    # Expired remote files are removed by the registry's background cleanup.
+    with metrics_service.stage_seconds.time(stage="model_upload"):
+        parts = [INGREDIENT_PROMPT] + file_registry.get_parts(paths)
+
+    response = gateway.generate(parts, MODEL_NAME, JSON_CONFIG)
+
+    with metrics_service.json_parse_seconds.time(kind="detection"):
+        parsed = schemas.decode("detection", response.text)
+    result = _normalize_detection(parsed)
+
+    detection_cache.set(cache_key, result, MODEL_NAME, INGREDIENT_PROMPT_VERSION)
+    return copy.deepcopy(result)
+
+def _detect_fanout(paths: list[str], image_hashes: list[str]) -> dict:
+    """Detects each group of DETECTION_GROUP_SIZE images concurrently and merges the lists.
+
+    Groups are cached on their own, so photos seen in another session and
+    groups that succeeded before a retry are not sent again. A group that
+    fails is skipped and its paths are listed in "failed_paths" (so they
+    can be detected again later); only if every group fails does the
+    caller fall back.
+    """
+    cache_key, cached = _cached_detection(image_hashes)
+    if cached is not None:
+        return cached
+
+    groups = [
+        (paths[i:i + DETECTION_GROUP_SIZE], image_hashes[i:i + DETECTION_GROUP_SIZE])
+        for i in range(0, len(paths), DETECTION_GROUP_SIZE)
+    ]
+    # Copied context keeps the session id on log lines from the pool threads
+    futures = [
+        _detection_pool.submit(contextvars.copy_context().run, _detect_group, group_paths, group_hashes)
+        for group_paths, group_hashes in groups
+    ]
+    ingredients = []
+    failed = 0
+    failed_paths = []
+    unavailable = None
+    for (group_paths, _), future in zip(groups, futures):
+        try:
+            ingredients.extend(future.result()["ingredients"])
+        except LLMUnavailableError as e:
+            unavailable = e
+        except Exception as e:
+            failed += 1
+            failed_paths.extend(group_paths)
+            logger.warning("Detection failed for %s: %s: %s", group_paths, type(e).__name__, e)
+            metrics_service.fallback_total.inc(stage="detection_group", reason=type(e).__name__)
+
+    if unavailable is not None:
+        # Finished groups are cached, so the job's retry only repeats the rest
+        raise unavailable
+    if failed == len(groups):
+        raise RuntimeError(f"Detection failed for all {len(groups)} image group(s)")
+
+    result = _normalize_detection({"ingredients": ingredients})
+    if failed:
+        # A partial merge is served once but never cached for the whole set
+        result["failed_paths"] = failed_paths
+        return result
+    detection_cache.set(cache_key, result, MODEL_NAME, INGREDIENT_PROMPT_VERSION)
+    return copy.deepcopy(result)
+
+def _normalize_detection(result: dict) -> dict:
+    # Merge spelling variants and duplicates across images (人参 / にんじん / ニンジン)
+    result["ingredients"] = get_normalizer().dedupe(result.get("ingredients", []))
+    return result
+
+def merge_ingredients(existing: list, added: list) -> list:
+    """Ingredients of an earlier detection plus new ones, deduped across spellings."""
+    return _normalize_detection({"ingredients": list(existing) + list(added)})["ingredients"]
+
+def ingredient_set(ingredients: list) -> tuple:
+    """Sorted canonical names, for comparing ingredient lists."""
+    return canonical_names(_ingredient_names(ingredients))
+
+def _ingredient_names(ingredients: list) -> list[str]:
     # Handle both old format (list of strings) and new format (list of dicts)
-    # Extract ingredient names for planning
     if ingredients and isinstance(ingredients[0], dict):
-        ingredient_names = [ing["name"] for ing in ingredients]
-    else:
-        ingredient_names = ingredients
-    
+        return [ing["name"] for ing in ingredients]
+    return ingredients
+
+def _mock_plan(ingredient_names: list[str]):
     # Allow mock plan if in mock mode
     if any("(Mock)" in str(i) or "Mock" in str(i) for i in ingredient_names):
         time.sleep(1) # Simulate thinking
@@ -151,41 +333,206 @@ def generate_plan(ingredients: list, bargain_items: list[str]):
                 {"item": "Bread", "reason": "missing for Toast"}
             ]
         }
+    return None
+
+def _fallback_plan():
+    return {
+        "meal_plan": [{"day": "Monday", "meals": {"breakfast": "Toast", "lunch": "Pasta", "dinner": "Curry"}}],
+        "shopping_list": [],
+        "fallback": True,
+    }
 
-    user_content = f"INGREDIENTS: {', '.join(ingredient_names)}\nBARGAIN_ITEMS: {', '.join(bargain_items)}"
+def _planning_request(ingredient_names: list[str], bargain_items: list[str]) -> str:
+    candidates = get_recipe_index().rank_by_coverage(ingredient_names, bargain_items, limit=PLAN_CANDIDATE_DISHES)
+    return (
+        f"INGREDIENTS: {', '.join(ingredient_names)}\n"
+        f"BARGAIN_ITEMS: {', '.join(bargain_items)}\n"
+        f"CANDIDATE_DISHES: {', '.join(c['dish'] for c in candidates)}"
+    )
+
+def _complete_shopping_list(result: dict, ingredient_names: list[str], bargain_items: list[str]) -> dict:
+    """Replaces the shopping list with one derived from the recipe index.
+
+    Items the model listed (for dishes the index doesn't know) are kept
+    after the derived ones.
+    """
+    derived, unknown = get_recipe_index().shopping_list(plan_dishes(result.get("meal_plan")), ingredient_names, bargain_items)
+    if unknown:
+        logger.info("Dishes not in recipe index, relying on model list", extra={"dishes": unknown})
+    seen = {item["item"] for item in derived} | set(ingredient_names)
+    extras = [item for item in result.get("shopping_list") or [] if isinstance(item, dict) and item.get("item")]
+    for item, name in zip(extras, get_normalizer().canonicalize(item["item"] for item in extras)):
+        if name not in seen:
+            seen.add(name)
+            derived.append({**item, "item": name})
+    result["shopping_list"] = derived
+    return result
+
+def plan_token_estimate(ingredients: list, bargain_items: list[str]) -> int:
+    """Tokens a generate_plan call is charged by the gateway (prompt + expected output)."""
+    return estimate_tokens([PLANNING_PROMPT, _planning_request(_ingredient_names(ingredients), bargain_items)])
+
+def generate_plan(ingredients: list, bargain_items: list[str]):
+    # Extract ingredient names for planning
+    ingredient_names = _ingredient_names(ingredients)
+    
+    mock = _mock_plan(ingredient_names)
+    if mock:
+        return mock
+
+    cached = plan_cache.get(ingredient_names, bargain_items)
+    if cached is not None:
+        logger.info("Plan cache hit")
+        metrics_service.cache_total.inc(cache="plan", result="hit")
+        # A near-match hit was planned for other ingredients; rebuild the list for these
+        return _complete_shopping_list(copy.deepcopy(cached), ingredient_names, bargain_items)
+    metrics_service.cache_total.inc(cache="plan", result="miss")
+
+    user_content = _planning_request(ingredient_names, bargain_items)
     
     try:
-        model = genai.GenerativeModel(MODEL_NAME, generation_config={"response_mime_type": "application/json"})
-        response = model.generate_content([PLANNING_PROMPT, user_content])
-        return json.loads(response.text)
+        response = gateway.generate([PLANNING_PROMPT, user_content], MODEL_NAME, JSON_CONFIG)
+        with metrics_service.json_parse_seconds.time(kind="plan"):
+            parsed = schemas.decode("plan", response.text)
+        result = _complete_shopping_list(parsed, ingredient_names, bargain_items)
+        plan_cache.set(ingredient_names, bargain_items, result)
+        return copy.deepcopy(result)
         
+    except LLMUnavailableError:
+        raise
     except Exception as e:
-        print(f"Gemini Planning Error: {e}")
-        return {
-            "meal_plan": [{"day": "Monday", "meals": {"breakfast": "Toast", "lunch": "Pasta", "dinner": "Curry"}}],
-            "shopping_list": []
-        }
+        logger.exception("Gemini planning failed, returning fallback plan: %s", type(e).__name__)
+        metrics_service.fallback_total.inc(stage="planning", reason=type(e).__name__)
+        return _fallback_plan()
+
+def generate_plan_stream(ingredients: list, bargain_items: list[str], on_item):
+    """Like generate_plan, but streams the model output.
+
+    on_item(key, obj) is called with ("meal_plan", day) as soon as each day
+    parses, so callers can persist and forward it before the rest of the
+    week is generated, then with ("shopping_list", item) once the whole
+    plan is known. Returns the full plan.
+    """
+    ingredient_names = _ingredient_names(ingredients)
+
+    def emit_all(plan: dict):
+        for day in plan.get("meal_plan", []):
+            on_item("meal_plan", day)
+        for item in plan.get("shopping_list", []):
+            on_item("shopping_list", item)
+        return plan
+
+    mock = _mock_plan(ingredient_names)
+    if mock:
+        return emit_all(mock)
+
+    cached = plan_cache.get(ingredient_names, bargain_items)
+    if cached is not None:
+        logger.info("Plan cache hit")
+        metrics_service.cache_total.inc(cache="plan", result="hit")
+        return emit_all(_complete_shopping_list(copy.deepcopy(cached), ingredient_names, bargain_items))
+    metrics_service.cache_total.inc(cache="plan", result="miss")
+
+    user_content = _planning_request(ingredient_names, bargain_items)
+    streamed = {"meal_plan": []}
+    started = time.perf_counter()
 
-def suggest_recipes(ingredient: str) -> list[str]:
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        prompt = f"""
-        提案してください:
-        「{ingredient}」をメインに使った、日本の家庭で人気のある作りやすい料理を3つ挙げてください。
-        
-        出力形式:
-        - 料理名1
-        - 料理名2
-        - 料理名3
-        
-        余計な説明・挨拶は一切不要です。料理名のみを箇条書きで返してください。
-        """
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        
-        # Clean up
-        lines = [line.strip().replace("- ", "").replace("* ", "").replace("1. ", "") for line in text.split("\n") if line.strip()]
-        return lines[:3]
+        response = gateway.generate([PLANNING_PROMPT, user_content], MODEL_NAME, JSON_CONFIG, stream=True)
+        parser = IncrementalArrayParser(("meal_plan",))
+        chunks = []
+        for chunk in response:
+            chunks.append(chunk.text)
+            for key, obj in parser.feed(chunk.text):
+                obj = schemas.validate_item(key, obj)
+                if obj is None:
+                    continue  # Malformed day: the final parse drops it too, so never send it
+                if key == "meal_plan" and not streamed["meal_plan"]:
+                    metrics_service.plan_stream_seconds.observe(time.perf_counter() - started, phase="first_day")
+                streamed[key].append(obj)
+                on_item(key, obj)
+        metrics_service.plan_stream_seconds.observe(time.perf_counter() - started, phase="total")
+
+        try:
+            with metrics_service.json_parse_seconds.time(kind="plan"):
+                result = schemas.decode("plan", "".join(chunks))
+        except ValueError:
+            # Entries that parsed while streaming are still a usable plan
+            if not streamed["meal_plan"]:
+                raise
+            result = dict(streamed)
+        result = _complete_shopping_list(result, ingredient_names, bargain_items)
+        for item in result["shopping_list"]:
+            on_item("shopping_list", item)
+        plan_cache.set(ingredient_names, bargain_items, result)
+        return copy.deepcopy(result)
+
+    except LLMUnavailableError:
+        raise
     except Exception as e:
-        print(f"Recipe Suggestion Error: {e}")
-        return [f"{ingredient}のサラダ", f"{ingredient}の炒め物", f"{ingredient}のスープ"] # Fallback
+        logger.exception("Gemini planning failed: %s", type(e).__name__)
+        if streamed["meal_plan"]:
+            # Part of the plan already reached the client; retry rather than mix in fallback data
+            raise
+        metrics_service.fallback_total.inc(stage="planning", reason=type(e).__name__)
+        return emit_all(_fallback_plan())
+
+RECIPE_BATCH_PROMPT = """
+提案してください:
+以下の各食材について、その食材をメインに使った、日本の家庭で人気のある作りやすい料理を3つずつ挙げてください。
+
+食材: {ingredients}
+
+RETURN JSON ONLY. 料理名のみ、説明は不要です。
+Format:
+{{
+  "suggestions": {{
+    "食材名": ["料理名1", "料理名2", "料理名3"]
+  }}
+}}
+"""
+
+# Upper bound on ingredients per model call (keeps prompts/responses small)
+RECIPE_BATCH_MAX = int(os.getenv("RECIPE_BATCH_MAX", "30"))
+
+def _fallback_recipes(ingredient: str) -> list[str]:
+    return [f"{ingredient}のサラダ", f"{ingredient}の炒め物", f"{ingredient}のスープ"]
+
+def suggest_recipes(ingredient: str) -> list[str]:
+    # Blank names are dropped by the batch
+    return suggest_recipes_batch([ingredient]).get(ingredient, [])
+
+def suggest_recipes_batch(ingredients: list[str]) -> dict[str, list[str]]:
+    """Suggests 3 dishes per ingredient. Cache misses are resolved in one JSON call per batch."""
+    spelled = [name for name in ingredients if name and name.strip()]
+    canonical = dict(zip(spelled, get_normalizer().canonicalize(spelled, fuzzy=False)))
+    names = list(dict.fromkeys(canonical.values()))
+    results = {}
+    misses = []
+    for name in names:
+        cached = recipe_cache.get(name)
+        if cached is not None:
+            results[name] = list(cached)
+        else:
+            misses.append(name)
+
+    for start in range(0, len(misses), RECIPE_BATCH_MAX):
+        batch = misses[start:start + RECIPE_BATCH_MAX]
+        try:
+            response = gateway.generate(RECIPE_BATCH_PROMPT.format(ingredients="、".join(batch)), MODEL_NAME, JSON_CONFIG)
+            suggestions = schemas.decode("recipes", response.text)["suggestions"]
+        except Exception as e:
+            logger.warning("Recipe suggestion failed: %s: %s", type(e).__name__, e)
+            suggestions = {}
+
+        for name in batch:
+            dishes = [str(d).strip() for d in suggestions.get(name, []) if str(d).strip()][:3]
+            if dishes:
+                recipe_cache.set(name, dishes)
+                results[name] = dishes
+            else:
+                results[name] = _fallback_recipes(name) # Fallback (not cached)
+                metrics_service.fallback_total.inc(stage="recipes", reason="no_suggestion")
+
+    # Keep the caller's spelling as keys (e.g. surrounding whitespace, にんじん vs 人参)
+    return {name: results[canonical[name]] for name in spelled}
@@ -0,0 +1,267 @@
+import os
+import time
+from datetime import datetime
+
+from backend import models
+from backend.services import event_service, metrics_service, preplan_service
+from backend.services.ai_service import (
+    _complete_shopping_list, detect_ingredients, generate_plan_stream, ingredient_set, merge_ingredients,
+)
+from backend.services.cache_service import jaccard
+from backend.services.image_service import IMAGE_KEEP_ORIGINALS, preprocess_images
+from backend.services.ingredient_normalizer import get_normalizer
+from backend.services.log_service import get_logger, session_context
+from backend.services.scraper_service import get_bargain_items
+from backend.services.storage_service import get_storage
+
+logger = get_logger(__name__)
+stage_seconds = metrics_service.stage_seconds
+
+# Re-analysis keeps the existing plan while the Jaccard similarity between
+# the new ingredient set and the one the plan was made for stays at or above this
+REPLAN_SIMILARITY_THRESHOLD = float(os.getenv("REPLAN_SIMILARITY_THRESHOLD", "0.8"))
+
+
+def _commit(db):
+    with stage_seconds.time(stage="db_commit"):
+        lease = db.info.get("lease")  # Set by the job worker: commit only while it still holds the job
+        if lease is not None:
+            lease.fence(db)
+        db.commit()
+
+
+def run_analysis(db, session_id: str):
+    """Runs the detect -> bargains -> plan pipeline for a DB session.
+
+    Re-analysis is incremental: only images without `analyzed_at` are
+    detected and merged into the existing ingredients, and the plan is
+    regenerated only if the ingredient set moved below
+    REPLAN_SIMILARITY_THRESHOLD from the one it was made for; otherwise
+    it is kept and the shopping list patched.
+
+    Exceptions propagate to the caller (the job worker), which decides
+    whether to retry or mark the session as failed.
+    """
+    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    if not db_session:
+        raise ValueError(f"Session not found: {session_id}")
+    if not db_session.image_paths:
+        raise ValueError(f"No images for session: {session_id}")
+
+    db_session.status = "analyzing"
+    _commit(db)
+    event_service.publish(session_id, "analyzing")
+
+    # Step A: Ingredients (new images only, if earlier ones were already analyzed)
+    rows = db.query(models.UploadedImage).filter(models.UploadedImage.session_id == session_id).all()
+    analyzed = {row.path for row in rows if row.analyzed_at is not None}
+    incremental = bool(analyzed) and db_session.detected_ingredients is not None
+    pending_paths = [path for path in db_session.image_paths if path not in analyzed] if incremental else db_session.image_paths
+    pending = set(pending_paths)
+    pending_rows = [row for row in rows if row.path in pending]
+
+    ingredients = list(db_session.detected_ingredients or []) if incremental else []
+    if pending_paths:
+        # The job may run on a node that didn't receive the upload
+        image_paths = get_storage().ensure_local(pending_paths)
+        # Hashes are of the uploaded bytes, so look them up before preprocessing renames anything
+        image_hashes = _image_hashes(rows, image_paths)
+        with stage_seconds.time(stage="preprocess"):
+            model_paths = _preprocess(db, db_session, image_paths)
+        logger.info("Starting detection", extra={"image_count": len(model_paths), "incremental": incremental})
+        with stage_seconds.time(stage="detection"):
+            detection_result = detect_ingredients(model_paths, image_hashes)
+        # Fan-out groups that failed: leave their rows unmarked so the next analysis retries them
+        failed_paths = set(detection_result.get("failed_paths", []))
+        failed_paths |= {path for path, model_path in zip(image_paths, model_paths) if model_path in failed_paths}
+        pending_rows = [row for row in pending_rows if row.path not in failed_paths]
+        if detection_result.get("fallback"):
+            pending_rows = []  # Mock data: detect these images again next time
+            if not incremental:
+                # Nothing real to keep yet; show the mock list as before
+                ingredients = detection_result.get("ingredients", [])
+            # Incremental: keep the earlier, real ingredients and don't mix mock ones in
+        else:
+            ingredients = merge_ingredients(ingredients, detection_result.get("ingredients", []))
+
+    db_session.detected_ingredients = ingredients
+    db_session.status = "ingredients_ready"
+    analyzed_at = datetime.utcnow()
+    for row in pending_rows:
+        row.analyzed_at = analyzed_at
+    _commit(db)
+    event_service.publish(session_id, "ingredients_ready", ingredients=ingredients)
+
+    names = ingredient_set(ingredients)
+    plan_row = db_session.meal_plan
+    list_row = db_session.shopping_list
+    if _plan_still_fits(plan_row, list_row, names):
+        # Step B': keep the plan, drop shopping items that are now in the fridge
+        list_row.content = _without_owned_items(list_row.content or [], names)
+        metrics_service.replan_total.inc(decision="kept")
+        logger.info("Kept existing plan", extra={"ingredient_count": len(names)})
+    else:
+        # Step B: Bargain Items
+        with stage_seconds.time(stage="bargains"):
+            bargains = get_bargain_items()
+        draft = preplan_service.take_draft(db, names, bargains)
+        if draft is not None:
+            metrics_service.replan_total.inc(decision="draft")
+            _apply_draft(db, db_session, draft, names, bargains)
+        else:
+            metrics_service.replan_total.inc(decision="replanned" if plan_row is not None else "new")
+            _plan(db, db_session, ingredients, names, bargains)
+
+    db_session.status = "done"
+    _commit(db)
+    event_service.publish(session_id, "done")
+    metrics_service.analysis_total.inc(outcome="done")
+
+    return {"status": "done", "ingredients": ingredients}
+
+
+def _plan_still_fits(plan_row, list_row, names: tuple) -> bool:
+    """Whether the stored plan was made for (nearly) this ingredient set."""
+    if plan_row is None or list_row is None or not plan_row.content or plan_row.ingredient_names is None:
+        return False  # No plan yet, or an earlier attempt was interrupted mid-plan
+    return jaccard(set(names), set(plan_row.ingredient_names)) >= REPLAN_SIMILARITY_THRESHOLD
+
+
+def _without_owned_items(items: list, names: tuple) -> list:
+    owned = set(names)
+    spelled = [item.get("item", "") if isinstance(item, dict) else str(item) for item in items]
+    canonical = get_normalizer().canonicalize(spelled, fuzzy=False)
+    return [item for item, name in zip(items, canonical) if name not in owned]
+
+
+def _apply_draft(db, db_session, draft: dict, names: tuple, bargains: list[str]):
+    """Stores a pre-generated plan as the session's plan, with the same events a streamed one sends.
+
+    The draft was planned for a similar, not the same, ingredient set: its
+    shopping list is rebuilt for this session's ingredients.
+    """
+    session_id = db_session.id
+    plan_row = db_session.meal_plan or models.GeneratedPlan(session_id=session_id)
+    list_row = db_session.shopping_list or models.ShoppingList(session_id=session_id)
+    plan = _complete_shopping_list(
+        {"meal_plan": draft["meal_plan"], "shopping_list": draft["shopping_list"]}, list(names), bargains,
+    )
+    plan_row.content, plan_row.time_to_first_day_ms = plan["meal_plan"], 0
+    plan_row.ingredient_names = list(names)
+    list_row.content = plan["shopping_list"]
+    db.add_all([plan_row, list_row])
+    for index, day in enumerate(plan_row.content):
+        event_service.publish_progress(session_id, "plan_day", index=index, day=day)
+    for item in list_row.content:
+        event_service.publish_progress(session_id, "shopping_item", item=item)
+
+
+def _plan(db, db_session, ingredients: list, names: tuple, bargains: list[str]):
+    session_id = db_session.id
+
+    # Step C: Generate Plan (streamed; each day is saved and pushed as it parses)
+    logger.info("Starting planning", extra={"ingredient_count": len(ingredients)})
+    # Retried jobs and re-analyses find existing rows; reset instead of duplicating
+    plan_row = db_session.meal_plan or models.GeneratedPlan(session_id=session_id)
+    list_row = db_session.shopping_list or models.ShoppingList(session_id=session_id)
+    plan_row.content, plan_row.time_to_first_day_ms, plan_row.ingredient_names = [], None, None
+    list_row.content = []
+    db.add_all([plan_row, list_row])
+    _commit(db)
+
+    started = time.perf_counter()
+
+    def on_item(key, item):
+        if key == "meal_plan":
+            if plan_row.time_to_first_day_ms is None:
+                plan_row.time_to_first_day_ms = int((time.perf_counter() - started) * 1000)
+            # Reassign rather than append so SQLAlchemy sees the JSON change
+            plan_row.content = plan_row.content + [item]
+            _commit(db)
+            event_service.publish_progress(session_id, "plan_day", index=len(plan_row.content) - 1, day=item)
+        else:
+            list_row.content = list_row.content + [item]
+            _commit(db)
+            event_service.publish_progress(session_id, "shopping_item", item=item)
+
+    with stage_seconds.time(stage="planning"):
+        plan_result = generate_plan_stream(ingredients, bargains, on_item)
+
+    # The final parse is authoritative (it may differ from what streamed if a chunk was malformed)
+    plan_row.content = plan_result.get("meal_plan", [])
+    list_row.content = plan_result.get("shopping_list", [])
+    # Set last: a plan without it is treated as incomplete by the next analysis
+    if not plan_result.get("fallback"):
+        plan_row.ingredient_names = list(names)
+
+
+def _image_hashes(rows: list, image_paths: list[str]):
+    """Upload-time content hashes for the given images, or None if any are missing."""
+    by_path = {row.path: row.sha256 for row in rows}
+    hashes = [by_path.get(path) for path in image_paths if os.path.exists(path)]
+    if not hashes or None in hashes:
+        return None  # Sessions from before hashing: detect_ingredients hashes the files itself
+    return hashes
+
+
+def _preprocess(db, db_session, image_paths: list[str]) -> list[str]:
+    """Shrinks images before model upload; records new paths if originals were replaced."""
+    model_paths = preprocess_images(image_paths)
+    if not IMAGE_KEEP_ORIGINALS and model_paths != image_paths:
+        renamed = dict(zip(image_paths, model_paths))
+        get_storage().commit([path for path in model_paths if path not in image_paths])
+        db_session.image_paths = [renamed.get(path, path) for path in db_session.image_paths]
+        for row in db.query(models.UploadedImage).filter(models.UploadedImage.session_id == db_session.id):
+            row.path = renamed.get(row.path, row.path)
+        _commit(db)
+    return model_paths
+
+
+def run_mock_analysis(mock_session: dict):
+    """Same pipeline for in-memory sessions (used when the DB is unavailable)."""
+    with session_context(mock_session["id"]):
+        _run_mock_analysis(mock_session)
+
+
+def _run_mock_analysis(mock_session: dict):
+    try:
+        mock_session["status"] = "analyzing"
+        event_service.publish(mock_session["id"], "analyzing")
+        with stage_seconds.time(stage="preprocess"):
+            model_paths = preprocess_images(mock_session["image_paths"])
+        if not IMAGE_KEEP_ORIGINALS:
+            mock_session["image_paths"] = model_paths
+        logger.info("Starting detection", extra={"image_count": len(model_paths)})
+        with stage_seconds.time(stage="detection"):
+            detection_result = detect_ingredients(model_paths)
+        ingredients = detection_result.get("ingredients", [])
+        mock_session["detected_ingredients"] = ingredients
+        mock_session["status"] = "ingredients_ready"
+        event_service.publish(mock_session["id"], "ingredients_ready", ingredients=ingredients)
+
+        with stage_seconds.time(stage="bargains"):
+            bargains = get_bargain_items()
+        logger.info("Starting planning", extra={"ingredient_count": len(ingredients)})
+        mock_session["meal_plan"] = []
+        mock_session["shopping_list"] = []
+
+        def on_item(key, item):
+            mock_session[key] = mock_session[key] + [item]
+            if key == "meal_plan":
+                event_service.publish_progress(mock_session["id"], "plan_day", index=len(mock_session[key]) - 1, day=item)
+            else:
+                event_service.publish_progress(mock_session["id"], "shopping_item", item=item)
+
+        with stage_seconds.time(stage="planning"):
+            plan_result = generate_plan_stream(ingredients, bargains, on_item)
+
+        mock_session["meal_plan"] = plan_result.get("meal_plan", [])
+        mock_session["shopping_list"] = plan_result.get("shopping_list", [])
+        mock_session["status"] = "done"
+        event_service.publish(mock_session["id"], "done")
+        metrics_service.analysis_total.inc(outcome="done")
+    except Exception as e:
+        logger.exception("Analysis failed: %s", type(e).__name__)
+        metrics_service.analysis_total.inc(outcome="error")
+        mock_session["status"] = "error"
+        event_service.publish(mock_session["id"], "error")
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from backend import database, models
+from backend.services.ingredient_normalizer import get_normalizer
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an entry bound and optional TTL (seconds)."""
+
+    def __init__(self, max_entries: int = 256, ttl: float | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of live (key, value) pairs, most recently used last."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (v, exp) in self._data.items() if exp is None or exp >= now]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# --- Ingredient Detection Cache ---
+
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "512"))
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def detection_cache_key(image_hashes: list[str], model_name: str, prompt_version: str) -> str:
+    """Order-independent key: the same photos in any order hit the same entry."""
+    payload = json.dumps([sorted(set(image_hashes)), model_name, prompt_version])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DetectionCache:
+    """Two-tier cache of detection results: in-memory LRU over the detection_cache table."""
+
+    def __init__(self, max_entries: int = DETECTION_CACHE_SIZE):
+        self.memory = LRUCache(max_entries=max_entries)
+        self.db_hits = 0
+
+    def get(self, key: str):
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+
+        db = database.SessionLocal()
+        try:
+            entry = db.query(models.DetectionCacheEntry).filter(models.DetectionCacheEntry.key == key).first()
+            if entry is None:
+                return None
+            result = entry.result
+        except Exception as e:
+            logger.warning("Detection cache read failed: %s", e)
+            return None
+        finally:
+            db.close()
+
+        self.db_hits += 1
+        self.memory.set(key, result)
+        return result
+
+    def set(self, key: str, result: dict, model_name: str, prompt_version: str):
+        self.memory.set(key, result)
+        db = database.SessionLocal()
+        try:
+            db.merge(models.DetectionCacheEntry(
+                key=key, model=model_name, prompt_version=prompt_version, result=result
+            ))
+            db.commit()
+        except Exception as e:
+            logger.warning("Detection cache write failed: %s", e)
+            db.rollback()
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {**self.memory.stats(), "db_hits": self.db_hits}
+
+
+detection_cache = DetectionCache()
+
+
+# --- Meal Plan Cache ---
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", str(6 * 3600)))
+# Jaccard similarity of ingredient sets at or above which a cached plan is
+# reused. 1.0 = exact matches only.
+PLAN_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("PLAN_CACHE_SIMILARITY_THRESHOLD", "1.0"))
+
+
+def canonical_names(names) -> tuple:
+    # Spelling variants (にんじん / 人参) share one cache entry
+    return tuple(sorted({name for name in get_normalizer().canonicalize(names, fuzzy=False) if name}))
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class PlanCache:
+    """LRU/TTL cache of generated plans keyed by canonical ingredient + bargain sets.
+
+    Households photograph roughly the same fridge every week, so with a
+    threshold below 1.0 a plan for a near-identical ingredient set (same
+    bargains) is served instead of calling the model again.
+    """
+
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE, ttl: float = PLAN_CACHE_TTL,
+                 threshold: float = PLAN_CACHE_SIMILARITY_THRESHOLD):
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def set_threshold(self, threshold: float):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+
+    def get(self, ingredient_names, bargain_items):
+        ingredients = canonical_names(ingredient_names)
+        bargains = canonical_names(bargain_items)
+
+        plan = self.memory.get((ingredients, bargains))
+        if plan is not None:
+            with self._lock:
+                self.exact_hits += 1
+            return plan
+
+        if self.threshold < 1.0:
+            wanted = set(ingredients)
+            best, best_score = None, self.threshold
+            for (cached_ingredients, cached_bargains), cached_plan in self.memory.items():
+                if cached_bargains != bargains:
+                    continue
+                score = jaccard(wanted, set(cached_ingredients))
+                if score >= best_score:
+                    best, best_score = (cached_ingredients, cached_bargains), score
+            plan = self.memory.get(best) if best is not None else None
+            if plan is not None:
+                with self._lock:
+                    self.near_hits += 1
+                return plan
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, ingredient_names, bargain_items, plan: dict):
+        self.memory.set((canonical_names(ingredient_names), canonical_names(bargain_items)), plan)
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "size": len(self.memory),
+            "max_entries": self.memory.max_entries,
+            "ttl_seconds": self.memory.ttl,
+            "similarity_threshold": self.threshold,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0.0,
+            "evictions": self.memory.evictions,
+        }
+
+
+plan_cache = PlanCache()
+
+
+# --- Recipe Suggestion Memo ---
+
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "2048"))
+RECIPE_CACHE_TTL = float(os.getenv("RECIPE_CACHE_TTL", str(24 * 3600)))
+
+# ingredient name -> list of dish names
+recipe_cache = LRUCache(max_entries=RECIPE_CACHE_SIZE, ttl=RECIPE_CACHE_TTL)
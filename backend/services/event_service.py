@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import select
+import threading
+
+from sqlalchemy import text
+
+from backend import database
+from backend.services import schemas
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+# "postgres": publish through NOTIFY so every API process sees every event.
+# "memory": in-process only (single process / SQLite / tests).
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "postgres" if database.IS_POSTGRES else "memory")
+NOTIFY_CHANNEL = "session_events"
+# Seconds between SSE comment lines that keep proxies from closing idle streams
+KEEPALIVE_INTERVAL = float(os.getenv("EVENTS_KEEPALIVE_INTERVAL", "15"))
+
+TERMINAL_STATUSES = ("done", "error")
+
+
+class EventBroker:
+    """In-process pub/sub of session events.
+
+    Subscribers are asyncio queues bound to their event loop; publishers may
+    be any thread (job workers, the LISTEN thread), so delivery goes through
+    call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set] = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """Registers callback(session_id, event), run for every event in the publishing thread."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(session_id, set()).add(entry)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        with self._lock:
+            entries = self._subscribers.get(session_id)
+            if not entries:
+                return
+            entries.difference_update({e for e in entries if e[1] is queue})
+            if not entries:
+                del self._subscribers[session_id]
+
+    def dispatch(self, session_id: str, event: dict):
+        with self._lock:
+            entries = list(self._subscribers.get(session_id, ()))
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(session_id, event)
+            except Exception as e:
+                logger.warning("Event listener failed: %s", e)
+        for loop, queue in entries:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Loop already closed (client went away during shutdown)
+                pass
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._subscribers.values())
+
+
+broker = EventBroker()
+
+
+def publish(session_id: str, status: str, **data):
+    """Publishes a session status change. Never raises: events are best effort."""
+    _deliver(session_id, {"session_id": session_id, "status": status, **data})
+
+
+def publish_progress(session_id: str, event_type: str, **data):
+    """Publishes a partial result (e.g. "plan_day", "shopping_item") while a stage is still running."""
+    _deliver(session_id, {"type": event_type, "session_id": session_id, **data})
+
+
+async def publish_async(session_id: str, status: str, **data):
+    """publish() for request handlers: NOTIFY goes through the async engine instead of blocking the loop."""
+    event = {"session_id": session_id, "status": status, **data}
+    if EVENTS_BACKEND == "postgres":
+        try:
+            async with database.async_engine.begin() as conn:
+                await conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": NOTIFY_CHANNEL, "payload": json.dumps(event, ensure_ascii=False)},
+                )
+            return
+        except Exception as e:
+            logger.warning("NOTIFY failed, delivering locally: %s", e)
+    broker.dispatch(session_id, event)
+
+
+def _deliver(session_id: str, event: dict):
+    if EVENTS_BACKEND == "postgres":
+        try:
+            with database.engine.begin() as conn:
+                conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": NOTIFY_CHANNEL, "payload": json.dumps(event, ensure_ascii=False)},
+                )
+            return  # Delivered back to this process by the listener
+        except Exception as e:
+            logger.warning("NOTIFY failed, delivering locally: %s", e)
+    broker.dispatch(session_id, event)
+
+
+def format_sse(event: dict) -> str:
+    event_type = event.get("type", "status")
+    return f"event: {event_type}\ndata: {schemas.encode(event).decode('utf-8')}\n\n"
+
+
+class PostgresListener:
+    """Background thread that LISTENs on the notify channel and feeds the broker."""
+
+    def __init__(self, channel: str = NOTIFY_CHANNEL):
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning("LISTEN connection lost, reconnecting: %s", e)
+                self._stop.wait(2)
+
+    def _listen(self):
+        raw = database.engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {self.channel}")
+            logger.info("Listening on %r", self.channel)
+            while not self._stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        event = json.loads(notify.payload)
+                    except ValueError:
+                        continue
+                    broker.dispatch(event.get("session_id"), event)
+        finally:
+            # Never hand a LISTENing connection back to the pool
+            raw.invalidate()
@@ -0,0 +1,168 @@
+"""Offline stand-in for the `google.generativeai` module.
+
+Enable with GENAI_BACKEND=fake. Implements the subset of the SDK the
+backend uses (configure, upload_file/get_file/delete_file/list_files,
+GenerativeModel.generate_content) with canned Japanese responses, so the
+full pipeline can run without network access or an API key.
+
+GENAI_FAKE_LATENCY (seconds per call) and GENAI_FAKE_ERROR_RATE (0..1)
+simulate upstream behaviour.
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+FAKE_LATENCY = float(os.getenv("GENAI_FAKE_LATENCY", "0"))
+FAKE_ERROR_RATE = float(os.getenv("GENAI_FAKE_ERROR_RATE", "0"))
+FAKE_FILE_TTL = timedelta(hours=48)
+
+_files = {}
+_lock = threading.Lock()
+calls = {"upload_file": 0, "delete_file": 0, "generate_content": 0}
+
+
+class FakeUpstreamError(Exception):
+    """Raised at GENAI_FAKE_ERROR_RATE; named like a retryable 503 from the API."""
+
+
+def _simulate_upstream(latency: bool = True):
+    if latency and FAKE_LATENCY:
+        time.sleep(FAKE_LATENCY)
+    if FAKE_ERROR_RATE and random.random() < FAKE_ERROR_RATE:
+        raise FakeUpstreamError("503 Service Unavailable (fake)")
+
+
+def configure(**kwargs):
+    pass
+
+
+class FakeFile:
+    def __init__(self, path: str, mime_type: str):
+        self.name = f"files/{uuid.uuid4().hex[:12]}"
+        self.uri = f"https://fake.genai.local/v1beta/{self.name}"
+        self.display_name = os.path.basename(path)
+        self.mime_type = mime_type
+        self.size_bytes = os.path.getsize(path)
+        self.create_time = datetime.now(timezone.utc)
+        self.expiration_time = self.create_time + FAKE_FILE_TTL
+
+    def delete(self):
+        delete_file(self.name)
+
+
+def upload_file(path, mime_type=None, **kwargs):
+    _simulate_upstream()
+    file = FakeFile(path, mime_type or "image/jpeg")
+    with _lock:
+        _files[file.name] = file
+        calls["upload_file"] += 1
+    return file
+
+
+def get_file(name):
+    with _lock:
+        file = _files.get(name)
+    if file is None or file.expiration_time < datetime.now(timezone.utc):
+        raise KeyError(f"404 File {name} not found")
+    return file
+
+
+def delete_file(name):
+    with _lock:
+        _files.pop(getattr(name, "name", name), None)
+        calls["delete_file"] += 1
+
+
+def list_files(**kwargs):
+    with _lock:
+        return list(_files.values())
+
+
+def reset():
+    with _lock:
+        _files.clear()
+        for key in calls:
+            calls[key] = 0
+
+
+# --- Canned Model Responses ---
+
+_INGREDIENTS = {
+    "ingredients": [
+        {"name": "卵", "category": "その他"},
+        {"name": "牛乳", "category": "乳製品"},
+        {"name": "人参", "category": "野菜"},
+        {"name": "玉ねぎ", "category": "野菜"},
+        {"name": "豚肉", "category": "肉類"},
+        {"name": "醤油", "category": "調味料"},
+    ]
+}
+
+_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+_DINNERS = ["肉じゃが", "豚の生姜焼き", "親子丼", "カレーライス", "鮭のムニエル", "野菜炒め", "オムライス"]
+
+_PLAN = {
+    "meal_plan": [
+        {"day": day, "meals": {"breakfast": "卵かけご飯", "lunch": "焼きそば", "dinner": dinner}}
+        for day, dinner in zip(_DAYS, _DINNERS)
+    ],
+    "shopping_list": [
+        {"item": "じゃがいも", "reason": "missing"},
+        {"item": "鶏もも肉", "reason": "missing"},
+        {"item": "鮭", "reason": "bargain"},
+    ],
+}
+
+
+def _text_of(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(part for part in contents if isinstance(part, str))
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStreamResponse:
+    """Yields the response in chunks, spreading GENAI_FAKE_LATENCY across them."""
+
+    def __init__(self, text: str, chunk_count: int = 12):
+        self.text = text
+        size = max(1, len(text) // chunk_count + 1)
+        self._chunks = [text[i:i + size] for i in range(0, len(text), size)]
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if FAKE_LATENCY:
+                time.sleep(FAKE_LATENCY / len(self._chunks))
+            yield FakeResponse(chunk)
+
+
+class GenerativeModel:
+    def __init__(self, model_name="fake-model", generation_config=None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+
+    def _respond(self, prompt: str) -> str:
+        if "refrigerator" in prompt:
+            return json.dumps(_INGREDIENTS, ensure_ascii=False)
+        if "Meal Planner" in prompt:
+            return json.dumps(_PLAN, ensure_ascii=False)
+        if "食材: " in prompt:
+            names = prompt.split("食材: ", 1)[1].split("\n", 1)[0].split("、")
+            suggestions = {name: [f"{name}の炒め物", f"{name}のスープ", f"{name}の煮物"] for name in names}
+            return json.dumps({"suggestions": suggestions}, ensure_ascii=False)
+        return "- 野菜炒め\n- スープ\n- サラダ"
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        _simulate_upstream(latency=not stream)
+        with _lock:
+            calls["generate_content"] += 1
+        text = self._respond(_text_of(contents))
+        return FakeStreamResponse(text) if stream else FakeResponse(text)
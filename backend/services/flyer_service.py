@@ -0,0 +1,289 @@
+"""Bargain flyer ingestion.
+
+Fetches every enabled FlyerSource concurrently through one pooled httpx
+client (at most FLYER_PER_HOST_CONCURRENCY requests per host), sends the
+stored ETag / Last-Modified back as conditional headers, parses changed
+pages with BeautifulSoup (lxml when installed) and replaces that source's
+rows in bargain_items. scraper_service.get_bargain_items only reads that
+table, so nothing is fetched on the request path.
+
+Sources come from FLYER_SOURCES_FILE (see data/flyer_sources.example.json).
+To try it against local fixtures:
+    python -m http.server 8001 -d backend/data/flyer_fixtures
+    FLYER_SOURCES_FILE=backend/data/flyer_sources.example.json python -m backend.ingest_flyers --once
+"""
+import asyncio
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+from bs4 import BeautifulSoup
+from sqlalchemy import delete, select
+
+from backend import database, models
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+FLYER_SOURCES_FILE = os.getenv("FLYER_SOURCES_FILE", str(Path(__file__).parent.parent / "data" / "flyer_sources.json"))
+FLYER_REFRESH_INTERVAL = float(os.getenv("FLYER_REFRESH_INTERVAL", str(6 * 3600)))
+FLYER_MAX_CONNECTIONS = int(os.getenv("FLYER_MAX_CONNECTIONS", "20"))
+FLYER_PER_HOST_CONCURRENCY = int(os.getenv("FLYER_PER_HOST_CONCURRENCY", "2"))
+FLYER_TIMEOUT = float(os.getenv("FLYER_TIMEOUT", "15"))
+# Validity assumed when a flyer doesn't state one
+FLYER_DEFAULT_VALIDITY_DAYS = int(os.getenv("FLYER_DEFAULT_VALIDITY_DAYS", "7"))
+# Expired items are kept this long, then pruned
+FLYER_RETENTION_DAYS = int(os.getenv("FLYER_RETENTION_DAYS", "14"))
+FLYER_USER_AGENT = os.getenv("FLYER_USER_AGENT", "SmartMealManager/1.0 (flyer ingestion)")
+
+# Markup expected by default; sources override any of these in `selectors`
+DEFAULT_SELECTORS = {
+    "item": ".bargain-item",
+    "name": ".name",
+    "price": ".price",
+    "unit": ".unit",
+    "valid_from": "[data-valid-from]",
+    "valid_until": "[data-valid-until]",
+}
+
+
+# --- Parsing ---
+
+def _parse_price(text: str | None) -> int | None:
+    # "1,280円" / "¥198" / "198円(税込)" -> first number
+    if not text:
+        return None
+    match = re.search(r"\d[\d,]*", text)
+    return int(match.group().replace(",", "")) if match else None
+
+
+def _parse_date(value: str | None) -> date | None:
+    if not value:
+        return None
+    value = value.strip().replace("/", "-")
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def _date_of(node, attribute: str) -> date | None:
+    if node is None:
+        return None
+    return _parse_date(node.get(attribute) or node.get("datetime") or node.get_text())
+
+
+def _text_of(node, selector: str) -> str | None:
+    found = node.select_one(selector) if selector else None
+    return found.get_text(strip=True) if found else None
+
+
+def parse_flyer(html: str, selectors: dict | None = None, today: date | None = None) -> list[dict]:
+    """Extracts bargain items from a flyer page.
+
+    Validity comes from the item itself, then the page, then defaults to
+    today + FLYER_DEFAULT_VALIDITY_DAYS.
+    """
+    sel = {**DEFAULT_SELECTORS, **(selectors or {})}
+    today = today or date.today()
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    page_from = _date_of(soup.select_one(sel["valid_from"]), "data-valid-from") or today
+    page_until = _date_of(soup.select_one(sel["valid_until"]), "data-valid-until") or today + timedelta(days=FLYER_DEFAULT_VALIDITY_DAYS)
+
+    items = []
+    for node in soup.select(sel["item"]):
+        name = _text_of(node, sel["name"])
+        if not name:
+            continue
+        items.append({
+            "name": name,
+            "price": _parse_price(_text_of(node, sel["price"])),
+            "unit": _text_of(node, sel["unit"]),
+            "valid_from": _parse_date(node.get("data-valid-from")) or page_from,
+            "valid_until": _parse_date(node.get("data-valid-until")) or page_until,
+        })
+    return items
+
+
+# --- Fetching ---
+
+class HostLimiter:
+    """One semaphore per host so a single slow site can't take the whole pool."""
+
+    def __init__(self, per_host: int = FLYER_PER_HOST_CONCURRENCY):
+        self.per_host = per_host
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def for_url(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._semaphores[host]
+
+
+def build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=FLYER_MAX_CONNECTIONS, max_keepalive_connections=FLYER_MAX_CONNECTIONS),
+        timeout=FLYER_TIMEOUT,
+        headers={"User-Agent": FLYER_USER_AGENT},
+        follow_redirects=True,
+    )
+
+
+async def fetch_source(client: httpx.AsyncClient, source: dict, limiter: HostLimiter, today: date | None = None) -> dict:
+    """Fetches and parses one source. Never raises; errors are returned in the result."""
+    headers = {}
+    if source.get("etag"):
+        headers["If-None-Match"] = source["etag"]
+    if source.get("last_modified"):
+        headers["If-Modified-Since"] = source["last_modified"]
+
+    result = {"source_id": source["id"], "status": None, "items": None, "error": None,
+              "etag": source.get("etag"), "last_modified": source.get("last_modified")}
+    try:
+        async with limiter.for_url(source["url"]):
+            response = await client.get(source["url"], headers=headers)
+        result["status"] = response.status_code
+        if response.status_code == 304:
+            return result  # Unchanged since the last fetch; keep the stored items
+        response.raise_for_status()
+        result["etag"] = response.headers.get("etag")
+        result["last_modified"] = response.headers.get("last-modified")
+        # Parsing is CPU-bound; keep it off the event loop
+        result["items"] = await asyncio.to_thread(parse_flyer, response.text, source.get("selectors"), today)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+# --- Persistence ---
+
+def load_source_config(path: str = FLYER_SOURCES_FILE) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def sync_sources(db, configs: list[dict]):
+    """Upserts sources from config by URL (validators of known sources are kept)."""
+    existing = {s.url: s for s in (await db.execute(select(models.FlyerSource))).scalars()}
+    for config in configs:
+        source = existing.get(config["url"])
+        if source is None:
+            source = models.FlyerSource(url=config["url"])
+            db.add(source)
+        source.store = config["store"]
+        source.region = config["region"]
+        source.selectors = config.get("selectors")
+        source.enabled = config.get("enabled", True)
+    await db.commit()
+
+
+async def _store_result(db, source: models.FlyerSource, result: dict):
+    source.last_fetched_at = datetime.utcnow()
+    source.last_status = result["status"]
+    source.last_error = result["error"]
+    if result["items"] is None:
+        return
+    source.etag = result["etag"]
+    source.last_modified = result["last_modified"]
+    # The flyer is the unit of change: replace everything this source published
+    await db.execute(delete(models.BargainItem).where(models.BargainItem.source_id == source.id))
+    db.add_all([
+        models.BargainItem(source_id=source.id, store=source.store, region=source.region, **item)
+        for item in result["items"]
+    ])
+
+
+async def run_ingestion(client: httpx.AsyncClient | None = None, sources_file: str = FLYER_SOURCES_FILE,
+                        today: date | None = None) -> dict:
+    """One pass over all enabled sources. Returns per-status counts.
+
+    The database is only used before and after the fetches, each time in a
+    short session of its own, so a slow site never holds a pooled connection.
+    """
+    today = today or date.today()
+    async with database.AsyncSessionLocal() as db:
+        configs = load_source_config(sources_file)
+        if configs:
+            await sync_sources(db, configs)
+        sources = (await db.execute(select(models.FlyerSource).where(models.FlyerSource.enabled.is_(True)))).scalars().all()
+        snapshots = [
+            {"id": s.id, "url": s.url, "selectors": s.selectors, "etag": s.etag, "last_modified": s.last_modified}
+            for s in sources
+        ]
+
+    own_client = client is None
+    client = client or build_client()
+    limiter = HostLimiter()
+    try:
+        results = await asyncio.gather(*(fetch_source(client, snap, limiter, today) for snap in snapshots))
+    finally:
+        if own_client:
+            await client.aclose()
+
+    summary = {"sources": len(snapshots), "updated": 0, "not_modified": 0, "failed": 0, "items": 0}
+    async with database.AsyncSessionLocal() as db:
+        ids = [snap["id"] for snap in snapshots]
+        by_id = {s.id: s for s in (await db.execute(select(models.FlyerSource).where(models.FlyerSource.id.in_(ids)))).scalars()}
+        for result in results:
+            source = by_id.get(result["source_id"])
+            if source is None:
+                continue  # Deleted while we were fetching
+            await _store_result(db, source, result)
+            if result["error"]:
+                summary["failed"] += 1
+                logger.warning("Flyer fetch failed", extra={"url": source.url, "error": result["error"]})
+            elif result["items"] is None:
+                summary["not_modified"] += 1
+            else:
+                summary["updated"] += 1
+                summary["items"] += len(result["items"])
+
+        cutoff = today - timedelta(days=FLYER_RETENTION_DAYS)
+        await db.execute(delete(models.BargainItem).where(models.BargainItem.valid_until < cutoff))
+        await db.commit()
+
+    logger.info("Flyer ingestion done", extra=summary)
+    return summary
+
+
+class FlyerScheduler:
+    """Runs run_ingestion every FLYER_REFRESH_INTERVAL seconds on the running event loop."""
+
+    def __init__(self, interval: float = FLYER_REFRESH_INTERVAL, sources_file: str = FLYER_SOURCES_FILE):
+        self.interval = interval
+        self.sources_file = sources_file
+        self._task = None
+        self.last_summary = None
+
+    async def _loop(self):
+        while True:
+            try:
+                self.last_summary = await run_ingestion(sources_file=self.sources_file)
+            except Exception as e:
+                logger.exception("Flyer ingestion failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
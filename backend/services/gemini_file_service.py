@@ -0,0 +1,174 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from backend import database, models
+from backend.services.cache_service import hash_file
+from backend.services import metrics_service
+from backend.services.image_service import mime_type_for
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+# Gemini keeps uploaded files for 48h. Handles closer than the margin to
+# expiry are treated as expired so a request never races the deletion.
+GEMINI_FILE_TTL = timedelta(hours=int(os.getenv("GEMINI_FILE_TTL_HOURS", "48")))
+GEMINI_FILE_REUSE_MARGIN = timedelta(minutes=int(os.getenv("GEMINI_FILE_REUSE_MARGIN_MINUTES", "30")))
+GEMINI_UPLOAD_CONCURRENCY = int(os.getenv("GEMINI_UPLOAD_CONCURRENCY", "4"))
+GEMINI_FILE_CLEANUP_INTERVAL = int(os.getenv("GEMINI_FILE_CLEANUP_INTERVAL", "3600"))
+GEMINI_FILE_CLEANUP_BATCH = int(os.getenv("GEMINI_FILE_CLEANUP_BATCH", "100"))
+
+
+def _to_naive_utc(value) -> datetime | None:
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _file_part(uri: str, mime_type: str) -> dict:
+    # A file_data part references an uploaded file without another get_file() round-trip
+    return {"file_data": {"file_uri": uri, "mime_type": mime_type}}
+
+
+class GeminiFileRegistry:
+    """Maps image content hashes to live Gemini file handles.
+
+    Live handles are reused across analyses; missing or expired ones are
+    uploaded concurrently through a bounded thread pool. `client` is the
+    genai module (or the fake in services/fake_genai.py); uploads go through
+    `gateway` (an LLMGateway) when given, for rate limiting and retries.
+    """
+
+    def __init__(self, client, gateway=None, max_workers: int = GEMINI_UPLOAD_CONCURRENCY):
+        self.client = client
+        self.gateway = gateway
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-upload")
+        self._stop = threading.Event()
+        self._cleanup_thread = None
+        self.reused = 0
+        self.uploaded = 0
+
+    def get_parts(self, paths: list[str]) -> list[dict]:
+        """Returns one content part per path, uploading only what isn't live remotely."""
+        hashes = [hash_file(path) for path in paths]
+        live = self._live_handles(set(hashes))
+
+        misses = {h: path for h, path in zip(hashes, paths) if h not in live}
+        if misses:
+            # Copied context keeps the session id on log lines from the pool threads
+            futures = {
+                h: self._pool.submit(contextvars.copy_context().run, self._upload, path, h)
+                for h, path in misses.items()
+            }
+            for h, future in futures.items():
+                live[h] = future.result()
+
+        self.reused += len(set(hashes)) - len(misses)
+        self.uploaded += len(misses)
+        metrics_service.gemini_files_total.inc(len(set(hashes)) - len(misses), source="reused")
+        metrics_service.gemini_files_total.inc(len(misses), source="uploaded")
+        return [_file_part(live[h].uri, live[h].mime_type) for h in hashes]
+
+    def _live_handles(self, hashes: set[str]) -> dict:
+        cutoff = datetime.utcnow() + GEMINI_FILE_REUSE_MARGIN
+        db = database.SessionLocal()
+        try:
+            rows = (
+                db.query(models.GeminiFile)
+                .filter(models.GeminiFile.content_hash.in_(hashes), models.GeminiFile.expires_at > cutoff)
+                .all()
+            )
+            for row in rows:
+                db.expunge(row)
+            return {row.content_hash: row for row in rows}
+        except Exception as e:
+            logger.warning("Gemini file registry lookup failed, uploading fresh: %s", e)
+            return {}
+        finally:
+            db.close()
+
+    def _upload(self, path: str, content_hash: str) -> models.GeminiFile:
+        mime_type = mime_type_for(path)
+        if self.gateway is not None:
+            remote = self.gateway.call(self.client.upload_file, path, mime_type=mime_type, op="upload_file")
+        else:
+            remote = self.client.upload_file(path, mime_type=mime_type)
+        expires_at = _to_naive_utc(getattr(remote, "expiration_time", None)) or datetime.utcnow() + GEMINI_FILE_TTL
+        handle = models.GeminiFile(
+            content_hash=content_hash,
+            remote_name=remote.name,
+            uri=remote.uri,
+            mime_type=mime_type,
+            expires_at=expires_at,
+        )
+        db = database.SessionLocal()
+        try:
+            # Replaces an expired row for the same content
+            db.merge(handle)
+            db.commit()
+        except Exception as e:
+            logger.warning("Could not record Gemini file handle for %s: %s", path, e)
+            db.rollback()
+        finally:
+            db.close()
+        return handle
+
+    # --- Cleanup ---
+
+    def cleanup(self, batch_size: int = GEMINI_FILE_CLEANUP_BATCH) -> int:
+        """Deletes expired registry rows and remote files the registry no longer tracks."""
+        removed = 0
+        db = database.SessionLocal()
+        try:
+            expired = (
+                db.query(models.GeminiFile)
+                .filter(models.GeminiFile.expires_at <= datetime.utcnow())
+                .limit(batch_size)
+                .all()
+            )
+            for row in expired:
+                self._delete_remote(row.remote_name)
+                db.delete(row)
+                removed += 1
+            db.commit()
+
+            # Orphans: remote files left by crashed uploads or lost registry rows
+            known = {name for (name,) in db.query(models.GeminiFile.remote_name).all()}
+            # Grace period: another process may have uploaded but not yet recorded it
+            orphan_cutoff = datetime.utcnow() - timedelta(hours=1)
+            for remote in self.client.list_files():
+                if removed >= batch_size:
+                    break
+                created = _to_naive_utc(getattr(remote, "create_time", None))
+                if remote.name not in known and created is not None and created < orphan_cutoff:
+                    self._delete_remote(remote.name)
+                    removed += 1
+        except Exception as e:
+            logger.warning("Gemini file cleanup failed: %s", e)
+            db.rollback()
+        finally:
+            db.close()
+        if removed:
+            logger.info("Cleaned up %d remote Gemini file(s)", removed)
+        return removed
+
+    def _delete_remote(self, name: str):
+        try:
+            self.client.delete_file(name)
+        except Exception:
+            pass  # Already expired on the remote side
+
+    def start_cleanup(self, interval: int = GEMINI_FILE_CLEANUP_INTERVAL):
+        def run():
+            while not self._stop.wait(interval):
+                self.cleanup()
+
+        self._cleanup_thread = threading.Thread(target=run, daemon=True)
+        self._cleanup_thread.start()
+
+    def stop(self):
+        self._stop.set()
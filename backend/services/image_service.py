@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+# --- Preprocessing Settings ---
+# Phone photos are ~3.6 MB each; the model does not need 12 MP to read a fridge.
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()  # jpeg | webp
+# Keep the uploaded originals next to the processed copies (false replaces them)
+IMAGE_KEEP_ORIGINALS = os.getenv("IMAGE_KEEP_ORIGINALS", "true").lower() == "true"
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2"))
+PROCESSED_DIR_NAME = "processed"
+
+_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp", ".png": "image/png"}
+
+_pool = None
+
+
+def mime_type_for(path: str) -> str:
+    return _MIME_TYPES.get(os.path.splitext(path)[1].lower(), "image/jpeg")
+
+
+def processed_path_for(path: str, fmt: str = IMAGE_FORMAT, keep_original: bool = IMAGE_KEEP_ORIGINALS) -> str:
+    directory, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    if keep_original:
+        directory = os.path.join(directory, PROCESSED_DIR_NAME)
+    return os.path.join(directory, stem + _EXTENSIONS[fmt])
+
+
+def processed_variants(path: str) -> list[str]:
+    """Every path preprocess_image may have written for `path`, in any format or mode."""
+    return [
+        processed_path_for(path, fmt, keep_original)
+        for fmt in _EXTENSIONS
+        for keep_original in (True, False)
+        if processed_path_for(path, fmt, keep_original) != path
+    ]
+
+
+def preprocess_image(
+    path: str,
+    max_edge: int = IMAGE_MAX_EDGE,
+    quality: int = IMAGE_QUALITY,
+    fmt: str = IMAGE_FORMAT,
+    keep_original: bool = IMAGE_KEEP_ORIGINALS,
+) -> str:
+    """Downscales, applies EXIF orientation and re-encodes without metadata.
+
+    Returns the path of the processed image. Runs in a worker process, so it
+    must stay a top-level function with picklable arguments.
+    """
+    out_path = processed_path_for(path, fmt, keep_original)
+    if out_path != path and os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(path):
+        return out_path  # Already processed by an earlier analysis
+
+    with Image.open(path) as img:
+        if out_path == path and max(img.size) <= max_edge and not img.getexif():
+            return path  # Replaced in place by an earlier analysis; don't re-encode again
+        # Rotate pixels per EXIF; the re-encode below drops EXIF (incl. GPS) entirely
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        tmp_path = out_path + ".tmp"
+        img.save(tmp_path, format=fmt.upper(), quality=quality, optimize=True)
+
+    os.replace(tmp_path, out_path)
+    if not keep_original and out_path != path:
+        os.remove(path)
+    return out_path
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_PREPROCESS_WORKERS)
+    return _pool
+
+
+def preprocess_images(paths: list[str]) -> list[str]:
+    """Preprocesses images in the process pool. Order is preserved.
+
+    An image that fails to decode is passed through unchanged so one bad
+    photo doesn't block analysis of the rest.
+    """
+    existing = [path for path in paths if os.path.exists(path)]
+    if not IMAGE_PREPROCESS_ENABLED or not existing:
+        return paths
+
+    pool = _get_pool()
+    futures = {
+        path: pool.submit(preprocess_image, path, IMAGE_MAX_EDGE, IMAGE_QUALITY, IMAGE_FORMAT, IMAGE_KEEP_ORIGINALS)
+        for path in existing
+    }
+    processed = []
+    for path in paths:
+        future = futures.get(path)
+        if future is None:
+            processed.append(path)
+            continue
+        try:
+            processed.append(future.result())
+        except Exception as e:
+            logger.warning("Preprocessing failed for %s, using original: %s", path, e)
+            processed.append(path)
+    return processed
@@ -0,0 +1,165 @@
+"""Japanese ingredient-name normalization.
+
+Maps free-form names from the model (人参 / にんじん / ﾆﾝｼﾞﾝ, 豚肉 / 豚バラ)
+to one canonical spelling:
+
+1. fold: NFKC (full/half width), katakana -> hiragana, lowercase, drop
+   spaces, separators and parenthesized notes ("卵(Lサイズ)").
+2. exact: folded form looked up in the synonym dictionary
+   (data/ingredient_synonyms.tsv) plus the recipe index vocabulary.
+3. fuzzy: names still unknown are matched in one batch against a
+   precomputed, L2-normalized character-bigram matrix of every known
+   spelling (one matrix product per batch); the best row wins if its
+   cosine similarity reaches INGREDIENT_FUZZY_THRESHOLD and it shares
+   the first character or is the name's head noun (its suffix, as in
+   国産人参 -> 人参). Names that differ only by such a modifier but are
+   distinct products (鶏ひき肉, 紅しょうが) need their own dictionary row.
+
+Names that match nothing keep their NFKC-cleaned original spelling.
+"""
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+INGREDIENT_SYNONYMS_PATH = os.getenv(
+    "INGREDIENT_SYNONYMS_PATH", str(Path(__file__).parent.parent / "data" / "ingredient_synonyms.tsv")
+)
+INGREDIENT_FUZZY_THRESHOLD = float(os.getenv("INGREDIENT_FUZZY_THRESHOLD", "0.7"))
+
+_KATAKANA_TO_HIRAGANA = {cp: cp - 0x60 for cp in range(0x30A1, 0x30F7)}
+_PARENTHESIZED = re.compile(r"[(\[【［（][^)\]】］）]*[)\]】］）]")
+_IGNORED = re.compile(r"[\s・･、,。.]+")
+
+
+def display_name(name) -> str:
+    return unicodedata.normalize("NFKC", str(name)).strip()
+
+
+def fold(name) -> str:
+    text = display_name(name).lower()
+    text = _PARENTHESIZED.sub("", text)
+    text = text.translate(_KATAKANA_TO_HIRAGANA)
+    return _IGNORED.sub("", text)
+
+
+def _ngrams(key: str) -> list[str]:
+    padded = f"^{key}$"  # Boundary markers make prefixes/suffixes count
+    return [padded[i:i + 2] for i in range(len(padded) - 1)]
+
+
+def load_synonyms(path: str = INGREDIENT_SYNONYMS_PATH) -> dict[str, list[str]]:
+    synonyms = {}
+    if not os.path.exists(path):
+        return synonyms
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            canonical, _, variants = line.partition("\t")
+            synonyms[canonical.strip()] = [v.strip() for v in variants.split(",") if v.strip()]
+    return synonyms
+
+
+class IngredientNormalizer:
+    def __init__(self, synonyms: dict[str, list[str]], vocabulary=(), threshold: float = INGREDIENT_FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self.exact: dict[str, str] = {}
+        for canonical, variants in synonyms.items():
+            for spelling in [canonical, *variants]:
+                self.exact.setdefault(fold(spelling), canonical)
+        for word in vocabulary:
+            self.exact.setdefault(fold(word), display_name(word))
+        self.exact.pop("", None)
+
+        # Reference matrix: one row per known folded spelling
+        keys = list(self.exact)
+        self._row_keys = keys
+        self._row_canonical = [self.exact[k] for k in keys]
+        self._features: dict[str, int] = {}
+        rows, cols, vals = [], [], []
+        for r, key in enumerate(keys):
+            for gram, count in Counter(_ngrams(key)).items():
+                rows.append(r)
+                cols.append(self._features.setdefault(gram, len(self._features)))
+                vals.append(count)
+        self.matrix = np.zeros((len(keys), len(self._features)), dtype=np.float32)
+        self.matrix[rows, cols] = vals
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.where(norms == 0, 1, norms)
+
+    def _query(self, keys: list[str]) -> np.ndarray:
+        q = np.zeros((len(keys), len(self._features)), dtype=np.float32)
+        for r, key in enumerate(keys):
+            counts = Counter(_ngrams(key))
+            # Unknown bigrams don't hit any column but still count toward the norm
+            norm = float(np.sqrt(sum(c * c for c in counts.values())))
+            for gram, count in counts.items():
+                col = self._features.get(gram)
+                if col is not None:
+                    q[r, col] = count / norm
+        return q
+
+    def canonicalize(self, names, fuzzy: bool = True) -> list[str]:
+        """Canonical spelling for each name; fuzzy lookups are one batched matrix product."""
+        names = list(names)
+        out = [None] * len(names)
+        pending = []
+        for i, name in enumerate(names):
+            key = fold(name)
+            canonical = self.exact.get(key)
+            if canonical is not None:
+                out[i] = canonical
+            elif fuzzy and key and len(self._features):
+                pending.append((i, key))
+            else:
+                out[i] = display_name(name)
+
+        if pending:
+            sims = self._query([key for _, key in pending]) @ self.matrix.T
+            best = sims.argmax(axis=1)
+            scores = sims[np.arange(len(pending)), best]
+            for (i, key), row, score in zip(pending, best, scores):
+                matched = score >= self.threshold and self._plausible(key, self._row_keys[row])
+                out[i] = self._row_canonical[row] if matched else display_name(names[i])
+        return out
+
+    @staticmethod
+    def _plausible(key: str, reference: str) -> bool:
+        # Same first character (typos, dropped characters) or the reference is the head noun (prefixed names)
+        return key[0] == reference[0] or key.endswith(reference)
+
+    def canonical(self, name, fuzzy: bool = True) -> str:
+        return self.canonicalize([name], fuzzy)[0]
+
+    def dedupe(self, ingredients: list) -> list:
+        """Canonicalizes detected ingredients and merges duplicates (first occurrence wins).
+
+        Accepts the detection format ([{"name", "category"}]) or plain strings.
+        """
+        names = [item.get("name", "") if isinstance(item, dict) else item for item in ingredients]
+        merged = {}
+        for item, canonical in zip(ingredients, self.canonicalize(names)):
+            if not canonical or canonical in merged:
+                continue
+            merged[canonical] = {**item, "name": canonical} if isinstance(item, dict) else canonical
+        return list(merged.values())
+
+
+_normalizer = None
+_normalizer_lock = threading.Lock()
+
+
+def get_normalizer() -> IngredientNormalizer:
+    global _normalizer
+    if _normalizer is None:
+        with _normalizer_lock:
+            if _normalizer is None:
+                from backend.services.recipe_index import recipe_vocabulary
+                _normalizer = IngredientNormalizer(load_synonyms(), recipe_vocabulary())
+    return _normalizer
@@ -0,0 +1,350 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from backend import database, models
+from backend.services import event_service, metrics_service
+from backend.services.log_service import get_logger, session_context
+
+logger = get_logger(__name__)
+
+# --- Queue Settings ---
+# Number of in-process worker threads. Set to 0 on API-only nodes and run
+# `python -m backend.worker` elsewhere to scale analysis independently.
+WORKER_CONCURRENCY = int(os.getenv("ANALYSIS_WORKER_CONCURRENCY", "2"))
+MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "3"))
+# Seconds a claimed job stays invisible to other workers. If the worker dies,
+# the job becomes claimable again once this expires.
+VISIBILITY_TIMEOUT = int(os.getenv("ANALYSIS_VISIBILITY_TIMEOUT", "300"))
+# While a job runs its claim is extended this often, so long analyses are not reclaimed
+LEASE_RENEW_INTERVAL = float(os.getenv("ANALYSIS_LEASE_RENEW_INTERVAL", str(VISIBILITY_TIMEOUT / 3)))
+POLL_INTERVAL = float(os.getenv("ANALYSIS_POLL_INTERVAL", "1.0"))
+RETRY_BACKOFF = float(os.getenv("ANALYSIS_RETRY_BACKOFF", "5.0"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _job_to_dict(job: models.AnalysisJob) -> dict:
+    return {
+        "job_id": job.id,
+        "session_id": job.session_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "last_error": job.last_error,
+    }
+
+
+def _active_job(db, session_id: str):
+    return (
+        db.query(models.AnalysisJob)
+        .filter(models.AnalysisJob.session_id == session_id, models.AnalysisJob.status.in_(ACTIVE_STATUSES))
+        .first()
+    )
+
+
+def enqueue_analysis(db, session_id: str) -> tuple[models.AnalysisJob, bool]:
+    """Queues an analysis job and returns (job, created).
+
+    An unfinished job for the same session is reused and the session is left
+    alone. A new job and the session's "analyzing" status are committed
+    together, so a worker that claims the job at once can't have its later
+    statuses overwritten by the API. Concurrent calls are deduplicated by
+    the ux_analysis_jobs_active_session index.
+    """
+    existing = _active_job(db, session_id)
+    if existing:
+        return existing, False
+
+    job = models.AnalysisJob(
+        id=str(uuid.uuid4()),
+        session_id=session_id,
+        status="queued",
+        attempts=0,
+        max_attempts=MAX_ATTEMPTS,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    if db_session:
+        db_session.status = "analyzing"
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request queued one between our check and insert
+        db.rollback()
+        existing = _active_job(db, session_id)
+        if existing is None:
+            raise
+        return existing, False
+    db.refresh(job)
+    return job, True
+
+
+def get_job(db, job_id: str):
+    job = db.query(models.AnalysisJob).filter(models.AnalysisJob.id == job_id).first()
+    return _job_to_dict(job) if job else None
+
+
+def claim_job(db, worker_id: str):
+    """Claims the next runnable job, or returns None.
+
+    On Postgres the candidate row is locked with FOR UPDATE SKIP LOCKED so
+    concurrent workers never block on each other. SQLite has no row locks,
+    so the claim is a compare-and-set on `attempts` instead.
+    """
+    now = datetime.utcnow()
+    Job = models.AnalysisJob
+    runnable = or_(
+        and_(Job.status == "queued", Job.run_after <= now),
+        and_(Job.status == "running", Job.locked_until < now),  # Expired claim
+    )
+    query = db.query(Job).filter(runnable).order_by(Job.run_after).limit(1)
+    if database.IS_POSTGRES:
+        query = query.with_for_update(skip_locked=True)
+
+    job = query.first()
+    if job is None:
+        db.rollback()
+        return None
+
+    if job.attempts >= job.max_attempts:
+        # Worker died on the final attempt
+        _mark_failed(db, job, job.last_error or "Visibility timeout expired")
+        db.commit()
+        event_service.publish(job.session_id, "error")
+        return None
+
+    claimed = (
+        db.query(Job)
+        .filter(Job.id == job.id, Job.attempts == job.attempts)
+        .update(
+            {
+                Job.status: "running",
+                Job.attempts: job.attempts + 1,
+                Job.locked_by: worker_id,
+                Job.locked_until: now + timedelta(seconds=VISIBILITY_TIMEOUT),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    if not claimed:
+        return None
+
+    db.refresh(job)
+    return job
+
+
+def _finish(db, job: models.AnalysisJob, worker_id: str, values: dict) -> bool:
+    """Conditional UPDATE: applies only while `worker_id` still holds the claim."""
+    Job = models.AnalysisJob
+    updated = (
+        db.query(Job)
+        .filter(Job.id == job.id, Job.locked_by == worker_id)
+        .update({**values, Job.locked_by: None, Job.locked_until: None}, synchronize_session=False)
+    )
+    if not updated:
+        db.rollback()
+        logger.warning("Lost the claim on analysis job, dropping its result", extra={"job_id": job.id, "worker_id": worker_id})
+        metrics_service.analysis_total.inc(outcome="lost_claim")
+        return False
+    return True
+
+
+def complete_job(db, job: models.AnalysisJob, worker_id: str) -> bool:
+    if not _finish(db, job, worker_id, {models.AnalysisJob.status: "done", models.AnalysisJob.last_error: None}):
+        return False
+    db.commit()
+    return True
+
+
+def fail_job(db, job: models.AnalysisJob, error: str, worker_id: str) -> bool:
+    """Schedules a retry with exponential backoff, or gives up after max_attempts."""
+    Job = models.AnalysisJob
+    if job.attempts < job.max_attempts:
+        run_after = datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF * (2 ** (job.attempts - 1)))
+        if not _finish(db, job, worker_id, {Job.status: "queued", Job.last_error: error, Job.run_after: run_after}):
+            return False
+        logger.warning(
+            "Analysis job failed, retrying",
+            extra={"job_id": job.id, "attempt": job.attempts, "max_attempts": job.max_attempts, "error": error},
+        )
+        metrics_service.analysis_total.inc(outcome="retry")
+        db.commit()
+    else:
+        if not _finish(db, job, worker_id, {Job.status: "failed", Job.last_error: error}):
+            return False
+        _mark_session_failed(db, job, error)
+        db.commit()
+        event_service.publish(job.session_id, "error")
+    return True
+
+
+def _mark_failed(db, job: models.AnalysisJob, error: str):
+    job.status = "failed"
+    job.last_error = error
+    job.locked_by = None
+    job.locked_until = None
+    _mark_session_failed(db, job, error)
+
+
+def _mark_session_failed(db, job: models.AnalysisJob, error: str):
+    db_session = db.query(models.Session).filter(models.Session.id == job.session_id).first()
+    if db_session:
+        db_session.status = "error"
+    logger.error("Analysis job failed permanently", extra={"job_id": job.id, "error": error})
+    metrics_service.analysis_total.inc(outcome="failed")
+
+
+class LeaseLost(Exception):
+    """The job's claim passed to another worker; this run must not write anything more."""
+
+
+class LeaseKeeper:
+    """Extends a running job's locked_until every LEASE_RENEW_INTERVAL seconds until stopped.
+
+    Writes of the run are fenced too: process_job puts the keeper in
+    db.info["lease"] and the pipeline calls fence() before each commit.
+    """
+
+    def __init__(self, job_id: str, worker_id: str, interval: float = LEASE_RENEW_INTERVAL):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _extend(self, db) -> bool:
+        Job = models.AnalysisJob
+        return bool(
+            db.query(Job)
+            .filter(Job.id == self.job_id, Job.locked_by == self.worker_id, Job.status == "running")
+            .update({Job.locked_until: datetime.utcnow() + timedelta(seconds=VISIBILITY_TIMEOUT)},
+                    synchronize_session=False)
+        )
+
+    def renew(self) -> bool:
+        db = database.SessionLocal()
+        try:
+            renewed = self._extend(db)
+            db.commit()
+            return renewed
+        finally:
+            db.close()
+
+    def fence(self, db):
+        """Extends the claim inside db's open transaction, or rolls back and raises LeaseLost.
+
+        The UPDATE locks the job row until the caller commits, so the claim
+        can't be taken over between this check and the commit.
+        """
+        if not self.lost and self._extend(db):
+            return
+        self.lost = True
+        db.rollback()
+        raise LeaseLost(self.job_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.renew():
+                    self.lost = True
+                    logger.warning("Analysis job claim was taken over", extra={"job_id": self.job_id})
+                    return
+            except Exception as e:
+                # Transient DB error: try again next interval, the claim is still valid for a while
+                logger.warning("Could not extend analysis job claim: %s", e, extra={"job_id": self.job_id})
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+def process_job(job_id: str, worker_id: str):
+    """Runs one claimed job in its own DB session, keeping the claim alive meanwhile."""
+    from backend.services.analysis_service import run_analysis
+
+    db = database.SessionLocal()
+    try:
+        job = db.query(models.AnalysisJob).filter(models.AnalysisJob.id == job_id).first()
+        if job is None:
+            logger.warning("Claimed analysis job no longer exists", extra={"job_id": job_id})
+            return
+        with session_context(job.session_id), LeaseKeeper(job_id, worker_id) as keeper:
+            db.info["lease"] = keeper
+            try:
+                run_analysis(db, job.session_id)
+            except LeaseLost:
+                logger.warning("Lost the claim on analysis job, abandoning the run", extra={"job_id": job.id})
+                metrics_service.analysis_total.inc(outcome="lost_claim")
+                return
+            except Exception as e:
+                logger.exception("Analysis job raised", extra={"job_id": job.id})
+                db.rollback()
+                fail_job(db, job, f"{type(e).__name__}: {e}", worker_id)
+                return
+            complete_job(db, job, worker_id)
+    finally:
+        db.close()
+
+
+def run_pending_jobs(max_jobs: int | None = None, worker_id: str = "inline") -> int:
+    """Drains runnable jobs in the calling thread. Used for in-process/test mode."""
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        db = database.SessionLocal()
+        try:
+            job = claim_job(db, worker_id)
+            job_id = job.id if job else None
+        finally:
+            db.close()
+        if job_id is None:
+            break
+        process_job(job_id, worker_id)
+        processed += 1
+    return processed
+
+
+class AnalysisWorker:
+    """Pool of polling threads that claim and process analysis jobs."""
+
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, poll_interval: float = POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, args=(f"{self.worker_id}:{i}",), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started analysis workers", extra={"concurrency": self.concurrency, "worker_id": self.worker_id})
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads.clear()
+
+    def _run(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                if run_pending_jobs(max_jobs=1, worker_id=worker_id) == 0:
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                # DB hiccups must not kill the worker thread
+                logger.warning("Analysis worker error: %s", e, extra={"worker_id": worker_id})
+                self._stop.wait(self.poll_interval)
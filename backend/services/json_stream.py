@@ -0,0 +1,114 @@
+import json
+
+
+class IncrementalArrayParser:
+    """Emits elements of top-level JSON arrays as soon as each one is complete.
+
+    Feed it model output chunk by chunk; for a document like
+    {"meal_plan": [{...}, {...}], "shopping_list": [{...}]} each object in the
+    watched arrays is yielded as (key, parsed_object) the moment its closing
+    brace arrives, long before the whole document is valid JSON.
+    Text outside the JSON (e.g. ``` fences) is ignored.
+    """
+
+    def __init__(self, keys: tuple[str, ...]):
+        self.keys = set(keys)
+        self.buffer = ""
+        self._pos = 0
+        self._stack = []  # [container char, array key or None, element start]
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._pending_key = None
+
+    def feed(self, text: str) -> list[tuple[str, object]]:
+        self.buffer += text
+        emitted = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = buf[self._string_start:i + 1]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":":
+                if self._stack and self._stack[-1][0] == "{" and self._last_string is not None:
+                    self._pending_key = json.loads(self._last_string)
+            elif ch in "{[":
+                key = None
+                if ch == "[" and len(self._stack) == 1 and self._stack[0][0] == "{":
+                    key = self._pending_key  # Array directly under the root object
+                self._stack.append([ch, key, i])
+                self._pending_key = None
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                _, _, start = self._stack.pop()
+                parent = self._stack[-1] if self._stack else None
+                if ch == "}" and parent is not None and parent[0] == "[" and parent[1] in self.keys:
+                    try:
+                        emitted.append((parent[1], json.loads(buf[start:i + 1])))
+                    except ValueError:
+                        pass  # Malformed element; the final parse decides
+        self._pos = len(buf)
+        return emitted
+
+
+def _closable(stack: list[str]) -> bool:
+    # An open object that is an array element (a day, a shopping item) would be closed half-filled
+    return not any(closer == "}" and parent == "]" for parent, closer in zip(stack, stack[1:]))
+
+
+def repair_json(text: str) -> str | None:
+    """Best-effort fix for model JSON that does not parse as-is.
+
+    Drops text around the document (``` fences, prose) and, if the output
+    was cut off, trims it back to the last complete array element or
+    key/value pair and closes the open brackets. Returns None when there is
+    no JSON document to recover. The result is not guaranteed to parse.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    stack = []  # Closers of the open containers
+    in_string = escape = False
+    cut = cut_stack = None  # Last point where the document can be closed
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            if _closable(stack):
+                cut, cut_stack = i + 1, list(stack)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[start:i + 1]
+            if _closable(stack):
+                cut, cut_stack = i + 1, list(stack)
+        elif ch == "," and _closable(stack):
+            cut, cut_stack = i, list(stack)
+    if cut is None:
+        return None
+    return text[start:cut].rstrip().rstrip(",") + "".join(reversed(cut_stack))
@@ -0,0 +1,284 @@
+import json
+import os
+import random
+import threading
+import time
+
+from backend.services import metrics_service
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+# --- Gateway Settings ---
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+# Consecutive upstream failures that open the breaker, and how long it stays open
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30.0"))
+# Longest a caller waits for rate-limit capacity before giving up
+LLM_ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "120.0"))
+
+# Rough token accounting (Gemini bills a fixed amount per image)
+TOKENS_PER_IMAGE = 258
+DEFAULT_OUTPUT_TOKENS = 1024
+
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted",      # 429
+    "TooManyRequests",
+    "ServiceUnavailable",     # 503
+    "InternalServerError",    # 500
+    "BadGateway",
+    "GatewayTimeout",
+    "DeadlineExceeded",
+    "FakeUpstreamError",      # services/fake_genai.py
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """The upstream model could not be reached after retries (or the breaker is open)."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+def estimate_tokens(contents) -> int:
+    parts = [contents] if isinstance(contents, str) else contents
+    tokens = DEFAULT_OUTPUT_TOKENS
+    for part in parts:
+        if isinstance(part, str):
+            # Japanese is roughly one token per 1-2 characters; err on the high side
+            tokens += len(part)
+        else:
+            tokens += TOKENS_PER_IMAGE
+    return tokens
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0, timeout: float = LLM_ACQUIRE_TIMEOUT) -> float:
+        """Blocks until `amount` is available. Returns seconds waited."""
+        amount = min(amount, self.capacity)  # A single oversized request must still be able to run
+        deadline = time.monotonic() + timeout
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return time.monotonic() - start
+                wait = (amount - self.tokens) / self.rate
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMUnavailableError("Rate limit wait exceeded LLM_ACQUIRE_TIMEOUT")
+                self._cond.wait(min(wait, remaining))
+
+    def debit(self, amount: float):
+        """Charges usage after the fact (e.g. actual vs. estimated tokens). May go negative."""
+        with self._cond:
+            self._refill()
+            self.tokens -= amount
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one probe through after `cooldown`."""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open":
+                raise CircuitOpenError("LLM circuit breaker is open")
+            if state == "half_open":
+                if self._probe_in_flight:
+                    raise CircuitOpenError("LLM circuit breaker is half-open (probe in flight)")
+                self._probe_in_flight = True
+
+    def release_probe(self):
+        """Frees the half-open probe slot when the call never reached the upstream."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                # Trip (or re-trip after a failed probe)
+                self.opened_at = time.monotonic()
+
+
+class LLMGateway:
+    """Single entry point for model calls.
+
+    Reuses model objects, enforces request/token-per-minute limits and a
+    concurrency cap, retries retryable errors with jittered exponential
+    backoff, and fails fast through a circuit breaker while the upstream is
+    down. `client` is the genai module or services/fake_genai.
+    """
+
+    def __init__(
+        self,
+        client,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+        breaker: CircuitBreaker | None = None,
+        sleep=time.sleep,
+    ):
+        self.client = client
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self.stats_counters = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "throttled_seconds": 0.0}
+        self._stats_lock = threading.Lock()  # Counters are bumped from every worker thread
+
+    def model(self, model_name: str, generation_config: dict | None = None):
+        key = (model_name, json.dumps(generation_config or {}, sort_keys=True))
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self.client.GenerativeModel(model_name, generation_config=generation_config)
+                self._models[key] = model
+            return model
+
+    def _count(self, name: str, amount: float = 1):
+        with self._stats_lock:
+            self.stats_counters[name] += amount
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+    def generate(self, contents, model_name: str, generation_config: dict | None = None, **kwargs):
+        """Calls generate_content with limits, retries and circuit breaking."""
+        model = self.model(model_name, generation_config)
+        op = "generate_stream" if kwargs.get("stream") else "generate"
+        return self.call(model.generate_content, contents, tokens=estimate_tokens(contents), op=op, **kwargs)
+
+    def call(self, fn, *args, tokens: int = 0, op: str = "call", **kwargs):
+        """Runs any upstream call (generate, file upload) under the gateway's policies.
+
+        `op` labels the per-attempt latency metric. For streamed responses
+        that is the time until the stream opens, not until it is drained.
+
+        Raises LLMUnavailableError when the upstream stays unavailable;
+        non-retryable errors (bad request, safety block) propagate as-is.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+
+            try:
+                waited = self.requests.acquire(1)
+                if tokens:
+                    waited += self.tokens.acquire(tokens)
+            except Exception:
+                # E.g. timed out waiting for capacity: says nothing about upstream health
+                self.breaker.release_probe()
+                raise
+            self._count("throttled_seconds", waited)
+
+            with self.semaphore:
+                self._count("calls")
+                started = time.perf_counter()
+                try:
+                    response = fn(*args, **kwargs)
+                except Exception as e:
+                    metrics_service.llm_call_seconds.observe(time.perf_counter() - started, op=op, outcome="error")
+                    if not is_retryable(e):
+                        # Request-level problem, not upstream health
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+                    self._count("failures")
+                    error = e
+                else:
+                    metrics_service.llm_call_seconds.observe(time.perf_counter() - started, op=op, outcome="ok")
+                    self.breaker.record_success()
+                    if tokens:
+                        self._charge_actual_usage(response, tokens)
+                    return response
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt)
+                self._count("retries")
+                logger.warning(
+                    "LLM call failed, retrying",
+                    extra={"op": op, "error": type(error).__name__, "attempt": attempt + 1, "delay_seconds": round(delay, 1)},
+                )
+                self._sleep(delay)
+
+        raise LLMUnavailableError(f"LLM unavailable after {self.max_retries + 1} attempts: {error}") from error
+
+    def _charge_actual_usage(self, response, estimated: int):
+        usage = getattr(response, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", None) if usage is not None else None
+        if total:
+            self.tokens.debit(total - estimated)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counters = dict(self.stats_counters)
+        return {
+            **counters,
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "models_cached": len(self._models),
+        }
@@ -0,0 +1,291 @@
+"""In-process counters and histograms, exposed in Prometheus text format on /metrics.
+
+Deliberately small: one lock per metric and a bisect per observation, so
+it can stay enabled in production. Each process (API, standalone
+worker) keeps its own values; Prometheus aggregates across instances.
+"""
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from backend.services.log_service import get_logger, session_context
+
+# Seconds; spans a cache hit (~ms) up to a slow model call (~minutes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Bytes; phone photos are typically 1-10 MB
+SIZE_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.label_names), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Last value set (e.g. bytes on disk, refreshed periodically)."""
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count, max, last]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, value, value]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            series[3] = max(series[3], value)
+            series[4] = value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the block in seconds (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.label_names))
+        return series[2] if series else 0
+
+    def summary(self, **labels) -> dict:
+        """Count, sum, max and last observation of one series (None when empty)."""
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return {"count": 0, "sum": 0.0, "max": None, "last": None}
+            return {"count": series[2], "sum": series[1], "max": series[3], "last": series[4]}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count, _, _) in self._series.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Metrics ---
+http_request_seconds = registry.histogram(
+    "mealplan_http_request_duration_seconds",
+    "Time from request start to response headers, by route template.",
+    ("method", "route", "status"),
+)
+upload_bytes = registry.histogram(
+    "mealplan_upload_file_bytes", "Size of each uploaded image.", buckets=SIZE_BUCKETS,
+)
+upload_seconds = registry.histogram(
+    "mealplan_upload_write_duration_seconds", "Streaming one upload request to disk.",
+)
+# stage: preprocess, model_upload, detection, bargains, planning, db_commit
+stage_seconds = registry.histogram(
+    "mealplan_stage_duration_seconds", "Duration of one analysis pipeline stage.", ("stage",),
+)
+# op: generate, generate_stream, upload_file (each attempt, including failed ones)
+llm_call_seconds = registry.histogram(
+    "mealplan_llm_call_duration_seconds", "One upstream model call attempt.", ("op", "outcome"),
+)
+# mode: single, fanout (compare the two with DETECTION_MODE)
+detection_seconds = registry.histogram(
+    "mealplan_detection_duration_seconds", "Ingredient detection for one session, cache hits included.", ("mode",),
+)
+json_parse_seconds = registry.histogram(
+    "mealplan_json_parse_duration_seconds", "Parsing model output.", ("kind",),
+)
+json_repaired_total = registry.counter(
+    "mealplan_json_repaired_total", "Model outputs that decoded only after repair_json.", ("kind",),
+)
+json_items_dropped_total = registry.counter(
+    "mealplan_json_items_dropped_total", "Malformed list items dropped from model output.", ("field",),
+)
+gemini_files_total = registry.counter(
+    "mealplan_gemini_files_total", "Images referenced in model calls, by handle source.", ("source",),
+)
+fallback_total = registry.counter(
+    "mealplan_fallback_total", "Responses replaced by mock/fallback data.", ("stage", "reason"),
+)
+cache_total = registry.counter(
+    "mealplan_cache_lookups_total", "Detection and plan cache lookups.", ("cache", "result"),
+)
+# phase: first_day (first parsed day reaches the client), total (whole stream)
+plan_stream_seconds = registry.histogram(
+    "mealplan_plan_stream_duration_seconds", "Streamed plan generation, from request start.", ("phase",),
+)
+# decision: new, replanned, kept (re-analysis kept the plan), draft (served a pre-generated plan)
+replan_total = registry.counter(
+    "mealplan_replan_decisions_total", "Planning decisions after detection.", ("decision",),
+)
+# outcome: generated, skipped, failed, unavailable (off-peak passes), served (by analysis)
+preplan_total = registry.counter(
+    "mealplan_preplan_drafts_total", "Pre-generated plan drafts.", ("outcome",),
+)
+preplan_tokens_total = registry.counter(
+    "mealplan_preplan_tokens_total", "Estimated model tokens spent on pre-generation.",
+)
+analysis_total = registry.counter(
+    "mealplan_analysis_runs_total", "Finished analysis attempts.", ("outcome",),
+)
+
+# location: local, s3 (set by the storage janitor every STORAGE_GC_INTERVAL)
+storage_files = registry.gauge(
+    "mealplan_storage_files", "Stored upload files.", ("location",),
+)
+storage_bytes = registry.gauge(
+    "mealplan_storage_bytes", "Bytes used by stored uploads.", ("location",),
+)
+storage_purged_total = registry.counter(
+    "mealplan_storage_purged_total", "Sessions, files and bytes removed by retention.", ("unit",),
+)
+
+# step: import, db, model, indexes, warm_up (see readiness_service)
+startup_seconds = registry.gauge(
+    "mealplan_startup_seconds", "Duration of each startup step of this process.", ("step",),
+)
+
+
+# --- Request middleware ---
+
+logger = get_logger("backend.http")
+
+# Session id in the path, so request log lines (and anything logged while handling) carry it
+_SESSION_PATH = re.compile(r"^/api/session/([^/]+)")
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every HTTP request into http_request_seconds.
+
+    Pure ASGI rather than BaseHTTPMiddleware: no extra task per request,
+    and streamed responses (SSE) are not buffered. Duration is measured to
+    the response start, so a long-lived event stream counts as one fast
+    request instead of an outlier.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                status["elapsed"] = time.perf_counter() - start
+            await send(message)
+
+        match = _SESSION_PATH.match(scope["path"])
+        with session_context(match.group(1) if match else None):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = status.get("elapsed", time.perf_counter() - start)
+                route = scope.get("route")
+                # Route template keeps label cardinality bounded (no raw ids)
+                route_path = getattr(route, "path", None) or "unmatched"
+                http_request_seconds.observe(elapsed, method=scope["method"], route=route_path, status=status["code"])
+                logger.info(
+                    "request",
+                    extra={"method": scope["method"], "route": route_path, "status": status["code"],
+                           "duration_ms": round(elapsed * 1000, 1)},
+                )
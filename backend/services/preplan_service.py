@@ -0,0 +1,324 @@
+"""Off-peak pre-generation of weekly plans.
+
+Demand peaks on weekend mornings. During PREPLAN_HOURS (local time) the
+scheduler plans ahead for recent households, i.e. finished sessions from
+the last PREPLAN_LOOKBACK_DAYS (there are no accounts; one session is
+one household, and identical fridges share a draft). Each plan uses the
+session's detected_ingredients and today's bargains and is stored as a
+draft GeneratedPlan row (is_draft=True).
+
+The analysis pipeline calls take_draft() before planning. A draft is
+served instead of a live model call when it was made with the same
+bargains, is under PREPLAN_MAX_AGE_HOURS old, and its ingredient set is
+within PREPLAN_SIMILARITY_THRESHOLD (Jaccard) of the new one. Each draft
+is served once.
+
+Passes are idempotent and resumable. draft_key (ingredient set +
+bargains) is unique, so a draft is never generated twice. A row without
+content is an in-progress claim; a run that died leaves one behind, and
+it is taken over after PREPLAN_CLAIM_TIMEOUT. Spending is bounded by
+PREPLAN_CONCURRENCY parallel calls and PREPLAN_TOKEN_BUDGET estimated
+tokens per off-peak window.
+
+Run it in the API process (PREPLAN_ENABLED=true) or separately with
+`python -m backend.preplan`. GENAI_BACKEND=fake runs it offline.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from backend import database, models
+from backend.services import ai_service, metrics_service
+from backend.services.cache_service import jaccard
+from backend.services.llm_gateway import LLMUnavailableError
+from backend.services.log_service import get_logger
+from backend.services.scraper_service import get_bargain_items
+
+logger = get_logger(__name__)
+
+# --- Pre-generation Settings ---
+PREPLAN_ENABLED = os.getenv("PREPLAN_ENABLED", "false").lower() == "true"
+PREPLAN_HOURS = os.getenv("PREPLAN_HOURS", "1-6")  # Local hours [start, end); may wrap midnight, e.g. 22-5
+PREPLAN_CHECK_INTERVAL = float(os.getenv("PREPLAN_CHECK_INTERVAL", "600"))
+PREPLAN_CONCURRENCY = int(os.getenv("PREPLAN_CONCURRENCY", "2"))
+PREPLAN_TOKEN_BUDGET = int(os.getenv("PREPLAN_TOKEN_BUDGET", "500000"))  # Per off-peak window
+PREPLAN_LOOKBACK_DAYS = int(os.getenv("PREPLAN_LOOKBACK_DAYS", "14"))
+PREPLAN_BATCH = int(os.getenv("PREPLAN_BATCH", "200"))  # Candidate sessions per pass
+PREPLAN_MAX_AGE_HOURS = float(os.getenv("PREPLAN_MAX_AGE_HOURS", "72"))
+PREPLAN_CLAIM_TIMEOUT = float(os.getenv("PREPLAN_CLAIM_TIMEOUT", "900"))
+PREPLAN_SIMILARITY_THRESHOLD = float(os.getenv("PREPLAN_SIMILARITY_THRESHOLD", "0.8"))
+# Drafts compared against a new ingredient set (newest first)
+PREPLAN_LOOKUP_LIMIT = int(os.getenv("PREPLAN_LOOKUP_LIMIT", "500"))
+
+
+def bargains_key(bargains: list[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(bargains)).encode("utf-8")).hexdigest()
+
+
+def draft_key(names: tuple, bargains: list[str]) -> str:
+    return hashlib.sha256(("\n".join(names) + "\0" + bargains_key(bargains)).encode("utf-8")).hexdigest()
+
+
+def in_window(now: datetime, hours: str = PREPLAN_HOURS) -> bool:
+    start, end = (int(hour) for hour in hours.split("-"))
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+# --- Serving ---
+
+def take_draft(db, names: tuple, bargains: list[str], now: datetime | None = None) -> dict | None:
+    """Claims the closest valid draft for this ingredient set, or returns None.
+
+    The draft row is deleted (and committed) here, so concurrent analyses
+    never serve the same draft twice.
+    """
+    now = now or datetime.utcnow()
+    Plan = models.GeneratedPlan
+    rows = (
+        db.query(Plan.id, Plan.content, Plan.draft_shopping_list, Plan.ingredient_names)
+        .filter(
+            Plan.is_draft.is_(True),
+            Plan.bargains_key == bargains_key(bargains),
+            Plan.created_at >= now - timedelta(hours=PREPLAN_MAX_AGE_HOURS),
+            Plan.ingredient_names.is_not(None),
+        )
+        .order_by(Plan.created_at.desc())
+        .limit(PREPLAN_LOOKUP_LIMIT)
+        .all()
+    )
+    wanted = set(names)
+    scored = sorted(
+        ((jaccard(wanted, set(row.ingredient_names)), row) for row in rows),
+        key=lambda pair: pair[0], reverse=True,
+    )
+    for similarity, row in scored:
+        if similarity < PREPLAN_SIMILARITY_THRESHOLD:
+            break
+        if db.query(Plan).filter(Plan.id == row.id).delete(synchronize_session=False):
+            db.commit()
+            metrics_service.preplan_total.inc(outcome="served")
+            logger.info("Serving pre-generated plan", extra={"draft_id": row.id, "similarity": round(similarity, 3)})
+            return {
+                "meal_plan": row.content,
+                "shopping_list": row.draft_shopping_list or [],
+                "ingredient_names": row.ingredient_names,
+            }
+        db.rollback()  # Taken by another analysis meanwhile
+    return None
+
+
+# --- Generation ---
+
+def prune_drafts(db, bargains: list[str], now: datetime) -> int:
+    """Deletes drafts that can no longer be served: too old, or planned with other bargains."""
+    Plan = models.GeneratedPlan
+    pruned = (
+        db.query(Plan)
+        .filter(
+            Plan.is_draft.is_(True),
+            Plan.content.is_not(None),
+            or_(Plan.created_at < now - timedelta(hours=PREPLAN_MAX_AGE_HOURS), Plan.bargains_key != bargains_key(bargains)),
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return pruned
+
+
+def find_candidates(db, now: datetime, limit: int = PREPLAN_BATCH) -> list[tuple[str, list, tuple]]:
+    """(session_id, ingredients, canonical names) of recent finished sessions, newest first, one per ingredient set."""
+    Session = models.Session
+    rows = (
+        db.query(Session.id, Session.detected_ingredients)
+        .filter(
+            Session.status == "done",
+            Session.detected_ingredients.is_not(None),
+            Session.created_at >= now - timedelta(days=PREPLAN_LOOKBACK_DAYS),
+        )
+        .order_by(Session.created_at.desc(), Session.id.desc())
+        .limit(limit)
+        .all()
+    )
+    candidates = {}
+    for session_id, ingredients in rows:
+        if not ingredients:
+            continue
+        names = ai_service.ingredient_set(ingredients)
+        candidates.setdefault(names, (session_id, ingredients, names))
+    return list(candidates.values())
+
+
+def _claim(db, session_id: str, key: str, bargain_hash: str, now: datetime) -> int | None:
+    """Inserts the draft row as a claim. Returns its id, or None if the draft exists or is being made."""
+    Plan = models.GeneratedPlan
+    row = Plan(session_id=session_id, is_draft=True, draft_key=key, bargains_key=bargain_hash, created_at=now)
+    db.add(row)
+    try:
+        db.commit()
+        return row.id
+    except IntegrityError:
+        db.rollback()
+    # Take over a claim left behind by a run that died (compare-and-set on created_at)
+    existing = db.query(Plan.id, Plan.content, Plan.created_at).filter(Plan.draft_key == key).first()
+    if existing is None or existing.content is not None:
+        return None
+    if existing.created_at >= now - timedelta(seconds=PREPLAN_CLAIM_TIMEOUT):
+        return None
+    taken = db.execute(
+        update(Plan)
+        .where(Plan.id == existing.id, Plan.created_at == existing.created_at)
+        .values(created_at=now, session_id=session_id)
+    ).rowcount
+    db.commit()
+    return existing.id if taken else None
+
+
+def _release(db, draft_id: int):
+    db.query(models.GeneratedPlan).filter(models.GeneratedPlan.id == draft_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def _generate_draft(draft_id: int, ingredients: list, names: tuple, bargains: list[str], planner, stop: threading.Event) -> str:
+    db = database.SessionLocal()
+    try:
+        if stop.is_set():
+            _release(db, draft_id)
+            return "skipped"
+        try:
+            plan = planner(ingredients, bargains)
+        except LLMUnavailableError:
+            stop.set()  # Upstream down or throttled: leave the rest for the next pass
+            _release(db, draft_id)
+            return "unavailable"
+        except Exception as e:
+            logger.warning("Pre-generation failed: %s: %s", type(e).__name__, e, extra={"draft_id": draft_id})
+            _release(db, draft_id)
+            return "failed"
+        if plan.get("fallback") or not plan.get("meal_plan"):
+            _release(db, draft_id)
+            return "failed"
+        db.query(models.GeneratedPlan).filter(models.GeneratedPlan.id == draft_id).update(
+            {
+                "content": plan["meal_plan"],
+                "draft_shopping_list": plan.get("shopping_list") or [],
+                "ingredient_names": list(names),
+                "created_at": datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return "generated"
+    finally:
+        db.close()
+
+
+def run_pass(
+    planner=None,
+    token_budget: int = PREPLAN_TOKEN_BUDGET,
+    concurrency: int = PREPLAN_CONCURRENCY,
+    now: datetime | None = None,
+) -> dict:
+    """Generates missing drafts for recent households until done or out of budget.
+
+    `planner(ingredients, bargains) -> plan` defaults to ai_service.generate_plan.
+    """
+    planner = planner or ai_service.generate_plan
+    now = now or datetime.utcnow()
+    summary = {"candidates": 0, "generated": 0, "skipped": 0, "failed": 0, "unavailable": 0,
+               "pruned": 0, "tokens": 0, "budget_exhausted": False}
+    bargains = get_bargain_items()
+    bargain_hash = bargains_key(bargains)
+    stop = threading.Event()
+
+    db = database.SessionLocal()
+    try:
+        summary["pruned"] = prune_drafts(db, bargains, now)
+        candidates = find_candidates(db, now)
+        summary["candidates"] = len(candidates)
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="preplan") as pool:
+            futures = []
+            for session_id, ingredients, names in candidates:
+                if stop.is_set():
+                    break
+                tokens = ai_service.plan_token_estimate(ingredients, bargains)
+                if summary["tokens"] + tokens > token_budget:
+                    summary["budget_exhausted"] = True
+                    break
+                draft_id = _claim(db, session_id, draft_key(names, bargains), bargain_hash, now)
+                if draft_id is None:
+                    summary["skipped"] += 1  # Already drafted, or another process is on it
+                    continue
+                summary["tokens"] += tokens
+                futures.append(pool.submit(_generate_draft, draft_id, ingredients, names, bargains, planner, stop))
+            for future in futures:
+                summary[future.result()] += 1
+    finally:
+        db.close()
+
+    for outcome in ("generated", "skipped", "failed", "unavailable"):
+        metrics_service.preplan_total.inc(summary[outcome], outcome=outcome)
+    metrics_service.preplan_tokens_total.inc(summary["tokens"])
+    logger.info("Pre-generation pass finished", extra=summary)
+    return summary
+
+
+class PreplanScheduler:
+    """Runs run_pass during PREPLAN_HOURS, every PREPLAN_CHECK_INTERVAL seconds, on the running event loop.
+
+    The token budget covers one off-peak window; passes within the window
+    share it, and later passes only pick up households not drafted yet.
+    """
+
+    def __init__(self, interval: float = PREPLAN_CHECK_INTERVAL, token_budget: int = PREPLAN_TOKEN_BUDGET,
+                 concurrency: int = PREPLAN_CONCURRENCY, hours: str = PREPLAN_HOURS, planner=None):
+        self.interval = interval
+        self.token_budget = token_budget
+        self.concurrency = concurrency
+        self.hours = hours
+        self.planner = planner
+        self.window: date | None = None  # Date the current window started on
+        self.spent = 0
+        self.last_summary = None
+        self._task = None
+
+    async def run_once(self, now: datetime | None = None) -> dict | None:
+        now = now or datetime.now()
+        if not in_window(now, self.hours):
+            self.window = None
+            return None
+        if self.window is None:
+            self.window, self.spent = now.date(), 0
+        remaining = self.token_budget - self.spent
+        if remaining <= 0:
+            return None
+        summary = await asyncio.to_thread(run_pass, self.planner, remaining, self.concurrency)
+        self.spent += summary["tokens"]
+        self.last_summary = summary
+        return summary
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception("Pre-generation failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,119 @@
+"""Startup warm-up and the readiness answer for /health.
+
+The lifespan starts warm_up() in the background and lets the server
+accept connections right away. Warm-up checks the schema, opens pool
+connections, loads the genai SDK and the in-memory indexes, timing each
+step. /health reports 503 until the SDK is loaded, and afterwards pings
+the database on every call.
+"""
+import asyncio
+import os
+import time
+
+from sqlalchemy import text
+
+from backend import database, models
+from backend.services import ai_service, metrics_service
+from backend.services.ingredient_normalizer import get_normalizer
+from backend.services.log_service import get_logger
+from backend.services.recipe_index import get_recipe_index
+from backend.services.session_repository import get_session_repository
+
+logger = get_logger(__name__)
+
+# Connections opened during warm-up so the first requests don't pay for the TCP/TLS/auth handshake
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", "2"))
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2.0"))
+
+
+async def _ping():
+    async with database.async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+class Readiness:
+    def __init__(self):
+        # step -> {"seconds": float, "error": str | None}
+        self.steps: dict[str, dict] = {}
+        self.model_state = "loading"  # loading, ready, error
+        self._task = None
+
+    def record(self, step: str, seconds: float, error: Exception | None = None):
+        self.steps[step] = {"seconds": round(seconds, 3), "error": f"{type(error).__name__}: {error}" if error else None}
+        metrics_service.startup_seconds.set(seconds, step=step)
+        log = logger.warning if error else logger.info
+        log("Startup step finished", extra={"step": step, "seconds": round(seconds, 3), "error": self.steps[step]["error"]})
+
+    async def _timed(self, step: str, work):
+        started = time.perf_counter()
+        try:
+            await work()
+        except Exception as e:
+            self.record(step, time.perf_counter() - started, e)
+            return False
+        self.record(step, time.perf_counter() - started)
+        return True
+
+    async def _warm_db(self):
+        async with database.async_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        await asyncio.gather(*(_ping() for _ in range(DB_WARM_CONNECTIONS)))
+        # Decides sql vs memory sessions now instead of on the first request
+        await get_session_repository()
+
+    async def _warm_model(self):
+        await asyncio.to_thread(ai_service.warm_up)
+
+    async def _warm_indexes(self):
+        await asyncio.to_thread(lambda: (get_normalizer(), get_recipe_index()))
+
+    async def warm_up(self):
+        started = time.perf_counter()
+        _, model_ok, _ = await asyncio.gather(
+            self._timed("db", self._warm_db),
+            self._timed("model", self._warm_model),
+            self._timed("indexes", self._warm_indexes),
+        )
+        self.model_state = "ready" if model_ok else "error"
+        self.record("warm_up", time.perf_counter() - started)
+
+    def start(self):
+        self._task = asyncio.create_task(self.warm_up())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _db_state(self) -> str:
+        try:
+            await asyncio.wait_for(_ping(), HEALTH_DB_TIMEOUT)
+            return "connected"
+        except Exception:
+            return "unavailable"
+
+    async def check(self) -> tuple[bool, dict]:
+        """Returns (ready, body) for /health."""
+        db_state = await self._db_state()
+        # Sessions kept in memory (no DB at startup) still serve requests
+        needs_db = (await get_session_repository()).persistent
+        ready = self.model_state == "ready" and (db_state == "connected" or not needs_db)
+        if ready:
+            status = "ok"
+        elif self.model_state == "loading":
+            status = "starting"
+        else:
+            status = "unavailable"
+        return ready, {
+            "status": status,
+            "db": db_state if needs_db else f"{db_state} (in-memory sessions)",
+            "model": self.model_state,
+            "startup": {step: info["seconds"] for step, info in self.steps.items()},
+            "errors": {step: info["error"] for step, info in self.steps.items() if info["error"]} or None,
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,156 @@
+"""In-process recipe -> ingredient index.
+
+Loaded from a TSV file (one dish per line: name, tab, comma-separated
+ingredients). Used to rank candidate dishes by pantry coverage before
+planning and to derive shopping lists from the chosen dishes by set
+difference, instead of asking the model to enumerate ingredients.
+"""
+import os
+import threading
+from pathlib import Path
+
+from backend.services.ingredient_normalizer import get_normalizer
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+RECIPE_INDEX_PATH = os.getenv("RECIPE_INDEX_PATH", str(Path(__file__).parent.parent / "data" / "recipes.tsv"))
+# Assumed to be in every kitchen; never put on shopping lists
+RECIPE_ASSUMED_STAPLES = frozenset(
+    s.strip() for s in os.getenv("RECIPE_ASSUMED_STAPLES", "塩,こしょう,砂糖,サラダ油,水,ご飯").split(",") if s.strip()
+)
+
+
+def normalize_name(name: str) -> str:
+    # Exact synonym folding only; free-form model output is fuzzy-matched upstream
+    return get_normalizer().canonical(name, fuzzy=False)
+
+
+def _read_rows(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            dish, _, ingredients = line.partition("\t")
+            yield dish, ingredients.split(",")
+
+
+def recipe_vocabulary(path: str = RECIPE_INDEX_PATH) -> set[str]:
+    """Every ingredient name in the recipe file, as written (seeds the normalizer)."""
+    if not os.path.exists(path):
+        return set()
+    return {i.strip() for _, ingredients in _read_rows(path) for i in ingredients if i.strip()}
+
+
+class RecipeIndex:
+    def __init__(self, recipes: dict[str, frozenset] | None = None, staples: frozenset = RECIPE_ASSUMED_STAPLES):
+        self.recipes: dict[str, frozenset] = {}
+        self.by_ingredient: dict[str, set] = {}
+        self.staples = frozenset(normalize_name(s) for s in staples)
+        for dish, ingredients in (recipes or {}).items():
+            self.add(dish, ingredients)
+
+    @classmethod
+    def load(cls, path: str = RECIPE_INDEX_PATH) -> "RecipeIndex":
+        index = cls()
+        if not os.path.exists(path):
+            logger.warning("No recipe index at %s; shopping lists will come from the model", path)
+            return index
+        for dish, ingredients in _read_rows(path):
+            index.add(dish, ingredients)
+        return index
+
+    def add(self, dish: str, ingredients):
+        dish = normalize_name(dish)
+        required = frozenset(normalize_name(i) for i in ingredients if normalize_name(i)) - self.staples
+        self.recipes[dish] = required
+        for ingredient in required:
+            self.by_ingredient.setdefault(ingredient, set()).add(dish)
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def resolve(self, dish: str) -> str | None:
+        """Maps a dish name from the model to an indexed dish.
+
+        Exact match first, then the longest indexed name contained in it
+        (e.g. "具だくさん豚汁" -> "豚汁").
+        """
+        dish = normalize_name(dish)
+        if dish in self.recipes:
+            return dish
+        contained = [name for name in self.recipes if name in dish]
+        return max(contained, key=len) if contained else None
+
+    def ingredients_for(self, dish: str) -> frozenset | None:
+        resolved = self.resolve(dish)
+        return self.recipes[resolved] if resolved else None
+
+    def dishes_with(self, ingredient: str) -> set:
+        return set(self.by_ingredient.get(normalize_name(ingredient), ()))
+
+    def rank_by_coverage(self, pantry, bargains=(), limit: int = 30) -> list[dict]:
+        """Dishes sharing at least one ingredient with the pantry, best coverage first.
+
+        Coverage is the share of a dish's ingredients already at home;
+        ties go to dishes using more bargain items, then fewer purchases.
+        """
+        have = {normalize_name(p) for p in pantry}
+        on_sale = {normalize_name(b) for b in bargains}
+        candidates = set()
+        for ingredient in have | on_sale:
+            candidates |= self.by_ingredient.get(ingredient, set())
+
+        ranked = []
+        for dish in candidates:
+            required = self.recipes[dish]
+            missing = required - have
+            ranked.append({
+                "dish": dish,
+                "coverage": 1.0 - len(missing) / len(required) if required else 1.0,
+                "bargains": len(missing & on_sale),
+                "missing": sorted(missing),
+            })
+        ranked.sort(key=lambda r: (-r["coverage"], -r["bargains"], len(r["missing"]), r["dish"]))
+        return ranked[:limit]
+
+    def shopping_list(self, dishes, pantry, bargains=()) -> tuple[list[dict], list[str]]:
+        """Ingredients of `dishes` not in the pantry, in plan order.
+
+        Returns (shopping_list, unknown_dishes); unknown dishes contribute nothing.
+        """
+        have = {normalize_name(p) for p in pantry}
+        on_sale = {normalize_name(b) for b in bargains}
+        items, seen, unknown = [], set(), []
+        for dish in dishes:
+            required = self.ingredients_for(dish)
+            if required is None:
+                unknown.append(dish)
+                continue
+            for ingredient in sorted(required - have - seen):
+                seen.add(ingredient)
+                items.append({"item": ingredient, "reason": "bargain" if ingredient in on_sale else "missing"})
+        return items, unknown
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_recipe_index() -> RecipeIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RecipeIndex.load()
+    return _index
+
+
+def plan_dishes(meal_plan: list) -> list[str]:
+    """All dish names in a meal_plan, in order (breakfast, lunch, dinner per day)."""
+    dishes = []
+    for day in meal_plan or []:
+        meals = day.get("meals", {}) if isinstance(day, dict) else {}
+        dishes.extend(str(d) for d in meals.values() if d)
+    return dishes
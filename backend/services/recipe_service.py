@@ -0,0 +1,47 @@
+import os
+from collections import Counter
+
+from backend import database, models
+from backend.services.ai_service import suggest_recipes_batch
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+RECIPE_WARMUP_ENABLED = os.getenv("RECIPE_WARMUP_ENABLED", "false").lower() == "true"
+RECIPE_WARMUP_TOP_N = int(os.getenv("RECIPE_WARMUP_TOP_N", "50"))
+# Only the most recent sessions are scanned; older fridges say little about today
+RECIPE_WARMUP_SCAN_LIMIT = int(os.getenv("RECIPE_WARMUP_SCAN_LIMIT", "1000"))
+
+
+def most_detected_ingredients(db, top_n: int = RECIPE_WARMUP_TOP_N, scan_limit: int = RECIPE_WARMUP_SCAN_LIMIT) -> list[str]:
+    rows = (
+        db.query(models.Session.detected_ingredients)
+        .filter(models.Session.detected_ingredients.isnot(None))
+        .order_by(models.Session.created_at.desc())
+        .limit(scan_limit)
+        .all()
+    )
+    counts = Counter()
+    for (ingredients,) in rows:
+        for item in ingredients or []:
+            name = item.get("name") if isinstance(item, dict) else item
+            if name:
+                counts[str(name).strip()] += 1
+    return [name for name, _ in counts.most_common(top_n)]
+
+
+def warm_recipe_cache(top_n: int = RECIPE_WARMUP_TOP_N) -> int:
+    """Pre-fills the suggestion memo for the most frequently detected ingredients."""
+    db = database.SessionLocal()
+    try:
+        names = most_detected_ingredients(db, top_n)
+    except Exception as e:
+        logger.warning("Recipe warm-up skipped: %s", e)
+        return 0
+    finally:
+        db.close()
+
+    if names:
+        suggest_recipes_batch(names)
+        logger.info("Warmed suggestion cache for %d ingredient(s)", len(names))
+    return len(names)
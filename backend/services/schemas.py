@@ -0,0 +1,140 @@
+"""Typed shapes of model output, decoded and validated in one pass (msgspec).
+
+Unknown fields are ignored and optional ones may be missing, so a model
+that adds a note or skips a meal still decodes. List items (ingredients,
+days, shopping items) are validated one by one: a malformed item is
+dropped instead of failing the whole output, and validate_item() applies
+the same rule to items parsed while streaming. Output that does not
+decode is run through json_stream.repair_json (fences, surrounding prose,
+truncation) and decoded once more; if that fails too, or every item was
+malformed, a ValueError is raised. Callers get plain dicts and lists back,
+so the cached and stored shapes are unchanged.
+
+encode() is the msgspec encoder used for API responses and SSE events.
+"""
+import msgspec
+
+from backend.services import metrics_service
+from backend.services.json_stream import repair_json
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+
+class Ingredient(msgspec.Struct):
+    name: str
+    category: str = "その他"
+
+
+class Detection(msgspec.Struct):
+    ingredients: list[Ingredient] = []
+
+
+class Meals(msgspec.Struct, omit_defaults=True):
+    breakfast: str | None = None
+    lunch: str | None = None
+    dinner: str | None = None
+
+
+class PlanDay(msgspec.Struct):
+    day: str
+    meals: Meals
+
+
+class ShoppingItem(msgspec.Struct, omit_defaults=True):
+    item: str
+    reason: str | None = None
+
+
+class Plan(msgspec.Struct):
+    meal_plan: list[PlanDay] = []
+    shopping_list: list[ShoppingItem] = []
+
+
+class RecipeSuggestions(msgspec.Struct):
+    suggestions: dict[str, list[str]] = {}
+
+
+# Same shapes with the items left undecoded, for output the strict decoders reject
+class _DetectionItems(msgspec.Struct):
+    ingredients: list[msgspec.Raw] = []
+
+
+class _PlanItems(msgspec.Struct):
+    meal_plan: list[msgspec.Raw] = []
+    shopping_list: list[msgspec.Raw] = []
+
+
+_decoders = {
+    "detection": msgspec.json.Decoder(Detection),
+    "plan": msgspec.json.Decoder(Plan),
+    "recipes": msgspec.json.Decoder(RecipeSuggestions),
+}
+_lenient_decoders = {
+    "detection": msgspec.json.Decoder(_DetectionItems),
+    "plan": msgspec.json.Decoder(_PlanItems),
+}
+_encoder = msgspec.json.Encoder()
+
+# Item type of each list field; items are decoded separately so one bad entry only drops itself
+ITEM_TYPES = {"ingredients": Ingredient, "meal_plan": PlanDay, "shopping_list": ShoppingItem}
+_item_decoders = {field: msgspec.json.Decoder(item_type) for field, item_type in ITEM_TYPES.items()}
+
+
+def decode(kind: str, text: str | bytes) -> dict:
+    """Decodes model output of `kind` (detection, plan, recipes) into plain dicts."""
+    try:
+        return _decode_text(kind, text)
+    except msgspec.DecodeError as e:
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", errors="replace")
+        repaired = repair_json(text)
+        if repaired is None or repaired == text:
+            raise ValueError(f"Invalid {kind} output: {e}") from e
+        try:
+            value = _decode_text(kind, repaired)
+        except msgspec.DecodeError:
+            raise ValueError(f"Invalid {kind} output: {e}") from e
+        metrics_service.json_repaired_total.inc(kind=kind)
+        logger.warning("Repaired model output", extra={"kind": kind, "error": str(e), "chars": len(text)})
+        return value
+
+
+def _decode_text(kind: str, text: str | bytes) -> dict:
+    # Well-formed output takes the single strict pass; item by item only when some item is malformed
+    try:
+        return msgspec.to_builtins(_decoders[kind].decode(text))
+    except msgspec.ValidationError:
+        if kind not in _lenient_decoders:
+            raise
+    return _decode_items(kind, _lenient_decoders[kind].decode(text))
+
+
+def _decode_items(kind: str, value) -> dict:
+    result, kept, dropped = {}, 0, 0
+    for field in value.__struct_fields__:
+        items = []
+        for raw in getattr(value, field):
+            try:
+                items.append(msgspec.to_builtins(_item_decoders[field].decode(raw)))
+            except msgspec.DecodeError as e:
+                dropped += 1
+                metrics_service.json_items_dropped_total.inc(field=field)
+                logger.warning("Dropped malformed item", extra={"kind": kind, "field": field, "error": str(e)})
+        result[field] = items
+        kept += len(items)
+    if dropped and not kept:
+        raise ValueError(f"Invalid {kind} output: all {dropped} items malformed")
+    return result
+
+
+def validate_item(field: str, obj):
+    """A list item parsed on its own (e.g. a streamed day) as decode() would keep it, or None if malformed."""
+    try:
+        return msgspec.to_builtins(msgspec.convert(obj, ITEM_TYPES[field]))
+    except msgspec.ValidationError:
+        return None
+
+
+def encode(obj) -> bytes:
+    return _encoder.encode(obj)
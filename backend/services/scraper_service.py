@@ -1,4 +1,49 @@
-def get_bargain_items():
-    # Mock data for phase 2
-    # In future, this will scrape Cookpad/Shufoo
-    return ["Chicken Breast", "Yogurt", "Broccoli", "Salmon"]
+import os
+from datetime import date
+
+from sqlalchemy import or_
+
+from backend import database, models
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+# Region/store the planner draws bargains from (unset = all)
+BARGAIN_REGION = os.getenv("BARGAIN_REGION") or None
+BARGAIN_STORE = os.getenv("BARGAIN_STORE") or None
+BARGAIN_LIMIT = int(os.getenv("BARGAIN_LIMIT", "20"))
+# Scheduled ingestion in the API process. Kept here, not in flyer_service, so
+# startup only imports the scraping stack (httpx, bs4, lxml) when it's enabled.
+FLYER_INGEST_ENABLED = os.getenv("FLYER_INGEST_ENABLED", "false").lower() == "true"
+
+# Used until the first flyer ingestion has run (see services/flyer_service.py)
+SAMPLE_BARGAINS = ["Chicken Breast", "Yogurt", "Broccoli", "Salmon"]
+
+
+def get_bargain_items(region: str | None = BARGAIN_REGION, store: str | None = BARGAIN_STORE,
+                      limit: int = BARGAIN_LIMIT, today: date | None = None) -> list[str]:
+    """Names of bargains valid today, cheapest first, from the bargain_items table."""
+    today = today or date.today()
+    db = database.SessionLocal()
+    try:
+        query = db.query(models.BargainItem.name).filter(
+            models.BargainItem.valid_until >= today,
+            or_(models.BargainItem.valid_from.is_(None), models.BargainItem.valid_from <= today),
+        )
+        if region:
+            query = query.filter(models.BargainItem.region == region)
+        if store:
+            query = query.filter(models.BargainItem.store == store)
+        rows = (
+            query.order_by(models.BargainItem.price.is_(None), models.BargainItem.price, models.BargainItem.name)
+            .limit(limit * 4)  # Headroom for the same item listed by several stores
+            .all()
+        )
+    except Exception as e:
+        logger.warning("Bargain lookup failed, using sample list: %s", e)
+        return list(SAMPLE_BARGAINS)
+    finally:
+        db.close()
+
+    names = list(dict.fromkeys(name for (name,) in rows))[:limit]
+    return names or list(SAMPLE_BARGAINS)
@@ -0,0 +1,410 @@
+import asyncio
+import base64
+import copy
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select, text
+
+from backend import database, models
+from backend.services import event_service
+from backend.services.cache_service import LRUCache
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+# "sql": sessions live in the database. "memory": process-local only (no DB).
+# "auto": sql if the database answers at first use, memory otherwise.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "auto")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+# Bound for the memory backend; idle sessions are dropped after the TTL
+MEMORY_SESSION_LIMIT = int(os.getenv("MEMORY_SESSION_LIMIT", "1000"))
+MEMORY_SESSION_TTL = float(os.getenv("MEMORY_SESSION_TTL", str(24 * 3600)))
+# History endpoints: default/max page size, and max ids per bulk result request
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+HISTORY_MAX_BATCH = int(os.getenv("HISTORY_MAX_BATCH", "100"))
+
+
+def new_record(session_id: str, status: str = "waiting") -> dict:
+    return {
+        "id": session_id,
+        "created_at": datetime.utcnow(),
+        "status": status,
+        "image_paths": [],
+        "detected_ingredients": [],
+        "meal_plan": None,
+        "shopping_list": None,
+        "version": 1,
+    }
+
+
+def etag_for(record: dict) -> str:
+    return f'W/"{record["id"]}-{record["version"]}"'
+
+
+# --- History cursors ---
+# Opaque to clients: the (created_at, id) of the last row of the previous page
+
+def encode_cursor(record: dict) -> str:
+    raw = json.dumps([record["created_at"].isoformat(), record["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Raises ValueError for anything encode_cursor did not produce."""
+    try:
+        created_at, session_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(session_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+class SessionRepository:
+    """Storage for analysis sessions.
+
+    Records are plain dicts (see new_record); callers treat them as
+    read-only snapshots and go through the repository for every change.
+    Data methods are coroutines so request handlers never block the event
+    loop on the database.
+    """
+
+    persistent = False
+
+    async def create(self, session_id: str, status: str = "waiting") -> dict:
+        raise NotImplementedError
+
+    async def get(self, session_id: str) -> dict | None:
+        raise NotImplementedError
+
+    async def add_images(self, session_id: str, saved_images: list) -> dict | None:
+        """Appends (path, sha256, size) uploads and marks the session uploaded."""
+        raise NotImplementedError
+
+    async def set_status(self, session_id: str, status: str) -> dict | None:
+        raise NotImplementedError
+
+    async def bytes_used(self, session_id: str) -> int:
+        raise NotImplementedError
+
+    async def list_page(self, limit: int, before: tuple[datetime, str] | None = None,
+                        include_plan: bool = False) -> list[dict]:
+        """Newest sessions first, strictly older than the `before` (created_at, id) key.
+
+        Without include_plan, records omit meal_plan and shopping_list.
+        """
+        raise NotImplementedError
+
+    async def get_many(self, session_ids: list[str], include_plan: bool = False) -> dict[str, dict]:
+        """Records by id for those sessions that exist; same projection as list_page."""
+        raise NotImplementedError
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__}
+
+
+def _project(record: dict, include_plan: bool) -> dict:
+    """Copy of a full record in the list_page/get_many shape."""
+    if include_plan:
+        return copy.deepcopy(record)
+    return copy.deepcopy({key: value for key, value in record.items() if key not in ("meal_plan", "shopping_list")})
+
+
+class SqlSessionRepository(SessionRepository):
+    """Sessions in the `sessions` table via the async engine; each call uses its own short DB session.
+
+    Reads are a single column projection with outer joins to the plan and
+    list tables, instead of loading the row and lazy-loading both relations.
+    History reads leave out the joins (and the plan JSON) unless asked for.
+    """
+
+    persistent = True
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or database.AsyncSessionLocal
+
+    @staticmethod
+    def _projection(include_plan: bool = True):
+        columns = [
+            models.Session.id,
+            models.Session.created_at,
+            models.Session.status,
+            models.Session.image_paths,
+            models.Session.detected_ingredients,
+            models.Session.version,
+        ]
+        if not include_plan:
+            return select(*columns)
+        return (
+            select(
+                *columns,
+                models.GeneratedPlan.content.label("meal_plan"),
+                models.ShoppingList.content.label("shopping_list"),
+            )
+            .outerjoin(models.GeneratedPlan, and_(
+                models.GeneratedPlan.session_id == models.Session.id, models.GeneratedPlan.is_draft.is_(False),
+            ))
+            .outerjoin(models.ShoppingList, models.ShoppingList.session_id == models.Session.id)
+        )
+
+    @classmethod
+    def _select(cls, session_id: str):
+        return cls._projection().where(models.Session.id == session_id)
+
+    @staticmethod
+    def _to_record(row) -> dict:
+        values = row._mapping
+        record = {
+            "id": values["id"],
+            "created_at": values["created_at"],
+            "status": values["status"],
+            "image_paths": list(values["image_paths"] or []),
+            "detected_ingredients": values["detected_ingredients"],
+            "version": values["version"],
+        }
+        if "meal_plan" in values:
+            record["meal_plan"] = values["meal_plan"]
+            record["shopping_list"] = values["shopping_list"]
+        return record
+
+    async def _reload(self, db, session_id: str) -> dict | None:
+        row = (await db.execute(self._select(session_id))).first()
+        return self._to_record(row) if row else None
+
+    async def create(self, session_id: str, status: str = "waiting") -> dict:
+        async with self.session_factory() as db:
+            db.add(models.Session(id=session_id, status=status, image_paths=[], version=1))
+            await db.commit()
+            return new_record(session_id, status)
+
+    async def get(self, session_id: str) -> dict | None:
+        async with self.session_factory() as db:
+            return await self._reload(db, session_id)
+
+    async def add_images(self, session_id: str, saved_images: list) -> dict | None:
+        async with self.session_factory() as db:
+            row = await db.get(models.Session, session_id)
+            if row is None:
+                return None
+            row.image_paths = (row.image_paths or []) + [path for path, _, _ in saved_images]
+            row.status = "uploaded"
+            row.files_purged_at = None  # New files: retention starts over
+            for path, sha256, size in saved_images:
+                db.add(models.UploadedImage(session_id=session_id, path=path, sha256=sha256, size_bytes=size))
+            await db.commit()
+            return await self._reload(db, session_id)
+
+    async def set_status(self, session_id: str, status: str) -> dict | None:
+        async with self.session_factory() as db:
+            row = await db.get(models.Session, session_id)
+            if row is None:
+                return None
+            row.status = status
+            await db.commit()
+            return await self._reload(db, session_id)
+
+    async def bytes_used(self, session_id: str) -> int:
+        async with self.session_factory() as db:
+            return await db.scalar(
+                select(func.coalesce(func.sum(models.UploadedImage.size_bytes), 0))
+                .where(models.UploadedImage.session_id == session_id)
+            )
+
+    async def list_page(self, limit: int, before: tuple[datetime, str] | None = None,
+                        include_plan: bool = False) -> list[dict]:
+        Session = models.Session
+        query = self._projection(include_plan)
+        if before is not None:
+            created_at, session_id = before
+            # Keyset: (created_at, id) < (:created_at, :id), spelled out for SQLite; served by ix_sessions_created_at_id
+            query = query.where(or_(
+                Session.created_at < created_at,
+                and_(Session.created_at == created_at, Session.id < session_id),
+            ))
+        query = query.where(Session.created_at.is_not(None)).order_by(Session.created_at.desc(), Session.id.desc())
+        async with self.session_factory() as db:
+            rows = (await db.execute(query.limit(limit))).all()
+        return [self._to_record(row) for row in rows]
+
+    async def get_many(self, session_ids: list[str], include_plan: bool = False) -> dict[str, dict]:
+        if not session_ids:
+            return {}
+        query = self._projection(include_plan).where(models.Session.id.in_(set(session_ids)))
+        async with self.session_factory() as db:
+            rows = (await db.execute(query)).all()
+        return {row.id: self._to_record(row) for row in rows}
+
+
+class MemorySessionRepository(SessionRepository):
+    """Process-local sessions for running without a database.
+
+    Bounded by MEMORY_SESSION_LIMIT with LRU/TTL eviction. get() returns
+    the stored record itself so in-process analysis (run_mock_analysis)
+    can fill it in as it goes; since that bypasses the repository, the
+    version is bumped on each session event instead of on each write.
+    """
+
+    def __init__(self, max_entries: int = MEMORY_SESSION_LIMIT, ttl: float = MEMORY_SESSION_TTL):
+        self.records = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.image_bytes = LRUCache(max_entries=max_entries, ttl=ttl)
+        event_service.broker.add_listener(lambda session_id, event: self._bump(session_id))
+
+    def _bump(self, session_id: str):
+        record = self.records.get(session_id)
+        if record is not None:
+            record["version"] += 1
+
+    async def create(self, session_id: str, status: str = "waiting") -> dict:
+        record = new_record(session_id, status)
+        self.records.set(session_id, record)
+        return record
+
+    async def get(self, session_id: str) -> dict | None:
+        return self.records.get(session_id)
+
+    async def add_images(self, session_id: str, saved_images: list) -> dict | None:
+        record = self.records.get(session_id)
+        if record is None:
+            return None
+        record["image_paths"].extend(path for path, _, _ in saved_images)
+        record["status"] = "uploaded"
+        self.image_bytes.set(session_id, self.image_bytes.get(session_id, 0) + sum(size for _, _, size in saved_images))
+        return record
+
+    async def set_status(self, session_id: str, status: str) -> dict | None:
+        record = self.records.get(session_id)
+        if record is not None:
+            record["status"] = status
+        return record
+
+    async def bytes_used(self, session_id: str) -> int:
+        return self.image_bytes.get(session_id, 0)
+
+    async def list_page(self, limit: int, before: tuple[datetime, str] | None = None,
+                        include_plan: bool = False) -> list[dict]:
+        records = sorted(
+            (record for _, record in self.records.items()
+             if before is None or (record["created_at"], record["id"]) < before),
+            key=lambda record: (record["created_at"], record["id"]),
+            reverse=True,
+        )
+        return [_project(record, include_plan) for record in records[:limit]]
+
+    async def get_many(self, session_ids: list[str], include_plan: bool = False) -> dict[str, dict]:
+        found = {}
+        for session_id in session_ids:
+            record = self.records.get(session_id)
+            if record is not None:
+                found[session_id] = _project(record, include_plan)
+        return found
+
+    def clear(self):
+        self.records.clear()
+        self.image_bytes.clear()
+
+    def stats(self) -> dict:
+        return {**super().stats(), **self.records.stats()}
+
+
+class CachedSessionRepository(SessionRepository):
+    """Write-through LRU/TTL cache in front of another repository.
+
+    Writes go to the backend first and the fresh record replaces the cached
+    one. Writers that bypass the repository (the analysis worker, possibly
+    in another process) publish session events; every event for a session
+    drops its cached record, and the TTL bounds staleness if an event is lost.
+    """
+
+    def __init__(self, backend: SessionRepository, max_entries: int = SESSION_CACHE_SIZE,
+                 ttl: float = SESSION_CACHE_TTL):
+        self.backend = backend
+        self.persistent = backend.persistent
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        event_service.broker.add_listener(lambda session_id, event: self.invalidate(session_id))
+
+    def invalidate(self, session_id: str):
+        self.cache.delete(session_id)
+
+    def _store(self, record: dict | None) -> dict | None:
+        if record is not None:
+            self.cache.set(record["id"], record)
+            return copy.deepcopy(record)
+        return None
+
+    async def create(self, session_id: str, status: str = "waiting") -> dict:
+        return self._store(await self.backend.create(session_id, status))
+
+    async def get(self, session_id: str) -> dict | None:
+        record = self.cache.get(session_id)
+        if record is not None:
+            return copy.deepcopy(record)
+        return self._store(await self.backend.get(session_id))
+
+    async def add_images(self, session_id: str, saved_images: list) -> dict | None:
+        return self._store(await self.backend.add_images(session_id, saved_images))
+
+    async def set_status(self, session_id: str, status: str) -> dict | None:
+        return self._store(await self.backend.set_status(session_id, status))
+
+    async def bytes_used(self, session_id: str) -> int:
+        return await self.backend.bytes_used(session_id)
+
+    async def list_page(self, limit: int, before: tuple[datetime, str] | None = None,
+                        include_plan: bool = False) -> list[dict]:
+        return await self.backend.list_page(limit, before, include_plan)
+
+    async def get_many(self, session_ids: list[str], include_plan: bool = False) -> dict[str, dict]:
+        # Cached records are complete, so they serve either projection; one backend query for the rest
+        found, missing = {}, []
+        for session_id in dict.fromkeys(session_ids):
+            record = self.cache.get(session_id)
+            if record is not None:
+                found[session_id] = _project(record, include_plan)
+            else:
+                missing.append(session_id)
+        fetched = await self.backend.get_many(missing, include_plan) if missing else {}
+        for session_id, record in fetched.items():
+            found[session_id] = self._store(record) if include_plan else record
+        return found
+
+    def clear(self):
+        self.cache.clear()
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__, **self.cache.stats()}
+
+
+async def _database_available() -> bool:
+    try:
+        async with database.async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.warning("Database unavailable, using in-memory sessions: %s", e)
+        return False
+
+
+async def build_repository(backend: str = SESSION_BACKEND) -> SessionRepository:
+    if backend == "memory" or (backend == "auto" and not await _database_available()):
+        return MemorySessionRepository()
+    return CachedSessionRepository(SqlSessionRepository())
+
+
+_repository = None
+_repository_lock = asyncio.Lock()
+
+
+async def get_session_repository() -> SessionRepository:
+    """Process-wide repository, chosen on first use (usable as a FastAPI dependency)."""
+    global _repository
+    if _repository is None:
+        async with _repository_lock:
+            if _repository is None:
+                _repository = await build_repository()
+    return _repository
@@ -0,0 +1,276 @@
+"""Where uploaded images live, and when they are deleted.
+
+Uploads go to a hash-sharded local layout:
+
+    uploads/<aa>/<bb>/<session_id>/<ms>_<index>_<name>
+
+where aa/bb come from sha256(session_id), so no directory grows past a
+few hundred entries and all files of a session (including processed
+copies) can be removed with one directory delete.
+
+STORAGE_BACKEND=s3 additionally mirrors every file to an S3-compatible
+bucket (AWS, MinIO - see docker-compose.yml) under the same relative
+key. The local directory then acts as a working copy: the pipeline
+always reads local paths, and a node that lacks a file downloads it
+first (ensure_local). Requires boto3.
+
+StorageJanitor (opt-in: STORAGE_GC_ENABLED=true) deletes the files of
+finished sessions STORAGE_RETENTION_DONE_HOURS after their last activity
+and of any session after STORAGE_RETENTION_HOURS, in batches of
+STORAGE_GC_BATCH sessions. Sessions with a queued or running analysis
+job are never touched.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, exists, or_, update
+
+from backend import database, models
+from backend.services import job_service, metrics_service
+from backend.services.image_service import processed_variants
+from backend.services.log_service import get_logger
+
+logger = get_logger(__name__)
+
+# --- Storage Settings ---
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")  # local | s3
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# Levels of 2 hex chars above the session directory (2 -> 65536 shards)
+STORAGE_SHARD_DEPTH = int(os.getenv("STORAGE_SHARD_DEPTH", "2"))
+STORAGE_S3_BUCKET = os.getenv("STORAGE_S3_BUCKET", "mealplan-uploads")
+STORAGE_S3_ENDPOINT = os.getenv("STORAGE_S3_ENDPOINT") or None  # e.g. http://localhost:9000 for MinIO
+STORAGE_S3_REGION = os.getenv("STORAGE_S3_REGION") or None
+
+# --- Retention Settings ---
+# Off by default: enabling it starts deleting user images
+STORAGE_GC_ENABLED = os.getenv("STORAGE_GC_ENABLED", "false").lower() == "true"
+STORAGE_GC_INTERVAL = int(os.getenv("STORAGE_GC_INTERVAL", "3600"))
+STORAGE_GC_BATCH = int(os.getenv("STORAGE_GC_BATCH", "100"))
+STORAGE_RETENTION_DONE_HOURS = float(os.getenv("STORAGE_RETENTION_DONE_HOURS", "24"))
+STORAGE_RETENTION_HOURS = float(os.getenv("STORAGE_RETENTION_HOURS", str(7 * 24)))
+
+FINISHED_STATUSES = ("done", "error")
+
+
+class LocalStorage:
+    """Sharded directory tree under UPLOAD_DIR."""
+
+    name = "local"
+
+    def __init__(self, root: str = UPLOAD_DIR, shard_depth: int = STORAGE_SHARD_DEPTH):
+        self.root = root
+        self.shard_depth = shard_depth
+
+    def session_dir(self, session_id: str) -> str:
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, session_id)
+
+    def commit(self, paths: list[str]):
+        """Called once files under the root are completely written."""
+
+    def ensure_local(self, paths: list[str]) -> list[str]:
+        return paths
+
+    def delete_session(self, session_id: str, paths: list[str]) -> tuple[int, int]:
+        """Removes a session's files. Returns (files, bytes) deleted locally."""
+        files = removed_bytes = 0
+        directory = self.session_dir(session_id)
+        # Flat files from before sharding, and their processed copies
+        for path in paths + [variant for path in paths for variant in processed_variants(path)]:
+            if not path.startswith(directory + os.sep) and os.path.isfile(path):
+                removed_bytes += os.path.getsize(path)
+                os.remove(path)
+                files += 1
+        if os.path.isdir(directory):
+            for dirpath, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    removed_bytes += os.path.getsize(os.path.join(dirpath, filename))
+                    files += 1
+            shutil.rmtree(directory, ignore_errors=True)
+        return files, removed_bytes
+
+    def usage(self) -> dict:
+        """Files and bytes on disk. Walks the whole tree, so call it from the janitor only."""
+        files = total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    continue  # Deleted while walking
+                files += 1
+        return {"local": {"files": files, "bytes": total}}
+
+
+class S3Storage(LocalStorage):
+    """Local working copy mirrored to an S3-compatible bucket."""
+
+    name = "s3"
+
+    def __init__(self, bucket: str = STORAGE_S3_BUCKET, client=None, **kwargs):
+        super().__init__(**kwargs)
+        if client is None:
+            # Imported here: boto3 adds noticeably to startup and only the s3 backend needs it
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("STORAGE_BACKEND=s3 requires boto3") from None
+            client = boto3.client("s3", endpoint_url=STORAGE_S3_ENDPOINT, region_name=STORAGE_S3_REGION)
+        self.client = client
+        self.bucket = bucket
+
+    def key_for(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def commit(self, paths: list[str]):
+        for path in paths:
+            self.client.upload_file(path, self.bucket, self.key_for(path))
+
+    def ensure_local(self, paths: list[str]) -> list[str]:
+        for path in paths:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    self.client.download_file(self.bucket, self.key_for(path), path + ".tmp")
+                    os.replace(path + ".tmp", path)
+                except Exception as e:
+                    logger.warning("Could not fetch %s from storage: %s", path, e)
+        return paths
+
+    def delete_session(self, session_id: str, paths: list[str]) -> tuple[int, int]:
+        files, removed_bytes = super().delete_session(session_id, paths)
+        prefix = self.key_for(self.session_dir(session_id)) + "/"
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if objects:
+                # At most 1000 keys per page, the delete_objects limit
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+        return files, removed_bytes
+
+    def usage(self) -> dict:
+        files = total = 0
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket):
+            for obj in page.get("Contents", []):
+                files += 1
+                total += obj["Size"]
+        return {**super().usage(), "s3": {"files": files, "bytes": total}}
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> LocalStorage:
+    """Process-wide storage backend, chosen by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = S3Storage() if STORAGE_BACKEND == "s3" else LocalStorage()
+    return _storage
+
+
+# --- Retention ---
+
+def purge_expired_sessions(
+    storage: LocalStorage | None = None,
+    batch_size: int = STORAGE_GC_BATCH,
+    now: datetime | None = None,
+) -> dict:
+    """Deletes files of one batch of sessions past retention and marks them purged.
+
+    Retention counts from the session's last activity (updated_at), and
+    sessions with an unfinished analysis job are skipped whatever their age.
+    """
+    storage = storage or get_storage()
+    now = now or datetime.utcnow()
+    Session, Job = models.Session, models.AnalysisJob
+    expired = or_(
+        and_(Session.status.in_(FINISHED_STATUSES), Session.updated_at < now - timedelta(hours=STORAGE_RETENTION_DONE_HOURS)),
+        Session.updated_at < now - timedelta(hours=STORAGE_RETENTION_HOURS),
+    )
+    analyzing = exists().where(Job.session_id == Session.id, Job.status.in_(job_service.ACTIVE_STATUSES))
+    summary = {"sessions": 0, "files": 0, "bytes": 0}
+    db = database.SessionLocal()
+    try:
+        rows = (
+            db.query(Session.id, Session.image_paths)
+            .filter(Session.files_purged_at.is_(None), expired, ~analyzing)
+            .order_by(Session.updated_at)
+            .limit(batch_size)
+            .all()
+        )
+        purged = []
+        for session_id, image_paths in rows:
+            try:
+                files, removed_bytes = storage.delete_session(session_id, image_paths or [])
+            except Exception as e:
+                logger.warning("Could not delete files: %s", e, extra={"session_id": session_id})
+                continue
+            purged.append(session_id)
+            summary["files"] += files
+            summary["bytes"] += removed_bytes
+        if purged:
+            # Core UPDATE: purging files is not a change clients need a new ETag for
+            db.execute(update(Session).where(Session.id.in_(purged)).values(files_purged_at=now))
+            db.commit()
+        summary["sessions"] = len(purged)
+    finally:
+        db.close()
+
+    metrics_service.storage_purged_total.inc(summary["sessions"], unit="sessions")
+    metrics_service.storage_purged_total.inc(summary["files"], unit="files")
+    metrics_service.storage_purged_total.inc(summary["bytes"], unit="bytes")
+    return summary
+
+
+def record_usage(storage: LocalStorage | None = None) -> dict:
+    usage = (storage or get_storage()).usage()
+    for location, values in usage.items():
+        metrics_service.storage_files.set(values["files"], location=location)
+        metrics_service.storage_bytes.set(values["bytes"], location=location)
+    return usage
+
+
+class StorageJanitor:
+    """Background thread running retention and refreshing the disk-usage gauges."""
+
+    def __init__(self, interval: int = STORAGE_GC_INTERVAL, batch_size: int = STORAGE_GC_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> dict:
+        total = {"sessions": 0, "files": 0, "bytes": 0}
+        # Batches keep each transaction short; stop early when asked to shut down
+        while not self._stop.is_set():
+            summary = purge_expired_sessions(batch_size=self.batch_size)
+            for key in total:
+                total[key] += summary[key]
+            if summary["sessions"] < self.batch_size:
+                break
+        if total["sessions"]:
+            logger.info("Purged expired uploads", extra=total)
+        record_usage()
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning("Storage retention failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import time
+
+from anyio import to_thread
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from backend.services.storage_service import get_storage
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(20 * 1024 * 1024)))
+MAX_UPLOAD_SESSION_BYTES = int(os.getenv("MAX_UPLOAD_SESSION_BYTES", str(100 * 1024 * 1024)))
+# Boundaries and part headers on top of the file bytes, allowed when checking Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_FIELD = "files"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class _SessionBudget:
+    """Bytes still allowed for the session. Shared by the concurrent writers of one request."""
+
+    def __init__(self, remaining: int):
+        self.remaining = remaining
+
+    def consume(self, n: int):
+        self.remaining -= n
+        if self.remaining < 0:
+            raise UploadTooLarge(f"Session upload limit of {MAX_UPLOAD_SESSION_BYTES} bytes exceeded")
+
+
+def _safe_name(filename: str | None) -> str:
+    original_name = filename or "unknown.jpg"
+    safe_name = "".join(c for c in original_name if c.isalnum() or c in "._-")
+    return safe_name or "image.jpg"
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    out.write(chunk)
+    digest.update(chunk)
+
+
+class _UploadParser:
+    """Feeds a multipart body to python-multipart and writes file parts to disk as they arrive.
+
+    The parser's callbacks are synchronous, so data and part ends are only
+    queued there; feed() applies them with disk writes off the event loop.
+    """
+
+    def __init__(self, boundary: bytes, directory: str, budget: _SessionBudget):
+        self.directory = directory
+        self.budget = budget
+        self.timestamp = int(time.time() * 1000)
+        self.saved = []  # (path, sha256, size) per finished file, in request order
+        self.paths = []  # Every file opened, for cleanup on failure
+        self._events = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._out = None
+        self._digest = None
+        self._filename = None
+        self._size = 0
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": lambda data, start, end: self._events.append(("data", data[start:end])),
+            "on_part_end": lambda: self._events.append(("end", None)),
+        })
+
+    def _on_part_begin(self):
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") == UPLOAD_FIELD.encode() and b"filename" in options:
+            self._events.append(("open", options[b"filename"].decode("utf-8", "replace")))
+        else:
+            self._events.append(("skip", None))  # Other form fields are ignored (but still counted)
+
+    async def feed(self, chunk: bytes):
+        self.parser.write(chunk)
+        await self._apply()
+
+    async def finish(self):
+        self.parser.finalize()
+        await self._apply()
+        if self._out is not None:
+            raise FormParserError("Request body ended inside a file")
+
+    async def _apply(self):
+        events, self._events = self._events, []
+        for kind, value in events:
+            if kind == "open":
+                path = os.path.join(self.directory, f"{self.timestamp}_{len(self.paths)}_{_safe_name(value)}")
+                self.paths.append(path)
+                self._out = await to_thread.run_sync(open, path, "wb")
+                self._digest, self._filename, self._size = hashlib.sha256(), value, 0
+            elif kind == "data":
+                self.budget.consume(len(value))
+                if self._out is None:
+                    continue
+                self._size += len(value)
+                if self._size > MAX_UPLOAD_FILE_BYTES:
+                    raise UploadTooLarge(f"{self._filename} exceeds the per-file limit of {MAX_UPLOAD_FILE_BYTES} bytes")
+                # Disk write and hashing both happen off the event loop
+                await to_thread.run_sync(_write_chunk, self._out, self._digest, value)
+            elif kind == "end" and self._out is not None:
+                out, self._out = self._out, None
+                await to_thread.run_sync(out.close)
+                self.saved.append((self.paths[-1], self._digest.hexdigest(), self._size))
+
+    async def discard(self):
+        if self._out is not None:
+            await to_thread.run_sync(self._out.close)
+            self._out = None
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def save_uploads(request: Request, session_id: str, session_bytes_used: int = 0):
+    """Streams the image files of a multipart/form-data request to disk.
+
+    The body is parsed here instead of through UploadFile, which Starlette
+    spools in full before the handler runs. Limits are enforced up front
+    from Content-Length and again per chunk, so an oversized upload is cut
+    off with 413 as soon as it crosses one. Returns a list of
+    (path, sha256, size) in request order. On any failure every file of the
+    request is removed.
+    """
+    remaining = MAX_UPLOAD_SESSION_BYTES - session_bytes_used
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > remaining + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Session upload limit of {MAX_UPLOAD_SESSION_BYTES} bytes exceeded")
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    storage = get_storage()
+    directory = storage.session_dir(session_id)
+    await to_thread.run_sync(lambda: os.makedirs(directory, exist_ok=True))
+
+    upload = _UploadParser(params[b"boundary"], directory, _SessionBudget(remaining))
+    try:
+        async for chunk in request.stream():
+            await upload.feed(chunk)
+        await upload.finish()
+    except BaseException as e:
+        await upload.discard()
+        if isinstance(e, UploadTooLarge):
+            raise HTTPException(status_code=413, detail=str(e)) from e
+        if isinstance(e, FormParserError):
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}") from e
+        raise
+    if not upload.saved:
+        raise HTTPException(status_code=400, detail=f"No files in the {UPLOAD_FIELD!r} field")
+
+    # Remote backends: the file only counts as stored once it's mirrored
+    await to_thread.run_sync(storage.commit, [path for path, _, _ in upload.saved])
+    return upload.saved
@@ -0,0 +1,30 @@
+"""Tests run against a throwaway SQLite database and the offline model stand-in.
+
+Settings are read when backend modules are imported, so they are set here,
+before any test module imports one.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="mealplan_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ["UPLOAD_DIR"] = os.path.join(_workdir, "uploads")
+os.environ["GENAI_BACKEND"] = "fake"
+os.environ["ANALYSIS_WORKER_CONCURRENCY"] = "0"
+os.environ["EVENTS_BACKEND"] = "memory"
+
+import pytest  # noqa: E402
+
+from backend import database, models  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A sync session on freshly created tables."""
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,174 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from backend import models
+from backend.services import analysis_service, metrics_service, preplan_service
+
+BARGAINS = ["鶏もも肉"]
+CURRY = {"day": "Monday", "meals": {"dinner": "カレーライス"}}
+
+
+class Pipeline:
+    """run_analysis with detection, planning and bargains replaced by recorders."""
+
+    def __init__(self, db):
+        self.db = db
+        self.detects = {}  # image file name -> ingredient names detect returns for it
+        self.detect_calls = []
+        self.plan_calls = 0
+        self.fallback = False
+        self.failed = set()  # image file names whose detection group fails
+
+    def detect(self, paths, image_hashes=None):
+        self.detect_calls.append([os.path.basename(path) for path in paths])
+        if self.fallback:
+            return {"ingredients": [{"name": "Mock Apple", "category": "その他"}], "fallback": True}
+        result = {"ingredients": [
+            {"name": name, "category": "その他"}
+            for path in paths if os.path.basename(path) not in self.failed
+            for name in self.detects.get(os.path.basename(path), [])
+        ]}
+        if self.failed:
+            result["failed_paths"] = [path for path in paths if os.path.basename(path) in self.failed]
+        return result
+
+    def plan(self, ingredients, bargains, on_item):
+        self.plan_calls += 1
+        on_item("meal_plan", CURRY)
+        return {"meal_plan": [CURRY], "shopping_list": [{"item": "カレールウ", "reason": "missing"}]}
+
+    def add_image(self, session_id: str, name: str, ingredients: list[str]):
+        session = self.db.get(models.Session, session_id)
+        path = f"uploads/{session_id}/{name}"
+        session.image_paths = (session.image_paths or []) + [path]
+        self.db.add(models.UploadedImage(session_id=session_id, path=path, sha256=None, size_bytes=1))
+        self.db.commit()
+        self.detects[name] = ingredients
+
+    def run(self, session_id: str):
+        self.db.expire_all()
+        return analysis_service.run_analysis(self.db, session_id)
+
+    def session(self, session_id: str) -> models.Session:
+        self.db.expire_all()
+        return self.db.get(models.Session, session_id)
+
+
+@pytest.fixture
+def pipeline(db, monkeypatch):
+    pipeline = Pipeline(db)
+    monkeypatch.setattr(analysis_service, "detect_ingredients", pipeline.detect)
+    monkeypatch.setattr(analysis_service, "generate_plan_stream", pipeline.plan)
+    monkeypatch.setattr(analysis_service, "get_bargain_items", lambda: list(BARGAINS))
+    monkeypatch.setattr(analysis_service, "preprocess_images", lambda paths: paths)
+    db.add(models.Session(id="s1", status="uploaded", image_paths=[], version=1))
+    db.commit()
+    return pipeline
+
+
+def _names(session: models.Session) -> set:
+    return {ingredient["name"] for ingredient in session.detected_ingredients}
+
+
+def _analyzed(db, session_id: str) -> dict:
+    rows = db.query(models.UploadedImage).filter(models.UploadedImage.session_id == session_id)
+    return {os.path.basename(row.path): row.analyzed_at is not None for row in rows}
+
+
+def test_first_analysis_detects_everything_and_plans(pipeline, db):
+    pipeline.add_image("s1", "a.jpg", ["豚肉", "じゃがいも", "人参"])
+    pipeline.add_image("s1", "b.jpg", ["玉ねぎ", "卵"])
+    planned = metrics_service.replan_total.value(decision="new")
+
+    pipeline.run("s1")
+
+    session = pipeline.session("s1")
+    assert pipeline.detect_calls == [["a.jpg", "b.jpg"]]
+    assert session.status == "done"
+    assert _names(session) == {"豚肉", "じゃがいも", "人参", "玉ねぎ", "卵"}
+    assert _analyzed(db, "s1") == {"a.jpg": True, "b.jpg": True}
+    assert session.meal_plan.content == [CURRY]
+    assert set(session.meal_plan.ingredient_names) == _names(session)
+    assert metrics_service.replan_total.value(decision="new") == planned + 1
+
+
+def test_reanalysis_detects_only_new_images_and_keeps_a_fitting_plan(pipeline, db):
+    pipeline.add_image("s1", "a.jpg", ["豚肉", "じゃがいも", "人参", "玉ねぎ", "卵"])
+    pipeline.run("s1")
+    pipeline.add_image("s1", "b.jpg", ["カレールウ"])
+
+    pipeline.run("s1")
+
+    session = pipeline.session("s1")
+    assert pipeline.detect_calls[-1] == ["b.jpg"]
+    assert "カレールウ" in _names(session) and "豚肉" in _names(session)
+    assert pipeline.plan_calls == 1  # 5/6 similar: plan kept
+    assert session.shopping_list.content == []  # The curry roux is in the fridge now
+
+
+def test_reanalysis_replans_when_the_ingredients_moved(pipeline, db):
+    pipeline.add_image("s1", "a.jpg", ["豚肉", "じゃがいも"])
+    pipeline.run("s1")
+    pipeline.add_image("s1", "b.jpg", ["鮭", "豆腐", "ねぎ"])
+
+    pipeline.run("s1")
+
+    session = pipeline.session("s1")
+    assert pipeline.plan_calls == 2
+    assert set(session.meal_plan.ingredient_names) == {"豚肉", "じゃがいも", "鮭", "豆腐", "ねぎ"}
+
+
+def test_fallback_detection_keeps_real_ingredients_and_retries_images(pipeline, db):
+    pipeline.add_image("s1", "a.jpg", ["豚肉", "じゃがいも"])
+    pipeline.run("s1")
+    pipeline.add_image("s1", "b.jpg", ["卵"])
+    pipeline.fallback = True
+
+    pipeline.run("s1")
+
+    assert _names(pipeline.session("s1")) == {"豚肉", "じゃがいも"}
+    assert _analyzed(db, "s1") == {"a.jpg": True, "b.jpg": False}
+
+    pipeline.fallback = False
+    pipeline.run("s1")
+    assert pipeline.detect_calls[-1] == ["b.jpg"]
+    assert "卵" in _names(pipeline.session("s1"))
+
+
+def test_failed_fanout_group_is_detected_again(pipeline, db):
+    pipeline.add_image("s1", "a.jpg", ["豚肉"])
+    pipeline.add_image("s1", "b.jpg", ["卵"])
+    pipeline.failed = {"b.jpg"}
+
+    pipeline.run("s1")
+
+    assert _names(pipeline.session("s1")) == {"豚肉"}
+    assert _analyzed(db, "s1") == {"a.jpg": True, "b.jpg": False}
+    pipeline.failed = set()
+    pipeline.run("s1")
+    assert pipeline.detect_calls[-1] == ["b.jpg"]
+
+
+def test_serves_a_similar_draft_with_a_list_for_this_session(pipeline, db):
+    owned = ["じゃがいも", "人参", "玉ねぎ", "豚肉", "醤油"]
+    draft_names = sorted(owned + ["みりん"])  # 5/6 similar
+    db.add(models.Session(id="other", status="done", image_paths=[], version=1))
+    db.add(models.GeneratedPlan(
+        session_id="other", is_draft=True, content=[{"day": "Monday", "meals": {"dinner": "肉じゃが"}}],
+        draft_shopping_list=[], ingredient_names=draft_names, created_at=datetime.utcnow(),
+        bargains_key=preplan_service.bargains_key(BARGAINS),
+        draft_key=preplan_service.draft_key(tuple(draft_names), BARGAINS),
+    ))
+    db.commit()
+    pipeline.add_image("s1", "a.jpg", owned)
+
+    pipeline.run("s1")
+
+    session = pipeline.session("s1")
+    assert pipeline.plan_calls == 0
+    assert session.meal_plan.content[0]["meals"]["dinner"] == "肉じゃが"
+    assert set(session.meal_plan.ingredient_names) == set(owned)
+    assert "みりん" in [item["item"] for item in session.shopping_list.content]  # Missing here, not in the draft's list
+    assert db.query(models.GeneratedPlan).filter(models.GeneratedPlan.is_draft.is_(True)).count() == 0
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import date
+from pathlib import Path
+
+import httpx
+
+from backend import database, models
+from backend.services import flyer_service
+
+DATA = Path(__file__).parent.parent / "data"
+FIXTURES = DATA / "flyer_fixtures"
+TODAY = date(2026, 1, 5)
+
+
+def _fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def _serve_fixtures(requests: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        # Fetches run with no DB session open, so a slow site holds no pooled connection
+        assert database.async_engine.pool.checkedout() == 0
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        path = FIXTURES / request.url.path.lstrip("/")
+        if not path.is_file():
+            return httpx.Response(404)
+        return httpx.Response(200, text=path.read_text(encoding="utf-8"), headers={"ETag": '"v1"'})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def _ingest(client, sources_file: str = str(DATA / "flyer_sources.example.json")) -> dict:
+    async def run():
+        try:
+            return await flyer_service.run_ingestion(client=client, sources_file=sources_file, today=TODAY)
+        finally:
+            await client.aclose()
+            await database.async_engine.dispose()  # Pooled connections belong to this event loop
+    return asyncio.run(run())
+
+
+def test_parse_flyer_default_selectors():
+    items = flyer_service.parse_flyer(_fixture("sample_mart.html"), today=TODAY)
+
+    assert [item["name"] for item in items] == ["鶏むね肉", "キャベツ", "卵", "生鮭"]
+    assert items[0] == {
+        "name": "鶏むね肉", "price": 58, "unit": "100gあたり",
+        "valid_from": date(2026, 1, 5), "valid_until": date(2026, 1, 11),
+    }
+    assert items[3]["price"] == 1280
+    assert items[3]["valid_until"] == date(2026, 1, 6)  # The item's own date wins over the page's
+
+
+def test_parse_flyer_selector_overrides_and_defaults():
+    selectors = {"item": "li.sale", "name": "span.title", "price": "span.yen", "unit": "span.qty"}
+    items = flyer_service.parse_flyer(_fixture("fresh_ichiba.html"), selectors, today=TODAY)
+
+    assert [(item["name"], item["price"], item["unit"]) for item in items] == [
+        ("ブロッコリー", 98, "1株"), ("豚こま切れ", 138, "100g"), ("ヨーグルト", 158, None),
+    ]
+    assert {item["valid_from"] for item in items} == {TODAY}  # Page states no start date
+    assert {item["valid_until"] for item in items} == {date(2026, 1, 8)}
+
+
+def test_parse_flyer_skips_items_without_a_name():
+    html = '<ul><li class="bargain-item"><span class="price">100円</span></li></ul>'
+    assert flyer_service.parse_flyer(html, today=TODAY) == []
+
+
+def test_run_ingestion_stores_items_and_revalidates(db):
+    requests = []
+    summary = _ingest(_serve_fixtures(requests))
+
+    assert summary == {"sources": 2, "updated": 2, "not_modified": 0, "failed": 0, "items": 7}
+    names = {row.name for row in db.query(models.BargainItem)}
+    assert {"鶏むね肉", "生鮭", "ブロッコリー", "ヨーグルト"} <= names
+    assert {row.etag for row in db.query(models.FlyerSource)} == {'"v1"'}
+
+    # Second pass sends the stored ETag and keeps the items on 304
+    summary = _ingest(_serve_fixtures(requests))
+    assert summary["not_modified"] == 2
+    assert requests[-1].headers["if-none-match"] == '"v1"'
+    assert db.query(models.BargainItem).count() == 7
+
+
+def test_run_ingestion_records_failures(db, tmp_path):
+    sources = tmp_path / "sources.json"
+    sources.write_text('[{"store": "S", "region": "tokyo", "url": "http://flyers.test/missing.html"}]')
+    summary = _ingest(_serve_fixtures([]), str(sources))
+
+    assert summary["failed"] == 1
+    source = db.query(models.FlyerSource).one()
+    assert source.last_status == 404 and "HTTPStatusError" in source.last_error
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from backend import models
+from backend.services import job_service
+
+
+@pytest.fixture
+def session_id(db):
+    db.add(models.Session(id="s1", status="uploaded", image_paths=["a.jpg"], version=1))
+    db.commit()
+    return "s1"
+
+
+def _job(db, job_id: str) -> models.AnalysisJob:
+    db.expire_all()
+    return db.get(models.AnalysisJob, job_id)
+
+
+def test_enqueue_sets_status_with_the_job(db, session_id):
+    job, created = job_service.enqueue_analysis(db, session_id)
+
+    assert created and job.status == "queued"
+    db.expire_all()
+    assert db.get(models.Session, session_id).status == "analyzing"
+
+
+def test_enqueue_reuses_the_active_job(db, session_id):
+    first, _ = job_service.enqueue_analysis(db, session_id)
+    db.get(models.Session, session_id).status = "ingredients_ready"  # Worker already moved on
+    db.commit()
+
+    again, created = job_service.enqueue_analysis(db, session_id)
+
+    assert (again.id, created) == (first.id, False)
+    db.expire_all()
+    assert db.get(models.Session, session_id).status == "ingredients_ready"
+
+
+def test_unique_index_allows_one_active_job_per_session(db, session_id):
+    db.add(models.AnalysisJob(id="j1", session_id=session_id, status="queued"))
+    db.commit()
+    db.add(models.AnalysisJob(id="j2", session_id=session_id, status="running"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    _job(db, "j1").status = "done"
+    db.commit()
+    job, created = job_service.enqueue_analysis(db, session_id)
+    assert created and job.id != "j1"
+
+
+def test_enqueue_race_returns_the_winning_job(db, session_id, monkeypatch):
+    # The other request inserts between our active-job check and our insert
+    db.add(models.AnalysisJob(id="winner", session_id=session_id, status="queued"))
+    db.commit()
+    calls = []
+    active_job = job_service._active_job
+
+    def miss_first(db, sid):
+        calls.append(sid)
+        return None if len(calls) == 1 else active_job(db, sid)
+
+    monkeypatch.setattr(job_service, "_active_job", miss_first)
+
+    job, created = job_service.enqueue_analysis(db, session_id)
+
+    assert (job.id, created) == ("winner", False)
+    assert db.query(models.AnalysisJob).count() == 1
+
+
+def test_claim_marks_running_and_hides_the_job(db, session_id):
+    job, _ = job_service.enqueue_analysis(db, session_id)
+
+    claimed = job_service.claim_job(db, "w1")
+
+    assert claimed.id == job.id
+    assert (claimed.status, claimed.attempts, claimed.locked_by) == ("running", 1, "w1")
+    assert claimed.locked_until > datetime.utcnow()
+    assert job_service.claim_job(db, "w2") is None
+
+
+def test_expired_claim_can_be_taken_over(db, session_id):
+    job, _ = job_service.enqueue_analysis(db, session_id)
+    job_service.claim_job(db, "w1")
+    _job(db, job.id).locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+    claimed = job_service.claim_job(db, "w2")
+
+    assert (claimed.locked_by, claimed.attempts) == ("w2", 2)
+
+
+def test_finish_only_as_the_owner(db, session_id):
+    job, _ = job_service.enqueue_analysis(db, session_id)
+    job_service.claim_job(db, "w1")
+
+    assert not job_service.complete_job(db, _job(db, job.id), "w2")
+    assert _job(db, job.id).status == "running"
+    assert job_service.complete_job(db, _job(db, job.id), "w1")
+    assert (_job(db, job.id).status, _job(db, job.id).locked_by) == ("done", None)
+
+
+def test_fail_job_retries_then_gives_up(db, session_id, monkeypatch):
+    monkeypatch.setattr(job_service, "RETRY_BACKOFF", 0)
+    job, _ = job_service.enqueue_analysis(db, session_id)
+    _job(db, job.id).max_attempts = 2
+    db.commit()
+
+    job_service.fail_job(db, job_service.claim_job(db, "w1"), "boom", "w1")
+    assert (_job(db, job.id).status, _job(db, job.id).last_error) == ("queued", "boom")
+
+    job_service.fail_job(db, job_service.claim_job(db, "w1"), "boom again", "w1")
+    assert _job(db, job.id).status == "failed"
+    db.expire_all()
+    assert db.get(models.Session, session_id).status == "error"
+
+
+def test_lost_lease_abandons_the_run(db, session_id):
+    job, _ = job_service.enqueue_analysis(db, session_id)
+    job_service.claim_job(db, "w1")
+    _job(db, job.id).locked_by = "w2"  # Taken over after w1's claim expired
+    db.commit()
+
+    job_service.process_job(job.id, "w1")
+
+    stored = _job(db, job.id)
+    assert (stored.status, stored.locked_by, stored.last_error) == ("running", "w2", None)
+    assert db.get(models.Session, session_id).status == "analyzing"  # The run wrote nothing
+
+
+def test_fence_extends_the_claim_in_the_callers_transaction(db, session_id):
+    job, _ = job_service.enqueue_analysis(db, session_id)
+    job_service.claim_job(db, "w1")
+    _job(db, job.id).locked_until = datetime.utcnow()
+    db.commit()
+    keeper = job_service.LeaseKeeper(job.id, "w1")
+
+    keeper.fence(db)
+    db.commit()
+
+    assert _job(db, job.id).locked_until > datetime.utcnow() + timedelta(seconds=job_service.VISIBILITY_TIMEOUT - 5)
+    _job(db, job.id).locked_by = "w2"
+    db.commit()
+    with pytest.raises(job_service.LeaseLost):
+        keeper.fence(db)
+    assert keeper.lost
+
+
+def test_process_job_ignores_a_deleted_job(db):
+    job_service.process_job("missing", "w1")  # Must not raise
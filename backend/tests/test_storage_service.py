@@ -0,0 +1,91 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.services import storage_service
+
+NOW = datetime(2026, 1, 10, 12, 0)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return storage_service.LocalStorage(root=str(tmp_path / "uploads"))
+
+
+def _session(db, storage, session_id: str, status: str, idle: timedelta, **fields) -> str:
+    """A session with one image on disk, last active `idle` before NOW."""
+    directory = storage.session_dir(session_id)
+    os.makedirs(directory)
+    path = os.path.join(directory, "a.jpg")
+    with open(path, "wb") as f:
+        f.write(b"x" * 10)
+    db.add(models.Session(
+        id=session_id, status=status, image_paths=[path], version=1,
+        created_at=NOW - timedelta(days=30), updated_at=NOW - idle, **fields,
+    ))
+    db.commit()
+    return directory
+
+
+def _purged(db) -> set:
+    db.expire_all()
+    return {row.id for row in db.query(models.Session).filter(models.Session.files_purged_at.is_not(None))}
+
+
+def test_gc_is_off_by_default():
+    assert storage_service.STORAGE_GC_ENABLED is False
+
+
+def test_finished_sessions_are_purged_after_done_retention(db, storage):
+    done = storage_service.STORAGE_RETENTION_DONE_HOURS
+    old = _session(db, storage, "done-old", "done", timedelta(hours=done + 1))
+    recent = _session(db, storage, "done-recent", "done", timedelta(hours=done - 1))
+    _session(db, storage, "error-old", "error", timedelta(hours=done + 1))
+
+    summary = storage_service.purge_expired_sessions(storage=storage, now=NOW)
+
+    assert _purged(db) == {"done-old", "error-old"}
+    assert summary == {"sessions": 2, "files": 2, "bytes": 20}
+    assert not os.path.exists(old) and os.path.exists(recent)
+
+
+def test_retention_counts_from_last_activity_not_creation(db, storage):
+    # Created 30 days ago but touched an hour ago (e.g. re-analysed)
+    _session(db, storage, "active", "done", timedelta(hours=1))
+
+    storage_service.purge_expired_sessions(storage=storage, now=NOW)
+
+    assert _purged(db) == set()
+
+
+def test_unfinished_sessions_wait_for_the_long_retention(db, storage):
+    longest = storage_service.STORAGE_RETENTION_HOURS
+    _session(db, storage, "uploaded-idle", "uploaded", timedelta(hours=storage_service.STORAGE_RETENTION_DONE_HOURS + 1))
+    _session(db, storage, "abandoned", "uploaded", timedelta(hours=longest + 1))
+
+    storage_service.purge_expired_sessions(storage=storage, now=NOW)
+
+    assert _purged(db) == {"abandoned"}
+
+
+def test_sessions_with_an_active_job_are_never_purged(db, storage):
+    idle = timedelta(hours=storage_service.STORAGE_RETENTION_HOURS + 1)
+    directory = _session(db, storage, "queued", "done", idle)
+    _session(db, storage, "finished-job", "done", idle)
+    db.add(models.AnalysisJob(id="j1", session_id="queued", status="queued"))
+    db.add(models.AnalysisJob(id="j2", session_id="finished-job", status="done"))
+    db.commit()
+
+    storage_service.purge_expired_sessions(storage=storage, now=NOW)
+
+    assert _purged(db) == {"finished-job"}
+    assert os.path.exists(directory)
+
+
+def test_purged_sessions_are_skipped(db, storage):
+    idle = timedelta(hours=storage_service.STORAGE_RETENTION_HOURS + 1)
+    _session(db, storage, "gone", "done", idle, files_purged_at=NOW - timedelta(days=1))
+
+    assert storage_service.purge_expired_sessions(storage=storage, now=NOW)["sessions"] == 0
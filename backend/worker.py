@@ -0,0 +1,35 @@
+"""Standalone analysis worker.
+
+Usage (from the repository root):
+    python -m backend.worker
+
+Runs ANALYSIS_WORKER_CONCURRENCY threads that claim jobs from the
+analysis_jobs table. Any number of these can run across processes/nodes.
+"""
+import signal
+import threading
+
+from backend import database, models
+from backend.services.job_service import AnalysisWorker, WORKER_CONCURRENCY
+from backend.services.log_service import configure_logging, get_logger
+
+logger = get_logger("backend.worker")
+
+
+def main():
+    configure_logging()
+    models.Base.metadata.create_all(bind=database.engine)
+
+    worker = AnalysisWorker(concurrency=max(WORKER_CONCURRENCY, 1))
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+
+    worker.start()
+    stopped.wait()
+    logger.info("Shutting down worker")
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -24,7 +24,8 @@ export default function Home() {
   const [analysisStatus, setAnalysisStatus] = useState<string>("waiting"); // waiting, uploaded, analyzing, ingredients_ready, done
   const [analysisResult, setAnalysisResult] = useState<any>(null); // To store the fetched result
   const [initialTab, setInitialTab] = useState<string>("ingredients");
-  const pollingInterval = useRef<NodeJS.Timeout | null>(null);
+  const [plannedDays, setPlannedDays] = useState<number>(0); // Days received so far while the plan streams in
+  const eventSource = useRef<EventSource | null>(null);
 
   // Helper helper to determine API Base URL
   const getApiBaseUrl = () => {
@@ -75,13 +76,38 @@ export default function Home() {
     const saved = localStorage.getItem("smm_history");
     if (saved) {
       try {
-        setHistory(JSON.parse(saved));
+        const parsed = JSON.parse(saved);
+        setHistory(parsed);
+        refreshHistory(parsed);
       } catch (e) {
         console.error("Failed to parse history", e);
       }
     }
   }, []);
 
+  // One bulk summary request for all entries (no plans); drops sessions the server no longer has
+  const refreshHistory = async (entries: { id: string, date: string, ingredients: string[] }[]) => {
+    if (entries.length === 0) return;
+    try {
+      const baseUrl = getApiBaseUrl();
+      const res = await fetch(`${baseUrl}/api/sessions/results`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ session_ids: entries.map(h => h.id) }),
+      });
+      if (!res.ok) return;
+      const data = await res.json();
+      const found = new Map<string, any>(data.sessions.map((s: any) => [s.session_id, s]));
+      const updated = entries
+        .filter(h => found.has(h.id))
+        .map(h => ({ ...h, ingredients: found.get(h.id).ingredients || h.ingredients }));
+      setHistory(updated);
+      localStorage.setItem("smm_history", JSON.stringify(updated));
+    } catch (e) {
+      console.error("Failed to refresh history", e);
+    }
+  };
+
   const saveToHistory = (sId: string, result: any) => {
     const newEntry = {
       id: sId,
@@ -98,45 +124,59 @@ export default function Home() {
     });
   };
 
-  // Poll for Status (Updated with Auto-Save)
+  // Subscribe to Status Events (Server-Sent Events, replaces polling)
   useEffect(() => {
     if (!sessionId) return;
 
-    pollingInterval.current = setInterval(async () => {
+    const baseUrl = getApiBaseUrl();
+    const source = new EventSource(`${baseUrl}/api/session/${sessionId}/events`);
+    eventSource.current = source;
+
+    source.addEventListener("status", async (e) => {
       try {
-        const baseUrl = getApiBaseUrl();
-        const res = await fetch(`${baseUrl}/api/session/${sessionId}/status`);
-        if (res.ok) {
-          const data = await res.json();
-
-          if (data.status === "done" && analysisStatus !== "done") {
-            // Status changed to DONE
-            setAnalysisStatus("done");
-
-            // Fetch result
-            const resultRes = await fetch(`${baseUrl}/api/session/${sessionId}/result`);
-            if (resultRes.ok) {
-              const resultData = await resultRes.json();
-              setAnalysisResult(resultData);
-
-              // AUTO SAVE to History
-              saveToHistory(sessionId, resultData);
-            }
-            if (pollingInterval.current) clearInterval(pollingInterval.current);
-
-          } else if (data.status !== analysisStatus && data.status !== "done") {
-            setAnalysisStatus(data.status);
+        const data = JSON.parse((e as MessageEvent).data);
+
+        if (data.status === "done") {
+          // Status changed to DONE; the stream is no longer needed
+          source.close();
+
+          // Fetch result
+          const resultRes = await fetch(`${baseUrl}/api/session/${sessionId}/result`);
+          if (resultRes.ok) {
+            const resultData = await resultRes.json();
+            setAnalysisResult(resultData);
+
+            // AUTO SAVE to History
+            saveToHistory(sessionId, resultData);
           }
+          setAnalysisStatus("done");
+        } else {
+          setAnalysisStatus(data.status);
         }
       } catch (err) {
-        console.error("Polling error:", err);
+        console.error("Status event error:", err);
+      }
+    });
+
+    // Partial plan: one event per day as the model writes it
+    source.addEventListener("plan_day", (e) => {
+      try {
+        const data = JSON.parse((e as MessageEvent).data);
+        setPlannedDays((prev) => Math.max(prev, data.index + 1));
+      } catch (err) {
+        console.error("Plan event error:", err);
       }
-    }, 2000);
+    });
+
+    source.onerror = (err) => {
+      // EventSource reconnects on its own; just log
+      console.error("Status stream error:", err);
+    };
 
     return () => {
-      if (pollingInterval.current) clearInterval(pollingInterval.current);
+      source.close();
     };
-  }, [sessionId, analysisStatus]);
+  }, [sessionId]);
 
   // Load History Item
   const loadHistoryItem = async (histId: string) => {
@@ -280,6 +320,7 @@ export default function Home() {
                 {analysisStatus === 'waiting' && <span className="animate-custom-blink">接続待機中...</span>}
                 {analysisStatus === 'uploaded' && "画像受信！"}
                 {analysisStatus === 'analyzing' && "解析中..."}
+                {analysisStatus === 'ingredients_ready' && `献立作成中 (${plannedDays}/7日)`}
               </span>
             </div>
           </div>
@@ -74,10 +74,33 @@ export default function AnalysisResult({ data, initialTab = "ingredients" }: Ana
     const [suggestedRecipes, setSuggestedRecipes] = useState<string[]>([]);
     const [suggestLoading, setSuggestLoading] = useState(false);
     const [targetIngredient, setTargetIngredient] = useState("");
+    const [prefetchedRecipes, setPrefetchedRecipes] = useState<Record<string, string[]>>({});
+
+    // Prefetch suggestions for every ingredient in one batch request
+    const ingredientNamesKey = categorizedIngredients.map(ing => ing.name).join("|");
+    useEffect(() => {
+        const names = ingredientNamesKey ? ingredientNamesKey.split("|") : [];
+        if (names.length === 0) return;
+        fetch(`http://localhost:8000/api/recipes/suggest/batch`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ ingredients: names })
+        })
+            .then(res => (res.ok ? res.json() : null))
+            .then(data => { if (data) setPrefetchedRecipes(data.recipes); })
+            .catch(e => console.error("Recipe prefetch failed", e));
+    }, [ingredientNamesKey]);
 
     const handleSuggest = async (ingredient: string) => {
         setTargetIngredient(ingredient);
         setSuggestModalOpen(true);
+
+        if (prefetchedRecipes[ingredient]) {
+            setSuggestedRecipes(prefetchedRecipes[ingredient]);
+            setSuggestLoading(false);
+            return;
+        }
+
         setSuggestLoading(true);
         setSuggestedRecipes([]);
 